@@ -0,0 +1,284 @@
+# Benchmarks for v3code.py, kept out of the application itself.
+# Run one with: python benchmarks.py <name>
+import io
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+import v3code
+from v3code import (DEFAULT_LIST, TIME_LOG, BinaryFileStorage, Dashboard, DependencyGraph, MemoryStorage,
+                    TextFileStorage, TrigramIndex, commit_change, count_by_category, create_backup, export_changes,
+                    format_size, fuzzy_max_distance, name_trigrams, new_task_id, normalize_task_name, save_tasks,
+                    save_time_summary, select_list, set_storage, sort_tasks, substring_edit_distance, sync_stores,
+                    time_totals, time_tracking)
+
+# Benchmark serial vs parallel archive loading on a generated archive
+def benchmark_archive_loading(rows=2000000):
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = TextFileStorage(tmp)
+        path = backend.path('completed_tasks.txt')
+        with open(path, 'w') as file:
+            for i in range(rows):
+                file.write(f"Benchmark task {i} | Done | {i % 28 + 1:02d}-01-2025 | {i % 28 + 1:02d}-02-2025 | Category{i % 5}\n")
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"\nArchive: {rows} rows, {size_mb:.1f} MB")
+
+        baseline = None
+        max_workers = os.cpu_count() or 1
+        workers = 1
+        while True:
+            start = time.perf_counter()
+            tasks = []
+            for chunk in backend.map_archive(list, workers):
+                tasks.extend(chunk)
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = elapsed
+            speedup = baseline / elapsed
+            print(f"{workers} worker(s): {elapsed:.2f}s  speedup {speedup:.2f}x  ({speedup / workers:.2f}x per core)")
+            if workers >= max_workers:
+                break
+            workers = min(workers * 2, max_workers)
+
+# Benchmark the storage backends on the same workload
+def benchmark_storage_backends(task_count=100000, batches=1000, backends=None):
+    tasks = [{"id": new_task_id(), "task": f"Benchmark task {i}", "status": ("urgent", "semi-urgent", "non-urgent")[i % 3],
+              "due_date": f"{i % 28 + 1:02d}-03-2026", "category": f"Category{i % 5}"} for i in range(task_count)]
+    archived = [dict(task, status="Done", completion_date="01-03-2026") for task in tasks]
+    batch_size = max(1, task_count // batches)
+    with tempfile.TemporaryDirectory() as tmp:
+        if backends is None:
+            backends = {"memory": MemoryStorage(), "text files": TextFileStorage(tmp), "binary files": BinaryFileStorage(tmp)}
+        print(f"\n{task_count} tasks, archive appended in batches of {batch_size}")
+        print(f"{'Backend':<16}{'save':>10}{'load':>10}{'archive':>10}{'summary':>10}")
+        for name, backend in backends.items():
+            timings = []
+            start = time.perf_counter()
+            backend.save_tasks(DEFAULT_LIST, tasks)
+            timings.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            backend.load_tasks(DEFAULT_LIST)
+            timings.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            for offset in range(0, task_count, batch_size):
+                backend.append_archive(archived[offset:offset + batch_size])
+            timings.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            backend.map_archive(count_by_category)
+            timings.append(time.perf_counter() - start)
+            print(f"{name:<16}" + "".join(f"{timing:>9.3f}s" for timing in timings))
+
+# Benchmark the binary record codec against the text loader
+def benchmark_binary_codec(task_count=500000):
+    statuses = ("urgent", "semi-urgent", "non-urgent")
+    tasks = [{"id": new_task_id(), "task": f"Benchmark task {i}", "status": statuses[i % 3],
+              "due_date": f"{i % 28 + 1:02d}-03-2026", "category": f"Category{i % 5}"} for i in range(task_count)]
+    with tempfile.TemporaryDirectory() as tmp:
+        text, binary = TextFileStorage(tmp), BinaryFileStorage(tmp)
+        text.save_tasks(DEFAULT_LIST, tasks)
+        binary.save_tasks(DEFAULT_LIST, tasks)
+        print(f"\n{task_count} tasks")
+        for name, backend in (("text (load_tasks)", text), ("binary", binary)):
+            start = time.perf_counter()
+            loaded = backend.load_tasks(DEFAULT_LIST)
+            elapsed = time.perf_counter() - start
+            size_mb = os.path.getsize(backend.list_file(DEFAULT_LIST)) / (1024 * 1024)
+            print(f"{name:<20}{elapsed:>8.3f}s  {size_mb:>6.1f} MB  {len(loaded)} tasks")
+
+def benchmark_fuzzy_search(name_count=300000, query_count=200):
+    rng = random.Random(42)
+    words = ["buy", "call", "clean", "write", "review", "fix", "plan", "book", "pay", "email", "report",
+             "groceries", "dentist", "homework", "garden", "invoice", "meeting", "budget", "kitchen", "car"]
+    names = [f"{rng.choice(words)} {rng.choice(words)} {rng.choice(words)} {i}" for i in range(name_count)]
+    start = time.perf_counter()
+    index = TrigramIndex()
+    for position, name in enumerate(names):
+        index.add(position, {"task": name})
+    print(f"\nTrigram index of {name_count} names built in {time.perf_counter() - start:.3f}s")
+    queries = []
+    for name in rng.sample(names, query_count):
+        position = rng.randrange(len(name))
+        queries.append(normalize_task_name(name[:position] + name[position + 1:]))  # drop a letter
+    start = time.perf_counter()
+    found = 0
+    for query in queries:
+        trigrams = name_trigrams(query)
+        max_distance = fuzzy_max_distance(query)
+        for _, name_id in index.candidates(trigrams, max(1, len(trigrams) - 3 * max_distance)):
+            if substring_edit_distance(query, index.names[name_id]) <= max_distance:
+                found += 1
+                break
+    elapsed = time.perf_counter() - start
+    print(f"{query_count} typo queries: {elapsed / query_count * 1000:.2f} ms each, {found} found a match")
+    start = time.perf_counter()
+    for name in names[:2000]:
+        substring_edit_distance(queries[0], name)
+    scan = (time.perf_counter() - start) / 2000 * name_count
+    print(f"Edit distance against every name would take about {scan:.1f}s per query")
+
+def benchmark_dashboard(task_count=200000, changes=1000, height=50):
+    rng = random.Random(7)
+    statuses = ("urgent", "semi-urgent", "non-urgent")
+    backend = MemoryStorage()
+    tasks = [{"id": new_task_id(), "task": f"Benchmark task {i}", "status": statuses[i % 3],
+              "due_date": f"{i % 28 + 1:02d}-{i % 12 + 1:02d}-2027", "category": f"Category{i % 5}"} for i in range(task_count)]
+    backend.save_tasks(DEFAULT_LIST, tasks)
+    out = io.StringIO()
+    start = time.perf_counter()
+    dashboard = Dashboard(backend, DEFAULT_LIST, out)
+    dashboard.render(height)
+    print(f"\nDashboard over {task_count} tasks loaded and drawn in {time.perf_counter() - start:.3f}s")
+    lines = []
+    for sequence in range(1, changes + 1):
+        task = rng.choice(tasks)
+        fields = {"status": rng.choice(statuses)} if sequence % 2 else {"due_date": f"{rng.randrange(1, 29):02d}-01-2027"}
+        lines.append(json.dumps({"seq": sequence, "time": "", "list": DEFAULT_LIST, "event": "edit",
+                                 "task_id": task['id'], "fields": fields}))
+    dashboard.sequence, dashboard.rows_written = 0, 0
+    start = time.perf_counter()
+    for line in lines:
+        backend.append_lines('changes.log', [line])
+        dashboard.tick()
+        dashboard.render(height)
+    elapsed = time.perf_counter() - start
+    print(f"{changes} edits: {elapsed / changes * 1000:.3f} ms and {dashboard.rows_written / changes:.2f} rows written per change")
+    start = time.perf_counter()
+    redraw = io.StringIO()
+    for number, task in enumerate(sort_tasks(list(dashboard.tasks.values())), 1):
+        redraw.write(dashboard.row(number, task) + "\n")
+    print(f"Reprinting the whole list once takes {(time.perf_counter() - start) * 1000:.1f} ms")
+
+def benchmark_dependencies(task_count=100000, edits=1000):
+    rng = random.Random(3)
+    tasks = []
+    for i in range(task_count):
+        task = {"id": f"{i:012x}", "task": f"Benchmark task {i}", "status": "urgent",
+                "due_date": f"{i % 28 + 1:02d}-{i % 12 + 1:02d}-2027", "category": "General"}
+        if i > 10:
+            task['blocked_by'] = ",".join(f"{rng.randrange(max(0, i - 50), i):012x}" for _ in range(rng.randrange(3)))
+        tasks.append(task)
+    start = time.perf_counter()
+    graph = DependencyGraph(tasks)
+    build = time.perf_counter() - start
+    print(f"\nDependency graph of {task_count} tasks built in {build:.3f}s, {len(graph.blocked)} blocked")
+    start = time.perf_counter()
+    for _ in range(edits):
+        task = tasks[rng.randrange(task_count)]
+        blockers = [tasks[rng.randrange(task_count)]['id'] for _ in range(rng.randrange(3))]
+        if graph.would_cycle(task['id'], blockers) is None:
+            task['blocked_by'] = ",".join(blockers)
+            graph.update(task['id'], {'blocked_by': task['blocked_by']})
+    elapsed = time.perf_counter() - start
+    print(f"{edits} blocked-by edits: {elapsed / edits * 1000:.3f} ms each (a rebuild takes {build * 1000:.0f} ms)")
+    start = time.perf_counter()
+    path = graph.critical_path()
+    print(f"Critical path of {len(path)} tasks found in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+def benchmark_backups(rows=1000000):
+    with tempfile.TemporaryDirectory() as tmp:
+        root, backup_dir = os.path.join(tmp, 'data'), os.path.join(tmp, 'backups')
+        backend = TextFileStorage(root)
+        backend.append_archive([{"task": f"Archived task {i}", "status": "urgent", "due_date": f"{i % 28 + 1:02d}-03-2026",
+                                 "completion_date": f"{i % 28 + 1:02d}-04-2026", "category": f"Category{i % 5}"} for i in range(rows)])
+        backend.save_tasks(DEFAULT_LIST, [{"id": new_task_id(), "task": f"Task {i}", "status": "urgent",
+                                           "due_date": "No due date", "category": "General"} for i in range(1000)])
+        print(f"\nArchive of {rows} tasks ({format_size(backend.archive_size())})")
+
+        def run(label):
+            start = time.perf_counter()
+            _, files, total, new_chunks, written = create_backup(root, backup_dir)
+            print(f"{label:<28}{time.perf_counter() - start:>7.3f}s  {new_chunks:>5} new chunks  {format_size(written):>10} written")
+        run("first backup")
+        run("nothing changed")
+        backend.append_archive([{"task": f"New task {i}", "status": "urgent", "due_date": "No due date",
+                                 "completion_date": "19-10-2026", "category": "General"} for i in range(100)])
+        run("100 tasks archived")
+        tasks = backend.load_tasks(DEFAULT_LIST)
+        tasks[500]['status'] = "non-urgent"
+        backend.save_tasks(DEFAULT_LIST, tasks)
+        run("one task edited")
+
+def benchmark_sync(rows=50000, edits=100):
+    with tempfile.TemporaryDirectory() as tmp:
+        mine, list_name = v3code.storage, v3code.current_list
+        first, second = os.path.join(tmp, 'first'), os.path.join(tmp, 'second')
+        os.makedirs(second)
+        backend = TextFileStorage(first)
+        backend.save_tasks(DEFAULT_LIST, [{"id": new_task_id(), "task": f"Task {i}", "status": "urgent",
+                                           "due_date": "No due date", "category": "General"} for i in range(rows)])
+        try:
+            set_storage(backend)
+            start = time.perf_counter()
+            sync_stores(second)
+            print(f"\nFirst sync of {rows} tasks (full snapshot): {time.perf_counter() - start:.2f}s")
+            # The second sync confirms the snapshot arrived, so from then on only deltas are sent
+            start = time.perf_counter()
+            sync_stores(second)
+            print(f"Sync with nothing changed: {time.perf_counter() - start:.3f}s")
+            for index in range(0, rows, rows // edits):
+                commit_change({"type": "edit", "index": index, "before": {"status": "urgent"}, "after": {"status": "non-urgent"}})
+            save_tasks()
+            delta = sum(len(json.dumps(entry)) + 1 for entry in export_changes())
+            start = time.perf_counter()
+            sync_stores(second)
+            print(f"Sync after {edits} edits: {time.perf_counter() - start:.3f}s, {format_size(delta)} sent "
+                  f"(the task file is {format_size(os.path.getsize(backend.list_file(DEFAULT_LIST)))})")
+        finally:
+            set_storage(mine)
+            select_list(list_name)
+
+def benchmark_time_tracking(sessions=1000000, tasks=2000):
+    rng = random.Random(1)
+    backend = MemoryStorage()
+    start = int(datetime(2025, 1, 1).timestamp())
+    lines = []
+    for _ in range(sessions):
+        task = rng.randrange(tasks)
+        lines.append(f"S\t{start}\t{task:012x}\t\"Category{task % 7}\"\t\"Task {task}\"")
+        start += rng.randrange(600, 7200)
+        lines.append(f"E\t{start}\t{task:012x}")
+        start += rng.randrange(60, 3600)
+    backend.append_lines(TIME_LOG, lines)
+    mine, list_name = v3code.storage, v3code.current_list
+    try:
+        set_storage(backend)
+        begin = time.perf_counter()
+        time_tracking()
+        print(f"\nReplaying {sessions} sessions: {time.perf_counter() - begin:.2f}s")
+        save_time_summary()
+        set_storage(backend)
+        begin = time.perf_counter()
+        time_tracking()
+        print(f"Loading the saved summary: {time.perf_counter() - begin:.2f}s")
+        last = datetime.fromtimestamp(start)
+        for label, days in (("week", 7), ("month", 30), ("year", 365)):
+            begin = time.perf_counter()
+            time_totals(last - timedelta(days=days - 1), last)
+            time_totals(last - timedelta(days=days - 1), last, by='task')
+            print(f"Totals per category and task for the last {label}: {(time.perf_counter() - begin) * 1000:.1f} ms")
+    finally:
+        set_storage(mine)
+        select_list(list_name)
+
+# Benchmarks that can be run with: python benchmarks.py <name>
+BENCHMARKS = {
+    'archive': benchmark_archive_loading,
+    'storage': benchmark_storage_backends,
+    'binary': benchmark_binary_codec,
+    'fuzzy': benchmark_fuzzy_search,
+    'dashboard': benchmark_dashboard,
+    'dependencies': benchmark_dependencies,
+    'backups': benchmark_backups,
+    'sync': benchmark_sync,
+    'time': benchmark_time_tracking,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in BENCHMARKS:
+        BENCHMARKS[sys.argv[1]]()
+    else:
+        print(f"Usage: python benchmarks.py <{'|'.join(BENCHMARKS)}>")
@@ -0,0 +1,29 @@
+"""Shared test setup. v3code loads its data directory when it is imported, so point it at a temporary one first."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ['TODO_DATA_DIR'] = tempfile.mkdtemp(prefix='todo-tests-')
+os.environ['TODO_WARM_CACHES'] = '0'
+os.environ.pop('TODO_STORAGE', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import v3code  # noqa: E402
+
+
+@pytest.fixture
+def memory_store():
+    """Start a test from an empty in-memory store"""
+    v3code.set_storage(v3code.MemoryStorage())
+    yield v3code
+    v3code.flush_saves()
+
+
+@pytest.fixture
+def file_store(tmp_path):
+    """Start a test from an empty data directory"""
+    v3code.set_storage(v3code.TextFileStorage(str(tmp_path / 'data')))
+    yield v3code
+    v3code.flush_saves()
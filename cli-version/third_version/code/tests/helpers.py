@@ -0,0 +1,75 @@
+"""Random task lists and edits shared by the tests. Edits go through commit_change() like the menus."""
+import v3code
+
+STATUSES = ("urgent", "semi-urgent", "non-urgent", "Done")
+CATEGORIES = ("General", "Work", "Home", "School")
+TAGS = ("", "work", "home", "work,home", "errand")
+WORDS = ("buy", "milk", "write", "report", "call", "dentist", "fix", "bike", "plan", "trip")
+
+
+def random_due_date(rng):
+    if rng.random() < 0.2:
+        return "No due date"
+    return f"{rng.randrange(1, 29):02d}-{rng.randrange(1, 13):02d}-{rng.choice((2025, 2026, 2030))}"
+
+
+def random_task(rng, tasks=()):
+    task = {'id': v3code.new_task_id(), 'task': " ".join(rng.sample(WORDS, rng.randrange(1, 4))),
+            'status': rng.choice(STATUSES[:3]), 'due_date': random_due_date(rng), 'category': rng.choice(CATEGORIES)}
+    if rng.random() < 0.5:
+        task['tags'] = rng.choice(TAGS)
+    if tasks and rng.random() < 0.4:
+        task['parent'] = rng.choice(tasks)['id']
+    return task
+
+
+def edit(index, **after):
+    task = v3code.to_do_list[index]
+    before = {field: task.get(field, v3code.TASK_FIELD_DEFAULTS.get(field, '')) for field in after}
+    v3code.commit_change({'type': 'edit', 'index': index, 'before': before, 'after': after})
+
+
+def random_change(rng):
+    """Make one random change to the current list: an add, delete, edit or archive"""
+    tasks = v3code.to_do_list
+    choice = rng.random()
+    if choice < 0.3 or len(tasks) < 5:
+        v3code.commit_change({'type': 'add', 'index': len(tasks), 'task': random_task(rng, tasks)})
+        return
+    index = rng.randrange(len(tasks))
+    task_id = tasks[index]['id']
+    if choice < 0.38:
+        v3code.commit_change({'type': 'delete', 'index': index, 'task': dict(tasks[index])})
+    elif choice < 0.47:
+        edit(index, task=random_task(rng)['task'])
+    elif choice < 0.58:
+        edit(index, due_date=random_due_date(rng))
+    elif choice < 0.7:
+        edit(index, status=rng.choice(STATUSES))
+    elif choice < 0.76:
+        edit(index, category=rng.choice(CATEGORIES), tags=rng.choice(TAGS))
+    elif choice < 0.85:
+        parent = rng.choice(tasks)['id']
+        edit(index, parent='' if v3code.subtask_tree().is_below(parent, task_id) else parent)
+    elif choice < 0.95:
+        blockers = [other['id'] for other in rng.sample(tasks, rng.randrange(3))]
+        if v3code.dependency_graph().would_cycle(task_id, blockers) is None:
+            edit(index, blocked_by=",".join(blockers))
+    else:
+        v3code.archive_completed_tasks()
+
+
+def random_edit(rng):
+    """A random change, or now and then an undo or redo"""
+    if rng.random() < 0.85:
+        random_change(rng)
+    elif v3code.undo_stack and rng.random() < 0.7:
+        v3code.undo_last_change()
+    elif v3code.redo_stack:
+        v3code.redo_last_change()
+
+
+def fill_list(rng, count):
+    for _ in range(count):
+        v3code.commit_change({'type': 'add', 'index': len(v3code.to_do_list),
+                              'task': random_task(rng, v3code.to_do_list)})
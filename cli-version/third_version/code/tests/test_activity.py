@@ -0,0 +1,102 @@
+"""Date-range queries through completed_index.txt return what scanning the whole archive would."""
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+import v3code
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.fixture(params=[v3code.TextFileStorage, v3code.BinaryFileStorage])
+def archive_store(request, tmp_path):
+    """Start from an empty data directory, in each format the index records positions for"""
+    v3code.set_storage(request.param(str(tmp_path / 'data')))
+    return v3code
+
+
+def append_archive(rng, count):
+    """Append tasks completed in runs of days, the way archiving writes them, with a few undated ones"""
+    day = START + timedelta(days=rng.randrange(365))
+    tasks = []
+    for _ in range(count):
+        if rng.random() < 0.2:
+            day = START + timedelta(days=rng.randrange(365))
+        completion_date = f"{day:%d-%m-%Y}" if rng.random() < 0.95 else "Unknown"
+        tasks.append({'task': f"Task {rng.random()}", 'status': "Done", 'due_date': "No due date",
+                      'completion_date': completion_date, 'category': "General"})
+    v3code.storage.append_archive(tasks)
+
+
+def completed_between(archive, start, end):
+    """The tasks a full scan of the archive finds, in archive order"""
+    dates = [v3code.parse_date(task['completion_date']) for task in archive]
+    return [task for task, date in zip(archive, dates) if date and start <= date <= end]
+
+
+def check_random_ranges(rng):
+    archive = v3code.load_archived_tasks()
+    for _ in range(15):
+        start = START + timedelta(days=rng.randrange(-10, 370))
+        end = start + timedelta(days=rng.randrange(60))
+        expected = completed_between(archive, start, end)
+        assert v3code.load_completed_between(start, end) == expected
+        assert v3code.daily_completion_counts(start, end) == \
+               dict(sorted(Counter(v3code.parse_date(task['completion_date']) for task in expected).items()))
+
+
+def today():
+    return datetime.strptime(datetime.now().strftime("%d-%m-%Y"), "%d-%m-%Y")
+
+
+def add_done_tasks(count):
+    for i in range(count):
+        v3code.commit_change({'type': 'add', 'index': len(v3code.to_do_list), 'task': {
+            'id': v3code.new_task_id(), 'task': f"Done {i}", 'status': "Done", 'due_date': "No due date",
+            'category': "Work"}})
+
+
+def test_date_ranges_match_a_full_scan(archive_store):
+    rng = random.Random(28)
+    append_archive(rng, 2000)
+    check_random_ranges(rng)
+    # Records the index has not seen yet are indexed on the next query
+    append_archive(rng, 300)
+    check_random_ranges(rng)
+    add_done_tasks(5)
+    v3code.archive_completed_tasks()
+    assert [task['task'] for task in v3code.load_completed_between(today(), today())][-5:] == \
+           [f"Done {i}" for i in range(5)]
+    check_random_ranges(rng)
+
+
+def test_index_is_rebuilt_when_the_archive_shrinks(archive_store):
+    rng = random.Random(29)
+    append_archive(rng, 1000)
+    check_random_ranges(rng)
+    positions = [start for _, start, _ in v3code.storage.iter_archive()]
+    v3code.storage.truncate_archive(positions[400])
+    check_random_ranges(rng)
+    rebuilt = v3code.read_completion_index()
+    v3code.storage.write_lines('completed_index.txt', [])
+    assert v3code.load_completion_index() == rebuilt
+
+
+def test_undoing_an_archive_truncates_the_index(archive_store, capsys):
+    rng = random.Random(30)
+    append_archive(rng, 500)
+    check_random_ranges(rng)
+    add_done_tasks(3)
+    v3code.archive_completed_tasks()
+    assert sum(v3code.daily_completion_counts(today(), today()).values()) >= 3
+    v3code.undo_last_change()
+    assert [task['task'] for task in v3code.to_do_list] == [f"Done {i}" for i in range(3)]
+    assert v3code.read_completion_index()[-1][2] == v3code.storage.archive_size()
+    check_random_ranges(rng)
+    v3code.redo_last_change()
+    assert [task['task'] for task in v3code.load_completed_between(today(), today())][-3:] == \
+           [f"Done {i}" for i in range(3)]
+    check_random_ranges(rng)
+    capsys.readouterr()
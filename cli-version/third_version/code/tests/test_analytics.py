@@ -0,0 +1,37 @@
+"""The NumPy date parser used by the analytics mode must agree with parse_date()."""
+import random
+from datetime import datetime
+
+import pytest
+
+import v3code
+
+np = pytest.importorskip('numpy')
+
+
+def days_by_parse_date(text):
+    date = v3code.parse_date(text)
+    return -1 if date is None else (date - datetime(1970, 1, 1)).days
+
+
+def test_dates_to_days_edge_cases():
+    samples = ["31-02-2025", "29-02-2024", "29-02-2025", "29-02-1900", "29-02-2000", "31-04-2025", "30-04-2025",
+               "31-12-1969", "01-01-1970", "1-1-2025", "01-1-2025", " 1-01-2025", "01-01-20255", "00-01-2025",
+               "01-13-2025", "01-01-0000", "01/01/2025", "", "No due date", "31-12-9999", "2025-01-01"]
+    assert v3code.dates_to_days(samples).tolist() == [days_by_parse_date(text) for text in samples]
+
+
+def test_dates_to_days_random_dates():
+    generator = random.Random(27)
+    samples = []
+    for _ in range(5000):
+        day, month = generator.randint(0, 32), generator.randint(0, 13)
+        year = generator.choice([1900, 1969, 1970, 2000, 2023, 2024, 2025, 2100])
+        day_text = f"{day:02d}" if generator.random() < 0.8 else str(day)
+        month_text = f"{month:02d}" if generator.random() < 0.8 else str(month)
+        samples.append(f"{day_text}-{month_text}-{year}")
+    assert v3code.dates_to_days(samples).tolist() == [days_by_parse_date(text) for text in samples]
+
+
+def test_dates_to_days_empty():
+    assert v3code.dates_to_days([]).tolist() == []
@@ -0,0 +1,61 @@
+"""The parallel archive loader returns what the serial one does, in the same order."""
+import random
+from functools import partial
+
+import v3code
+
+ROWS = 5000
+
+
+def write_archive(backend, rng):
+    backend.append_archive([{'task': f"Archived {i} {'é' * rng.randrange(3)}{'x' * rng.randrange(200)}",
+                             'status': "Done", 'due_date': f"{i % 28 + 1:02d}-01-2025",
+                             'completion_date': f"{i % 28 + 1:02d}-02-2025", 'category': f"Category{i % 7}"}
+                            for i in range(ROWS)])
+
+
+def test_parallel_archive_matches_serial(tmp_path, monkeypatch):
+    backend = v3code.TextFileStorage(str(tmp_path))
+    write_archive(backend, random.Random(1))
+    serial = backend.map_archive(list, workers=1)
+    assert len(serial) == 1 and len(serial[0]) == ROWS
+    monkeypatch.setattr(v3code, 'PARALLEL_ARCHIVE_THRESHOLD', 0)
+    for workers in (2, 3, 8):
+        chunks = backend.map_archive(list, workers=workers)
+        assert len(chunks) > 1
+        assert [task for chunk in chunks for task in chunk] == serial[0]
+        totals = {}
+        for chunk in backend.map_archive(v3code.count_by_category, workers=workers):
+            for category, count in chunk.items():
+                totals[category] = totals.get(category, 0) + count
+        assert totals == v3code.count_by_category(serial[0])
+
+
+def test_chunks_split_on_line_boundaries(tmp_path):
+    backend = v3code.TextFileStorage(str(tmp_path))
+    write_archive(backend, random.Random(2))
+    path = backend.path(backend.archive_file)
+    with open(path, 'rb') as file:
+        data = file.read()
+    for chunk_count in (1, 2, 7, 64, ROWS * 2):
+        ranges = v3code.split_file_on_lines(path, chunk_count)
+        assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert end == start and data[end - 1:end] == b"\n"
+
+
+def test_parallel_task_lists_match_serial(tmp_path, monkeypatch):
+    backend = v3code.TextFileStorage(str(tmp_path))
+    for number in range(4):
+        name = f"list{number}"
+        backend.create_list(name)
+        backend.save_tasks(name, [{'id': v3code.new_task_id(), 'task': f"Task {i}", 'status': "urgent",
+                                   'due_date': "No due date", 'category': "General"} for i in range(100 * number)])
+    serial = backend.map_task_lists(v3code.summarize_task_list)
+    found = backend.map_task_lists(partial(v3code.search_task_list, "task 1"))
+    monkeypatch.setattr(v3code, 'PARALLEL_ARCHIVE_THRESHOLD', 0)
+    monkeypatch.setattr(v3code.os, 'cpu_count', lambda: 4)
+    assert backend.map_task_lists(v3code.summarize_task_list) == serial
+    assert backend.map_task_lists(partial(v3code.search_task_list, "task 1")) == found
+    assert [summary['active'] for name, summary in serial.items() if name != v3code.DEFAULT_LIST] == [0, 100, 200, 300]
+    assert [len(tasks) for tasks in found.values()] == [0, 0, 11, 111, 111]
@@ -0,0 +1,88 @@
+"""Backups restore the exact files, store each chunk once, and never touch files they do not own."""
+import glob
+import os
+import random
+import zlib
+
+import pytest
+
+import v3code
+
+from .helpers import fill_list
+
+
+def read_files(root):
+    return {name: open(os.path.join(root, name), 'rb').read() for name in os.listdir(root)}
+
+
+def write_task_file(root, rng, count):
+    """A tasks.txt large enough to be cut into many chunks"""
+    os.makedirs(root, exist_ok=True)
+    lines = [v3code.format_task_line(dict(v3code.TASK_FIELD_DEFAULTS, **{
+        'id': f"{index:012x}", 'task': f"task {rng.random()}", 'status': 'urgent',
+        'due_date': 'No due date', 'category': 'Work'})) for index in range(count)]
+    with open(os.path.join(root, 'tasks.txt'), 'w') as file:
+        file.writelines(lines)
+
+
+def test_restore_gives_back_the_backed_up_files(file_store, tmp_path, capsys):
+    root, backups = str(tmp_path / 'data'), str(tmp_path / 'backups')
+    fill_list(random.Random(7), 50)
+    v3code.save_tasks()
+    v3code.flush_saves()
+    before = read_files(root)
+    name = v3code.create_backup(root, backups)[0]
+    fill_list(random.Random(8), 10)
+    v3code.save_tasks()
+    v3code.flush_saves()
+    assert v3code.restore_backup(name, root, backups) == len(before)
+    assert read_files(root) == before
+    restored = str(tmp_path / 'restored')
+    v3code.restore_backup(name, restored, backups)
+    assert read_files(restored) == before
+    capsys.readouterr()
+
+
+def test_backups_store_only_changed_chunks(tmp_path):
+    root, backups = str(tmp_path / 'data'), str(tmp_path / 'backups')
+    write_task_file(root, random.Random(1), 20000)
+    chunks = v3code.create_backup(root, backups)[3]
+    assert chunks > 10
+    assert v3code.create_backup(root, backups)[3] == 0
+    with open(os.path.join(root, 'tasks.txt'), 'a') as file:
+        file.write("one more | urgent | No due date | Work\n")
+    assert 1 <= v3code.create_backup(root, backups)[3] <= 2
+    assert len(v3code.list_backups(backups)) == 3
+
+
+def test_a_damaged_backup_is_refused_before_anything_is_written(tmp_path):
+    root, backups = str(tmp_path / 'data'), str(tmp_path / 'backups')
+    write_task_file(root, random.Random(2), 2000)
+    name = v3code.create_backup(root, backups)[0]
+    with open(os.path.join(root, 'tasks.txt'), 'a') as file:
+        file.write("one more | urgent | No due date | Work\n")
+    before = read_files(root)
+    for path in glob.glob(os.path.join(backups, 'chunks', '*', '*')):
+        with open(path, 'wb') as file:
+            file.write(zlib.compress(b'garbage'))
+    with pytest.raises(ValueError, match="damaged"):
+        v3code.restore_backup(name, root, backups)
+    assert read_files(root) == before
+
+
+def test_restore_keeps_files_it_does_not_own(tmp_path):
+    root, backups = str(tmp_path / 'data'), str(tmp_path / 'backups')
+    write_task_file(root, random.Random(3), 10)
+    name = v3code.create_backup(root, backups)[0]
+    with open(os.path.join(root, 'notes.md'), 'w') as file:
+        file.write("mine\n")
+    with open(os.path.join(root, 'views.txt'), 'w') as file:
+        file.write("work | category:Work\n")
+    v3code.restore_backup(name, root, backups)
+    assert sorted(os.listdir(root)) == ['notes.md', 'tasks.txt']
+    other = tmp_path / 'documents'
+    other.mkdir()
+    (other / 'thesis.txt').write_text("not task data\n")
+    with pytest.raises(ValueError, match="not a task data directory"):
+        v3code.restore_backup(name, str(other), backups)
+    assert os.listdir(other) == ['thesis.txt']
@@ -0,0 +1,44 @@
+"""Binary records decode to the tasks they encoded, and tasks that would not fit are refused up front."""
+import random
+
+import pytest
+
+import v3code
+
+from .helpers import edit, random_task
+
+
+def test_records_round_trip(memory_store):
+    rng = random.Random(34)
+    tasks = []
+    for _ in range(500):
+        tasks.append(random_task(rng, tasks))
+    tasks[0]['due_date'] = "someday"
+    tasks[1]['id'] = "not-a-hex-id"
+    decoded = v3code.decode_task_records(v3code.encode_task_records(tasks))
+    # Compared as text lines: empty fields are not stored by either format
+    assert list(map(v3code.format_task_line, decoded)) == list(map(v3code.format_task_line, tasks))
+
+
+def test_dates_are_stored_normalized(memory_store):
+    task = dict(random_task(random.Random(1)), due_date="1-1-2025")
+    decoded, = v3code.decode_task_records(v3code.encode_task_records([task]))
+    assert decoded['due_date'] == "01-01-2025"
+
+
+def test_the_longest_fields_still_fit(memory_store):
+    task = dict(random_task(random.Random(2)), task="x" * v3code.BINARY_MAX_LENGTH,
+                category="c" * v3code.BINARY_MAX_LENGTH)
+    v3code.commit_change({'type': 'add', 'index': 0, 'task': task})
+    assert v3code.decode_task_records(v3code.encode_task_records([task])) == [task]
+
+
+def test_fields_too_long_are_refused(memory_store):
+    task = random_task(random.Random(3))
+    with pytest.raises(ValueError, match="name is too long"):
+        v3code.commit_change({'type': 'add', 'index': 0, 'task': dict(task, task="é" * 40000)})
+    assert v3code.to_do_list == []
+    v3code.commit_change({'type': 'add', 'index': 0, 'task': task})
+    with pytest.raises(ValueError, match="rest of the task"):
+        edit(0, tags="t" * 70000)
+    assert v3code.to_do_list == [task]
@@ -0,0 +1,87 @@
+"""Pre-rendered views always match rendering them now, and the warmer never runs during an action."""
+import random
+import threading
+import time
+
+import v3code
+
+from .helpers import fill_list, random_edit
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_a_cached_view_is_never_stale(memory_store, capsys):
+    rng = random.Random(46)
+    fill_list(rng, 30)
+    for step in range(200):
+        # Render ahead like the warmer, then change the data before the view is opened
+        for view in v3code.PRERENDERED_VIEWS:
+            v3code.prerender_view(view)
+        random_edit(rng)
+        for view, render in v3code.PRERENDERED_VIEWS.items():
+            assert v3code.cached_view(view) == render(), (step, view)
+    capsys.readouterr()
+
+
+def test_the_warmer_builds_everything_while_idle(memory_store):
+    fill_list(random.Random(47), 30)
+    warmer = v3code.CacheWarmer()
+    warmer.start()
+    wait_for(lambda: warmer.finished == warmer.generation)
+    warmer.stop()
+    assert warmer.jobs_run == len(v3code.warm_jobs())
+    assert v3code._task_index['index'] is not None and v3code._fuzzy_state['active'] is not None
+    # Nothing changed, so the next idle period has nothing to redo but is still run once
+    warmer.start()
+    wait_for(lambda: warmer.finished == warmer.generation)
+    warmer.stop()
+    assert warmer.jobs_run == 2 * len(v3code.warm_jobs())
+
+
+def test_stopping_waits_for_the_running_job(memory_store, monkeypatch):
+    started, release, finished = threading.Event(), threading.Event(), []
+
+    def slow_job():
+        started.set()
+        release.wait(10)
+        finished.append(True)
+
+    second_job = []
+    monkeypatch.setattr(v3code, 'warm_jobs', lambda: [slow_job, lambda: second_job.append(True)])
+    warmer = v3code.CacheWarmer()
+    warmer.start()
+    assert started.wait(10)
+    stopper = threading.Thread(target=warmer.stop)
+    stopper.start()
+    stopper.join(0.2)
+    assert stopper.is_alive()
+    release.set()
+    stopper.join(10)
+    # The job had finished when stop() returned, and the jobs after it were skipped
+    assert finished == [True] and second_job == []
+
+
+def test_jobs_leave_the_saver_and_the_queued_lines_alone(memory_store, monkeypatch, capsys):
+    fill_list(random.Random(48), 30)
+    # As after switching stores: the feed's sequence is not known until changes.log is read
+    monkeypatch.setitem(v3code._feed_state, 'sequence', None)
+    queued = list(v3code._log_queue)
+    assert queued
+
+    def saver_used(*args):
+        raise AssertionError("a warm job used the saver")
+    monkeypatch.setattr(v3code, 'flush_saves', saver_used)
+    monkeypatch.setattr(v3code._saver, 'schedule', saver_used)
+    monkeypatch.setattr(v3code._saver, 'flush', saver_used)
+    for job in v3code.warm_jobs():
+        job()
+    assert v3code._log_queue == queued
+    monkeypatch.undo()
+    # The menu's thread renders the view itself, up to date
+    assert v3code.cached_view(1) == v3code.PRERENDERED_VIEWS[1]()
+    capsys.readouterr()
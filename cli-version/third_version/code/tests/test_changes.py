@@ -0,0 +1,98 @@
+"""The change feed lets a client rebuild the list from its events and resume where it left off."""
+import os
+import random
+import subprocess
+import sys
+from collections import deque
+
+import v3code
+
+from .helpers import fill_list, random_edit
+
+
+def apply_events(tasks, events):
+    """What a frontend does with the feed: apply each delta to its own copy of the tasks"""
+    for entry in events:
+        if entry['event'] == 'add':
+            tasks[entry['task']['id']] = dict(entry['task'])
+        elif entry['event'] in ('delete', 'complete'):
+            del tasks[entry['task_id']]
+        elif entry['event'] == 'edit':
+            tasks[entry['task_id']].update(entry['fields'])
+    return tasks
+
+
+def current_tasks():
+    return {task['id']: task for task in v3code.to_do_list}
+
+
+def forget_feed(monkeypatch, keep=1000):
+    """Drop the events held in memory, as a restart would"""
+    monkeypatch.setattr(v3code, '_feed_state', {'sequence': None, 'lines': 0})
+    monkeypatch.setattr(v3code, '_recent_changes', deque(maxlen=keep))
+
+
+def test_events_rebuild_the_list(memory_store, capsys):
+    rng = random.Random(32)
+    received = []
+    assert v3code.subscribe_changes(received.append, 0)
+    fill_list(rng, 20)
+    for _ in range(300):
+        random_edit(rng)
+    assert [entry['seq'] for entry in received] == list(range(1, len(received) + 1))
+    assert apply_events({}, received) == current_tasks()
+    v3code.unsubscribe_changes(received.append)
+    capsys.readouterr()
+
+
+def test_clients_resume_from_the_last_sequence_they_saw(memory_store, monkeypatch, capsys):
+    rng = random.Random(33)
+    fill_list(rng, 20)
+    for _ in range(100):
+        random_edit(rng)
+    events = v3code.read_changes(0)
+    for since in (0, 1, 57, len(events) - 1, len(events)):
+        assert v3code.read_changes(since) == events[since:]
+        assert v3code.read_changes(since, limit=5) == events[since:since + 5]
+    # After a restart the events come from changes.log
+    forget_feed(monkeypatch)
+    assert v3code.read_changes(40) == events[40:]
+    seen = 70
+    mirror = apply_events({}, events[:seen])
+    received = []
+    assert v3code.subscribe_changes(received.append, seen)
+    for _ in range(50):
+        random_edit(rng)
+    assert [entry['seq'] for entry in received] == list(range(seen + 1, v3code.latest_sequence() + 1))
+    assert apply_events(mirror, received) == current_tasks()
+    v3code.unsubscribe_changes(received.append)
+    capsys.readouterr()
+
+
+def test_a_client_behind_the_compacted_log_must_reload(memory_store, monkeypatch, capsys):
+    monkeypatch.setattr(v3code, 'FEED_RETENTION', 50)
+    forget_feed(monkeypatch, keep=20)
+    rng = random.Random(34)
+    fill_list(rng, 20)
+    for _ in range(150):
+        random_edit(rng)
+    latest = v3code.latest_sequence()
+    assert v3code.read_changes(0) is None
+    received = []
+    assert v3code.subscribe_changes(received.append, 0) is False
+    fill_list(rng, 1)
+    assert received == []
+    # Events still in the log are served as usual
+    assert [entry['seq'] for entry in v3code.read_changes(latest - 30)] == list(range(latest - 29, latest + 2))
+    capsys.readouterr()
+
+
+def test_ids_are_given_when_the_program_runs_not_on_import(tmp_path):
+    (tmp_path / 'tasks.txt').write_text("Pay rent | urgent | No due date | General\n")
+    env = dict(os.environ, TODO_DATA_DIR=str(tmp_path), TODO_WARM_CACHES='0')
+    code = os.path.dirname(v3code.__file__)
+    subprocess.run([sys.executable, '-c', 'import v3code'], cwd=code, env=env, check=True)
+    assert (tmp_path / 'tasks.txt').read_text() == "Pay rent | urgent | No due date | General\n"
+    subprocess.run([sys.executable, v3code.__file__, '--next', '1'], env=env, check=True, capture_output=True)
+    task, = v3code.TextFileStorage(str(tmp_path)).load_tasks(v3code.DEFAULT_LIST)
+    assert task['task'] == "Pay rent" and task['id']
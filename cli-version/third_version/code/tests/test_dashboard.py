@@ -0,0 +1,80 @@
+"""The dashboard follows the change log and redraws to what a freshly loaded one would show."""
+import io
+import random
+from datetime import datetime, timedelta
+
+import v3code
+
+from .helpers import edit, fill_list, random_edit
+
+HEIGHT = 30
+
+
+def commit():
+    """What quitting does. Tasks marked Done are archived: the list file does not hold them"""
+    v3code.archive_completed_tasks()
+    v3code.save_tasks()
+    v3code.flush_saves()
+
+
+def expected_order():
+    key = v3code.current_sort_key()
+    return sorted(key(task) + (task['id'],) for task in v3code.to_do_list)
+
+
+def test_the_dashboard_follows_random_edits(memory_store, capsys):
+    rng = random.Random(44)
+    fill_list(rng, 60)
+    commit()
+    dashboard = v3code.Dashboard(v3code.storage, v3code.current_list, io.StringIO())
+    dashboard.render(HEIGHT)
+    for step in range(300):
+        random_edit(rng)
+        if step % 10:
+            continue
+        commit()
+        dashboard.poll()
+        assert dashboard.order == expected_order()
+        dashboard.render(HEIGHT)
+        fresh = v3code.Dashboard(v3code.storage, v3code.current_list, io.StringIO())
+        fresh.updated = dashboard.updated
+        fresh.render(HEIGHT)
+        assert dashboard.screen == fresh.screen
+    capsys.readouterr()
+
+
+def test_one_edit_rewrites_few_rows(memory_store):
+    fill_list(random.Random(45), 200)
+    commit()
+    dashboard = v3code.Dashboard(v3code.storage, v3code.current_list, io.StringIO())
+    assert dashboard.render(HEIGHT) == HEIGHT
+    # Renaming the last task on screen only changes its own row (and the "Updated" line)
+    last_shown = dashboard.tasks[dashboard.order[HEIGHT - 5][-1]]
+    index = next(i for i, task in enumerate(v3code.to_do_list) if task['id'] == last_shown['id'])
+    edit(index, task="Renamed")
+    commit()
+    assert dashboard.poll()
+    assert dashboard.render(HEIGHT) <= 2
+    assert "Renamed" in dashboard.screen[HEIGHT - 2]
+    # Changes to tasks below the screen only touch the header
+    hidden = dashboard.tasks[dashboard.order[-1][-1]]
+    index = next(i for i, task in enumerate(v3code.to_do_list) if task['id'] == hidden['id'])
+    edit(index, task="Also renamed")
+    commit()
+    dashboard.poll()
+    assert dashboard.render(HEIGHT) <= 1
+
+
+def test_tasks_turn_overdue_when_the_day_changes(memory_store):
+    tomorrow = datetime.now() + timedelta(days=1)
+    v3code.commit_change({'type': 'add', 'index': 0, 'task': {
+        'id': v3code.new_task_id(), 'task': "Pay rent", 'status': "urgent", 'due_date': f"{tomorrow:%d-%m-%Y}",
+        'category': "General"}})
+    commit()
+    dashboard = v3code.Dashboard(v3code.storage, v3code.current_list, io.StringIO())
+    dashboard.render(HEIGHT)
+    assert "0 overdue" in dashboard.screen[0] and "[OVERDUE]" not in dashboard.screen[3]
+    assert not dashboard.tick(now=datetime.now())
+    assert dashboard.tick(now=tomorrow + timedelta(days=1))
+    dashboard.render(HEIGHT)
+    assert "1 overdue" in dashboard.screen[0] and "[OVERDUE]" in dashboard.screen[3]
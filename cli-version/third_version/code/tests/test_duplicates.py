@@ -0,0 +1,117 @@
+"""Duplicate names are found in normalized form, among active tasks and (probably) in the archive."""
+import random
+
+import pytest
+
+import v3code
+
+from .helpers import edit, fill_list
+
+
+def add_task(name, **fields):
+    task = dict({'id': v3code.new_task_id(), 'task': name, 'status': "non-urgent", 'due_date': "No due date",
+                 'category': "General"}, **fields)
+    v3code.commit_change({'type': 'add', 'index': len(v3code.to_do_list), 'task': task})
+    return task
+
+
+def duplicate_ids(name, exclude_id=None):
+    return [task['id'] for task in v3code.find_duplicates(name, exclude_id)[0]]
+
+
+def write_tasks_file(path, tasks):
+    path.write_text("".join(v3code.format_task_line(task) for task in tasks))
+    return str(path)
+
+
+def test_names_match_in_normalized_form(memory_store, capsys):
+    fill_list(random.Random(41), 20)
+    assert v3code.normalize_task_name("  Buy  MILK! ") == "buy milk"
+    milk = add_task("Buy milk")
+    assert duplicate_ids("buy, milk") == [milk['id']]
+    assert duplicate_ids("Buy milk", exclude_id=milk['id']) == []
+    edit(len(v3code.to_do_list) - 1, task="Buy oat milk")
+    assert duplicate_ids("buy milk") == []
+    assert duplicate_ids("BUY OAT-MILK") == [milk['id']]
+    assert not v3code.find_duplicates("buy oat milk")[1]
+    edit(len(v3code.to_do_list) - 1, status="Done")
+    v3code.archive_completed_tasks()
+    assert v3code.find_duplicates("buy oat milk") == ([], True)
+    v3code.undo_last_change()
+    assert duplicate_ids("buy oat milk") == [milk['id']]
+    capsys.readouterr()
+
+
+def test_bloom_filter_never_misses_and_rarely_errs():
+    bloom = v3code.BloomFilter.for_capacity(2000)
+    names = [f"task {i}" for i in range(2000)]
+    for name in names:
+        bloom.add(name)
+    assert all(name in bloom for name in names)
+    false_positives = sum(f"other {i}" in bloom for i in range(10000))
+    assert false_positives < 300
+    assert not bloom.is_full()
+
+
+def archived(name):
+    return {'task': name, 'status': "Done", 'due_date': "No due date", 'completion_date': "01-03-2026",
+            'category': "General"}
+
+
+@pytest.mark.parametrize('make_backend', [v3code.TextFileStorage, v3code.BinaryFileStorage])
+def test_the_filter_catches_up_and_is_rebuilt_after_truncation(tmp_path, make_backend):
+    root = str(tmp_path / 'data')
+    v3code.set_storage(make_backend(root))
+    v3code.append_to_archive([archived(f"Old {i}") for i in range(50)])
+    assert "old 7" in v3code.completed_bloom()
+    # Appends keep a loaded filter current without reading the archive again
+    start, _ = v3code.append_to_archive([archived("Water plants")])
+    assert "water plants" in v3code.completed_bloom()
+    v3code.save_completed_bloom()
+    # Records the saved filter has not seen are read after a restart
+    v3code.storage.append_archive([archived("Fix bike")])
+    v3code.set_storage(make_backend(root))
+    assert "fix bike" in v3code.completed_bloom()
+    assert v3code.storage.read_lines('completed_bloom.txt')[0].split()[-1] == str(v3code.storage.archive_size())
+    # A shorter archive than the filter covers means it was truncated: the filter is rebuilt
+    v3code.storage.truncate_archive(start)
+    bloom = v3code.completed_bloom()
+    assert "water plants" not in bloom and "fix bike" not in bloom and "old 7" in bloom
+
+
+def test_import_skips_merges_or_adds_duplicates(memory_store, tmp_path):
+    milk = add_task("Buy milk", tags="work")
+    path = write_tasks_file(tmp_path / 'import.txt', [
+        {'task': "buy milk!", 'status': "urgent", 'due_date': "01-06-2026", 'category': "Home", 'tags': "home"},
+        {'task': "Call mum", 'status': "urgent", 'due_date': "No due date", 'category': "General"},
+        {'task': "call MUM", 'status': "urgent", 'due_date': "No due date", 'category': "General"}])
+    assert v3code.import_tasks(path, 'skip') == (1, 0, 2, 0)
+    assert [task['task'] for task in v3code.to_do_list] == ["Buy milk", "Call mum"]
+    v3code.undo_last_change()
+    assert v3code.import_tasks(path, 'merge') == (1, 1, 1, 0)
+    merged = v3code.to_do_list[0]
+    assert (merged['id'], merged['status'], merged['due_date'], merged['category'], merged['tags']) == \
+           (milk['id'], "urgent", "01-06-2026", "Home", "work,home")
+    # The whole import is one change
+    v3code.undo_last_change()
+    assert v3code.to_do_list == [milk]
+    assert v3code.import_tasks(path, 'add') == (3, 0, 0, 0)
+    assert len(v3code.to_do_list) == 4 and len({task['id'] for task in v3code.to_do_list}) == 4
+
+
+def test_import_points_blockers_and_parents_at_the_imported_tasks(memory_store, tmp_path):
+    milk = add_task("Buy milk")
+    shop, cook, eat = (v3code.new_task_id() for _ in range(3))
+    path = write_tasks_file(tmp_path / 'import.txt', [
+        {'id': shop, 'task': "Buy milk", 'status': "urgent", 'due_date': "No due date", 'category': "General"},
+        {'id': cook, 'task': "Cook", 'status': "urgent", 'due_date': "No due date", 'category': "General",
+         'blocked_by': shop, 'parent': shop},
+        {'id': eat, 'task': "Eat", 'status': "urgent", 'due_date': "No due date", 'category': "General",
+         'blocked_by': f"{cook},{v3code.new_task_id()}", 'parent': v3code.new_task_id()}])
+    assert v3code.import_tasks(path, 'skip') == (2, 0, 1, 0)
+    imported = {task['task']: task for task in v3code.to_do_list}
+    # A skipped duplicate stands for the existing task; ids that are not in the file are dropped
+    assert imported["Cook"]['blocked_by'] == milk['id'] and imported["Cook"]['parent'] == milk['id']
+    assert imported["Eat"]['blocked_by'] == imported["Cook"]['id'] and imported["Eat"]['parent'] == ''
+    assert v3code.dependency_graph().blocked == {imported["Cook"]['id'], imported["Eat"]['id']}
+    assert v3code.subtask_tree().progress(milk['id']) == (0, 1)
@@ -0,0 +1,96 @@
+"""Fuzzy search finds names within the allowed number of edits, closest first."""
+import random
+
+import pytest
+
+import v3code
+
+
+def add_task(name, status="non-urgent"):
+    v3code.commit_change({'type': 'add', 'index': len(v3code.to_do_list), 'task': {
+        'id': v3code.new_task_id(), 'task': name, 'status': status, 'due_date': "No due date",
+        'category': "General"}})
+
+
+def archive(*names):
+    for name in names:
+        add_task(name, status="Done")
+    v3code.archive_completed_tasks()
+
+
+def found(query, include_archive=True):
+    return [(distance, source, sorted(task['task'] for task in tasks))
+            for distance, source, tasks in v3code.fuzzy_search(query, include_archive=include_archive)]
+
+
+def test_a_typo_finds_active_and_completed_tasks(memory_store, monkeypatch, capsys):
+    archive("Math homework", "Math homework", "Call dentist")
+    add_task("Finish homework")
+    add_task("Buy milk")
+    # Equally close: the shorter name comes first, wherever it is
+    assert found("homwork") == [(1, 'completed', ["Math homework"] * 2), (1, 'active', ["Finish homework"])]
+    assert found("homwork", include_archive=False) == [(1, 'active', ["Finish homework"])]
+    monkeypatch.setattr('builtins.input', lambda prompt="": "~homwork")
+    capsys.readouterr()
+    v3code.search_tasks()
+    out = capsys.readouterr().out
+    assert "Finish homework" in out and "Math homework" in out and "completed 2 times" in out
+    assert "Buy milk" not in out and "dentist" not in out
+
+
+def test_an_empty_exact_search_suggests_close_names(memory_store, monkeypatch, capsys):
+    add_task("Call dentist")
+    monkeypatch.setattr('builtins.input', lambda prompt="": "dentst")
+    v3code.search_tasks()
+    out = capsys.readouterr().out
+    assert "No tasks found" in out and "Did you mean:" in out and "Call dentist" in out
+
+
+def test_closer_names_rank_first(memory_store):
+    for name in ("Fix bake", "Fix bikes tomorrow", "Fix bike"):
+        add_task(name)
+    # Exact before one edit; then more shared trigrams, then shorter names
+    assert found("bike") == [(0, 'active', ["Fix bike"]), (0, 'active', ["Fix bikes tomorrow"]),
+                             (1, 'active', ["Fix bake"])]
+
+
+@pytest.mark.parametrize('name, allowed', [("plant", 1), ("dentist", 2), ("appointment", 3)])
+def test_allowed_edits_grow_with_the_query(memory_store, name, allowed):
+    assert v3code.fuzzy_max_distance(name) == allowed
+    add_task(f"Book {name} today")
+    for edits in range(allowed + 2):
+        # Replace every other letter from the start, so each replacement costs one edit
+        query = "".join("x" if i % 2 == 0 and i // 2 < edits else char for i, char in enumerate(name))
+        assert v3code.substring_edit_distance(query, f"book {name} today") == edits
+        assert [match[0] for match in found(query)] == ([edits] if edits <= allowed else [])
+
+
+def test_queries_under_three_letters_match_nothing(memory_store):
+    add_task("Go")
+    assert found("go") == []
+
+
+def test_archive_appends_extend_the_archive_index(memory_store):
+    archive("Water plants")
+    index = v3code.archive_fuzzy_index()
+    archive("Wash car")
+    assert v3code.archive_fuzzy_index() is index
+    assert found("wash cat") == [(1, 'completed', ["Wash car"])]
+
+
+def test_skipping_long_postings_finds_the_same_candidates(memory_store, monkeypatch):
+    rng = random.Random(42)
+    words = ["buy", "call", "clean", "write", "review", "fix", "plan", "book", "pay", "email", "report"]
+    index = v3code.TrigramIndex()
+    names = [f"{rng.choice(words)} {rng.choice(words)} {i}" for i in range(3000)]
+    for position, name in enumerate(names):
+        index.add(position, {'task': name})
+    for name in rng.sample(names, 50):
+        at = rng.randrange(len(name))
+        query = v3code.normalize_task_name(name[:at] + name[at + 1:])
+        trigrams = v3code.name_trigrams(query)
+        minimum = max(1, len(trigrams) - 3 * v3code.fuzzy_max_distance(query))
+        monkeypatch.setattr(v3code, 'FUZZY_LONG_POSTINGS', len(names))
+        every_posting = index.candidates(trigrams, minimum)
+        monkeypatch.setattr(v3code, 'FUZZY_LONG_POSTINGS', 100)
+        assert index.candidates(trigrams, minimum) == every_posting
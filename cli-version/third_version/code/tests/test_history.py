@@ -0,0 +1,106 @@
+"""Undo and redo walk back and forth through exactly the states the changes went through."""
+import random
+
+import pytest
+
+import v3code
+
+from .helpers import fill_list, random_change
+
+
+def snapshot():
+    """The list and the archive as they would be saved"""
+    return ([v3code.format_task_line(task) for task in v3code.to_do_list],
+            [v3code.format_archived_line(task) for task in v3code.load_archived_tasks()])
+
+
+def make_changes(rng, count):
+    states = [snapshot()]
+    while len(states) <= count:
+        undo_count = len(v3code.undo_stack)
+        random_change(rng)
+        if len(v3code.undo_stack) > undo_count:
+            states.append(snapshot())
+        v3code.save_tasks()
+    return states
+
+
+def test_undo_and_redo_retrace_every_state(memory_store, capsys):
+    rng = random.Random(35)
+    fill_list(rng, 20)
+    states = make_changes(rng, 60)
+    for state in reversed(states[:-1]):
+        v3code.undo_last_change()
+        assert snapshot() == state
+    for state in states[1:]:
+        v3code.redo_last_change()
+        assert snapshot() == state
+    capsys.readouterr()
+
+
+def test_a_new_change_clears_redo(memory_store, capsys):
+    rng = random.Random(4)
+    fill_list(rng, 10)
+    v3code.undo_last_change()
+    assert v3code.redo_stack
+    fill_list(rng, 1)
+    assert not v3code.redo_stack
+    capsys.readouterr()
+
+
+def test_history_survives_a_restart(file_store, capsys):
+    rng = random.Random(11)
+    fill_list(rng, 10)
+    states = make_changes(rng, 15)
+    v3code.set_storage(v3code.TextFileStorage(v3code.storage.root))
+    assert snapshot() == states[-1]
+    for state in reversed(states[-6:-1]):
+        v3code.undo_last_change()
+        assert snapshot() == state
+    # The undos were logged too, so after another restart redo picks up where they left off
+    v3code.set_storage(v3code.TextFileStorage(v3code.storage.root))
+    assert snapshot() == states[-6]
+    v3code.redo_last_change()
+    assert snapshot() == states[-5]
+    capsys.readouterr()
+
+
+def test_tags_can_be_added_to_a_task_without_any(memory_store, monkeypatch, capsys):
+    task = {'id': v3code.new_task_id(), 'task': "Call", 'status': "urgent", 'due_date': "No due date",
+            'category': "General"}
+    v3code.commit_change({'type': 'add', 'index': 0, 'task': task})
+    answers = iter(["1", "Call", "urgent", "", "99", "work,home"])
+    monkeypatch.setattr('builtins.input', lambda prompt="": next(answers))
+    v3code.edit_task()
+    assert v3code.to_do_list[0]['tags'] == "work,home"
+    v3code.undo_last_change()
+    assert v3code.to_do_list[0]['tags'] == ""
+    assert v3code.get_task_index().select("tag:work") == []
+    v3code.redo_last_change()
+    assert v3code.get_task_index().select("tag:work") == v3code.to_do_list
+    capsys.readouterr()
+
+
+def test_a_failed_archive_write_changes_nothing(memory_store, monkeypatch, capsys):
+    parent = {'id': v3code.new_task_id(), 'task': "Project", 'status': "urgent", 'due_date': "No due date",
+              'category': "General"}
+    child = {'id': v3code.new_task_id(), 'task': "Step", 'status': "Done", 'due_date': "No due date",
+             'category': "General", 'parent': parent['id']}
+    for task in (parent, child):
+        v3code.commit_change({'type': 'add', 'index': len(v3code.to_do_list), 'task': task})
+    before, sequence, undo_count = snapshot(), v3code.latest_sequence(), len(v3code.undo_stack)
+
+    def disk_full(tasks):
+        raise OSError("disk full")
+    monkeypatch.setattr(v3code.storage, 'append_archive', disk_full)
+    with pytest.raises(OSError):
+        v3code.archive_completed_tasks()
+    # The parent's done count is rolled back, and nothing was completed
+    assert snapshot() == before
+    assert len(v3code.undo_stack) == undo_count
+    assert 'complete' not in [event['event'] for event in v3code.read_changes(sequence)]
+    monkeypatch.undo()
+    v3code.archive_completed_tasks()
+    assert [task['task'] for task in v3code.to_do_list] == ["Project"]
+    assert v3code.to_do_list[0]['subtasks_done'] == "1"
+    capsys.readouterr()
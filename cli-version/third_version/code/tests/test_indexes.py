@@ -0,0 +1,109 @@
+"""Every index that follows the change feed must match one built from scratch after random edits and undos."""
+import random
+
+import v3code
+
+from .helpers import fill_list, random_edit
+
+STEPS = 400
+
+
+def assert_bitmap_index_matches(index):
+    fresh = v3code.TaskBitmapIndex(v3code.to_do_list, index.today)
+    assert index.tasks is v3code.to_do_list and index.all == fresh.all
+    tag_names = {tag_id: tag for tag, tag_id in fresh.tag_ids.items()}
+    for field, value in fresh.bitmaps:
+        value = tag_names[value] if field == 'tag' else value
+        assert index.term(field, value) == fresh.term(field, value), (field, value)
+    # Terms no task has any more must be empty
+    names = {tag_id: tag for tag, tag_id in index.tag_ids.items()}
+    for (field, value), bitmap in index.bitmaps.items():
+        value = names[value] if field == 'tag' else value
+        assert bitmap == fresh.term(field, value), (field, value)
+
+
+def assert_dependency_graph_matches(graph):
+    fresh = v3code.DependencyGraph(v3code.to_do_list)
+    assert graph.tasks.keys() == fresh.tasks.keys()
+    assert graph.blocked == fresh.blocked
+    assert {key: set(value) for key, value in graph.blockers.items() if value} == \
+           {key: set(value) for key, value in fresh.blockers.items() if value}
+    assert graph.chain == fresh.chain
+    assert graph.deadline == fresh.deadline
+    for task_id, blockers in graph.blockers.items():
+        assert all(graph.position[blocker] < graph.position[task_id] for blocker in blockers)
+
+
+def assert_subtask_tree_matches(tree):
+    fresh = v3code.SubtaskTree(v3code.to_do_list)
+    assert tree.tasks.keys() == fresh.tasks.keys()
+    assert tree.parent == fresh.parent
+    assert {key: value for key, value in tree.children.items() if value} == \
+           {key: value for key, value in fresh.children.items() if value}
+    assert (tree.open, tree.done, tree.due) == (fresh.open, fresh.done, fresh.due)
+
+
+def fuzzy_names(index):
+    return {index.names[name_id]: set(tasks) for name_id, tasks in enumerate(index.tasks) if tasks}
+
+
+def _fresh_fuzzy_index():
+    index = v3code.TrigramIndex()
+    for task in v3code.to_do_list:
+        index.add(task.get('id'), task)
+    return index
+
+
+def assert_saved_views_match(views):
+    index = v3code.TaskBitmapIndex(v3code.to_do_list)
+    for view in views.values():
+        expected, _ = v3code.run_query(view.query, index)
+        results = view.results(v3code._view_state['by_id'])
+        key = v3code.query_sort_key(view.query['sort'])
+        assert [key(task) for task in results] == [key(task) for task in expected], view.text
+        if view.query['limit'] is None:
+            assert {task['id'] for task in results} == {task['id'] for task in expected}, view.text
+
+
+def test_indexes_follow_random_edits_and_undos(memory_store, capsys):
+    rng = random.Random(26)
+    fill_list(rng, 40)
+    v3code.save_view("urgent work", "category:work status:urgent")
+    v3code.save_view("not done", "-status:done sort:category")
+    v3code.save_view("tagged", "tag:work sort:name")
+    v3code.save_view("soon", "due<01-01-2030 sort:status limit:5")
+    checked = 0
+    for step in range(STEPS):
+        random_edit(rng)
+        # Touch every index so they are all built and then kept up to date by the feed
+        views = v3code.saved_views()
+        index = v3code.get_task_index()
+        graph = v3code.dependency_graph()
+        tree = v3code.subtask_tree()
+        fuzzy = v3code.active_fuzzy_index()
+        if step % 10:
+            continue
+        assert_bitmap_index_matches(index)
+        assert_dependency_graph_matches(graph)
+        assert_subtask_tree_matches(tree)
+        assert fuzzy_names(fuzzy) == fuzzy_names(_fresh_fuzzy_index())
+        assert_saved_views_match(views)
+        checked += 1
+    assert checked == STEPS // 10
+    capsys.readouterr()
+
+
+def test_indexes_stay_incremental(memory_store):
+    """The feed updates the indexes in place instead of dropping them for a rebuild"""
+    rng = random.Random(3)
+    fill_list(rng, 20)
+    index, graph, tree, fuzzy = (v3code.get_task_index(), v3code.dependency_graph(), v3code.subtask_tree(),
+                                 v3code.active_fuzzy_index())
+    v3code.commit_change({'type': 'edit', 'index': 3, 'before': {'status': v3code.to_do_list[3]['status']},
+                          'after': {'status': "urgent"}})
+    assert v3code.get_task_index() is index
+    v3code.commit_change({'type': 'add', 'index': len(v3code.to_do_list),
+                          'task': {'id': v3code.new_task_id(), 'task': "new one", 'status': "urgent",
+                                   'due_date': "No due date", 'category': "General"}})
+    assert (v3code.dependency_graph(), v3code.subtask_tree(), v3code.active_fuzzy_index()) == (graph, tree, fuzzy)
+    assert v3code.to_do_list[3] in index.select("urgent")
@@ -0,0 +1,76 @@
+"""Named lists: creating, switching and searching them without mixing up their tasks or histories."""
+import random
+
+import v3code
+
+from .helpers import fill_list
+
+
+def answer(monkeypatch, *answers):
+    replies = iter(answers)
+    monkeypatch.setattr('builtins.input', lambda prompt="": next(replies))
+
+
+def create_list(monkeypatch, name):
+    answer(monkeypatch, str(len(v3code.storage.list_names()) + 1), name)
+    v3code.switch_task_list()
+
+
+def test_a_new_list_gets_its_own_shard(file_store, monkeypatch, capsys):
+    fill_list(random.Random(1), 5)
+    default_tasks = [dict(task) for task in v3code.to_do_list]
+    create_list(monkeypatch, "work")
+    assert v3code.current_list == "work" and v3code.to_do_list == [] and v3code.undo_stack == []
+    assert v3code.storage.list_names() == [v3code.DEFAULT_LIST, "work"]
+    assert v3code.storage.read_lines('lists.txt') == ["default | tasks.txt", "work | tasks_work.txt"]
+    # Switching saved the list it left
+    v3code.flush_saves()
+    assert v3code.storage.load_tasks(v3code.DEFAULT_LIST) == default_tasks
+    fill_list(random.Random(2), 3)
+    v3code.save_tasks()
+    v3code.flush_saves()
+    assert v3code.storage.load_tasks("work") == v3code.to_do_list
+    assert len(v3code.storage.read_lines('history_work.log')) == 3
+    create_list(monkeypatch, "work")
+    assert "already exists" in capsys.readouterr().out
+
+
+def test_lists_switched_back_to_stay_in_memory(memory_store, monkeypatch, capsys):
+    rng = random.Random(3)
+    fill_list(rng, 5)
+    default_tasks = v3code.to_do_list
+    create_list(monkeypatch, "home")
+    fill_list(rng, 2)
+    home_tasks = v3code.to_do_list
+    v3code.select_list(v3code.DEFAULT_LIST)
+    assert v3code.to_do_list is default_tasks and len(v3code.undo_stack) == 5
+    # Each list undoes its own changes
+    v3code.undo_last_change()
+    assert len(default_tasks) == 4 and len(home_tasks) == 2
+    v3code.select_list("home")
+    assert v3code.to_do_list is home_tasks and len(v3code.undo_stack) == 2 and v3code.redo_stack == []
+    # A list not loaded in this session is read from its shard, with its history
+    v3code.select_list(v3code.DEFAULT_LIST)
+    v3code.flush_saves()
+    v3code._loaded_lists.clear()
+    v3code.select_list("home")
+    assert v3code.to_do_list == home_tasks and v3code.to_do_list is not home_tasks
+    assert len(v3code.undo_stack) == 2
+    capsys.readouterr()
+
+
+def test_search_looks_in_every_list(memory_store, monkeypatch, capsys):
+    v3code.to_do_list.append({'task': "buy milk", 'status': "urgent", 'due_date': "No due date", 'category': "Home"})
+    create_list(monkeypatch, "work")
+    v3code.to_do_list.append({'task': "milk report", 'status': "urgent", 'due_date': "No due date",
+                              'category': "Work"})
+    capsys.readouterr()
+    answer(monkeypatch, "yes", "milk")
+    v3code.search_tasks()
+    output = capsys.readouterr().out
+    assert output.index("List: default") < output.index("buy milk") < output.index("List: work") < \
+           output.index("milk report")
+    answer(monkeypatch, "no", "milk")
+    v3code.search_tasks()
+    output = capsys.readouterr().out
+    assert "milk report" in output and "buy milk" not in output
@@ -0,0 +1,51 @@
+"""The query planner returns exactly what checking every clause on every task would."""
+import random
+
+import pytest
+
+import v3code
+
+from .helpers import fill_list, random_edit
+
+
+def random_query(rng):
+    clauses = []
+    for _ in range(rng.randrange(1, 4)):
+        kind = rng.random()
+        if kind < 0.2:
+            clause = f"status:{rng.choice(('urgent', 'semi-urgent', 'non-urgent', 'done'))}"
+        elif kind < 0.4:
+            clause = f"category:{rng.choice(('general', 'Work', 'home', 'school', 'none'))}"
+        elif kind < 0.55:
+            clause = f"tag:{rng.choice(('work', 'home', 'errand', 'missing'))}"
+        elif kind < 0.7:
+            clause = f"due:{rng.choice(v3code.DUE_BUCKETS)}"
+        elif kind < 0.85:
+            clause = f"due{rng.choice(('<', '<=', '>', '>='))}{rng.randrange(1, 29):02d}-06-2026"
+        else:
+            clause = rng.choice(("milk", "rep", "o", "write report", "bike"))
+            clause = f'"{clause}"' if ' ' in clause else clause
+        clauses.append(("-" if rng.random() < 0.2 else "") + clause)
+    return " ".join(clauses) + f" sort:{rng.choice(list(v3code.QUERY_SORTS))}"
+
+
+@pytest.mark.parametrize('threshold', [0, v3code.QUERY_SCAN_THRESHOLD, 10 ** 9])
+def test_planner_matches_brute_force(memory_store, monkeypatch, capsys, threshold):
+    monkeypatch.setattr(v3code, 'QUERY_SCAN_THRESHOLD', threshold)
+    rng = random.Random(39)
+    fill_list(rng, 300)
+    for step in range(200):
+        if step % 4 == 0:
+            random_edit(rng)
+        query = v3code.parse_query(random_query(rng))
+        index = v3code.get_task_index()
+        found, plan = v3code.run_query(query, index)
+        expected = [task for task in v3code.to_do_list
+                    if all(v3code._clause_matches(task, clause, index.today) for clause in query['clauses'])]
+        key = v3code.query_sort_key(query['sort'])
+        assert sorted(task['id'] for task in found) == sorted(task['id'] for task in expected), plan
+        assert [key(task) for task in found] == sorted(key(task) for task in expected)
+        limit = rng.randrange(1, 10)
+        top, _ = v3code.run_query(dict(query, limit=limit), index)
+        assert [key(task) for task in top] == sorted(key(task) for task in expected)[:limit]
+    capsys.readouterr()
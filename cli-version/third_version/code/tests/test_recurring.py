@@ -0,0 +1,70 @@
+"""Recurring tasks expand to the right dates, and completing one archives a single occurrence."""
+from datetime import datetime
+
+import v3code
+
+
+def dates(*texts):
+    return [datetime.strptime(text, "%d-%m-%Y") for text in texts]
+
+
+def recurring_task(rule, due_date):
+    return {'task': "Pay rent", 'status': "urgent", 'due_date': due_date, 'category': "Home", 'recurrence': rule}
+
+
+def archive_lines():
+    return [v3code.format_archived_line(task) for task in v3code.load_archived_tasks()]
+
+
+def answer(monkeypatch, *answers):
+    replies = iter(answers)
+    monkeypatch.setattr('builtins.input', lambda prompt="": next(replies))
+
+
+def test_monthly_rules_clamp_to_short_months_and_keep_their_day():
+    task = recurring_task(v3code.make_recurrence_rule('monthly', datetime(2026, 1, 31)), "31-01-2026")
+    assert list(v3code.iter_occurrences(task, end=datetime(2026, 5, 31))) == \
+           dates("31-01-2026", "28-02-2026", "31-03-2026", "30-04-2026", "31-05-2026")
+    assert v3code.next_occurrence("monthly:31", datetime(2028, 1, 31)) == datetime(2028, 2, 29)
+    assert v3code.next_occurrence("monthly:30", datetime(2026, 12, 30)) == datetime(2027, 1, 30)
+
+
+def test_daily_and_weekly_rules_skip_ahead_to_the_window():
+    today = datetime(2026, 3, 11)
+    for rule, step in (('daily', 1), ('weekly', 7)):
+        task = recurring_task(rule, "06-01-2020")
+        found = list(v3code.iter_occurrences(task, today, datetime(2026, 4, 30)))
+        # Stepping one occurrence at a time from the first due date gives the same dates
+        stepped, date = [], datetime(2020, 1, 6)
+        while date <= datetime(2026, 4, 30):
+            if date >= today:
+                stepped.append(date)
+            date = v3code.next_occurrence(rule, date)
+        assert found == stepped
+        assert found[0] >= today and (found[0] - today).days < step
+    # 06-01-2020 was a Monday
+    assert {date.weekday() for date in found} == {0}
+
+
+def test_a_one_off_task_has_one_occurrence():
+    task = dict(recurring_task(None, "10-03-2026"), recurrence='')
+    assert list(v3code.iter_occurrences(task)) == dates("10-03-2026")
+    assert list(v3code.iter_occurrences(task, datetime(2026, 3, 11))) == []
+
+
+def test_completing_an_occurrence_archives_it_and_moves_the_task_on(memory_store, monkeypatch, capsys):
+    task = recurring_task("monthly:31", "31-01-2026")
+    v3code.to_do_list.append(dict(task))
+    answer(monkeypatch, "1", "no")
+    v3code.mark_task_as_complete()
+    lines = archive_lines()
+    assert len(lines) == 1 and lines[0].startswith("Pay rent | Done | 31-01-2026 | ")
+    assert v3code.to_do_list == [dict(task, due_date="28-02-2026")]
+    v3code.undo_last_change()
+    assert archive_lines() == [] and v3code.to_do_list == [task]
+    v3code.redo_last_change()
+    assert archive_lines() == lines and v3code.to_do_list == [dict(task, due_date="28-02-2026")]
+    answer(monkeypatch, "1", "no")
+    v3code.mark_task_as_complete()
+    assert len(archive_lines()) == 2 and v3code.to_do_list[0]['due_date'] == "31-03-2026"
+    capsys.readouterr()
@@ -0,0 +1,102 @@
+"""Archive retention folds old completions into monthly rollups without changing any total."""
+import random
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+import v3code
+
+TODAY = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture(params=[v3code.TextFileStorage, v3code.BinaryFileStorage])
+def archive_store(request, tmp_path):
+    v3code.set_storage(request.param(str(tmp_path / 'data')))
+    v3code.to_do_list = []
+    yield v3code
+    v3code.flush_saves()
+
+
+def fill_archive(rng, count):
+    """Archive tasks completed over the last three years, a few of them without a usable date"""
+    for _ in range(count):
+        completion_date = f"{TODAY - timedelta(days=rng.randrange(1100)):%d-%m-%Y}"
+        if rng.random() < 0.05:
+            completion_date = rng.choice(("Unknown", "31-02-2020"))
+        due_date = rng.choice(("No due date", f"{TODAY - timedelta(days=rng.randrange(1200)):%d-%m-%Y}"))
+        v3code.append_to_archive([{'task': f"Task {rng.random()}", 'status': "Done", 'due_date': due_date,
+                                   'completion_date': completion_date,
+                                   'category': rng.choice(("Work", "Home", "General"))}])
+
+
+def printed_totals(capsys, monkeypatch):
+    """The completed counts shown by the statistics, completed tasks and activity screens"""
+    capsys.readouterr()
+    v3code.show_statistics()
+    statistics = int(re.search(r"Completed \(archived\): (\d+)", capsys.readouterr().out).group(1))
+    v3code.view_completed_tasks()
+    out = capsys.readouterr().out
+    listed = len(re.findall(r"^\d+\. ", out, re.M)) + sum(map(int, re.findall(r": (\d+) tasks$", out, re.M)))
+    answers = iter(["01-01-2000", "", "no"])
+    monkeypatch.setattr('builtins.input', lambda prompt="": next(answers))
+    v3code.view_activity()
+    out = capsys.readouterr().out
+    rolled_up = re.search(r"Plus (\d+) older completions", out)
+    activity = int(re.search(r"Tasks completed: (\d+)", out).group(1)) + (int(rolled_up.group(1)) if rolled_up else 0)
+    return statistics, listed, activity
+
+
+def dated(tasks):
+    return [task for task in tasks if v3code.parse_date(task['completion_date'])]
+
+
+def test_screens_show_the_same_totals_after_compaction(archive_store, capsys, monkeypatch):
+    fill_archive(random.Random(40), 300)
+    archive = v3code.load_archived_tasks()
+    before = printed_totals(capsys, monkeypatch)
+    assert before[:2] == (len(archive), len(archive)) and before[2] == len(dated(archive))
+    assert v3code.compact_archive(365) > 0
+    assert len(v3code.load_archived_tasks()) < len(archive)
+    assert printed_totals(capsys, monkeypatch) == before
+    assert v3code.summarize_archived_tasks() == v3code.count_by_category(archive)
+    # Compacting again finds nothing new to fold
+    assert v3code.compact_archive(365) == 0
+    assert printed_totals(capsys, monkeypatch) == before
+
+
+def test_rollups_sum_up_the_folded_tasks(archive_store):
+    fill_archive(random.Random(41), 200)
+    cutoff = TODAY - timedelta(days=365)
+    archive = v3code.load_archived_tasks()
+    folded = [task for task in dated(archive) if v3code.parse_date(task['completion_date']) < cutoff]
+    assert v3code.compact_archive(365) == len(folded)
+    rollups = v3code.load_archive_rollups()
+    assert sum(values[0] for values in rollups.values()) == len(folded)
+    late = [task for task in folded if v3code.parse_date(task['due_date'])
+            and v3code.parse_date(task['due_date']) < v3code.parse_date(task['completion_date'])]
+    assert sum(values[2] for values in rollups.values()) == len(late)
+    assert v3code.load_archived_tasks() == [task for task in archive if task not in folded]
+
+
+def test_the_completion_index_is_rebuilt(archive_store):
+    fill_archive(random.Random(42), 200)
+    v3code.compact_archive(365)
+    assert v3code.read_completion_index() == v3code._scan_completion_runs(0)
+    kept = v3code.load_archived_tasks()
+    assert v3code.load_completed_between(datetime(2000, 1, 1), TODAY) == dated(kept)
+    # New completions are indexed after the rewritten archive
+    v3code.append_to_archive([{'task': "New", 'status': "Done", 'due_date': "No due date",
+                               'completion_date': f"{TODAY:%d-%m-%Y}", 'category': "Work"}])
+    assert v3code.load_completed_between(TODAY, TODAY)[-1]['task'] == "New"
+    assert v3code.read_completion_index() == v3code._scan_completion_runs(0)
+
+
+def test_tasks_without_a_valid_completion_date_are_kept(archive_store):
+    fill_archive(random.Random(43), 100)
+    undated = [task for task in v3code.load_archived_tasks() if not v3code.parse_date(task['completion_date'])]
+    assert undated
+    archive = v3code.load_archived_tasks()
+    # A negative age puts the cutoff after today, so every dated task is folded
+    assert v3code.compact_archive(-1) == len(archive) - len(undated)
+    assert v3code.load_archived_tasks() == undated
@@ -0,0 +1,67 @@
+"""Saves are written behind, the list before the history and change feed lines of its changes."""
+import random
+
+import pytest
+
+import v3code
+
+from .helpers import fill_list
+
+
+class RecordingStorage(v3code.MemoryStorage):
+    """Records the files it writes, in order, and fails the next `failures` list saves"""
+
+    def __init__(self, failures=0):
+        super().__init__()
+        self.written, self.failures, self.attempts = [], failures, 0
+
+    def save_tasks(self, list_name, tasks):
+        self.attempts += 1
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        super().save_tasks(list_name, tasks)
+        self.written.append('tasks')
+
+    def append_lines(self, name, lines):
+        super().append_lines(name, lines)
+        self.written.append(name)
+
+
+@pytest.fixture
+def recording_store():
+    backend = RecordingStorage()
+    v3code.set_storage(backend)
+    yield backend
+    v3code.set_storage(v3code.MemoryStorage())
+
+
+def test_the_list_is_written_before_its_history(recording_store):
+    fill_list(random.Random(35), 5)
+    # The lines wait for the list to be saved
+    assert recording_store.written == []
+    v3code.save_tasks()
+    v3code.flush_saves()
+    assert recording_store.written[0] == 'tasks'
+    assert set(recording_store.written[1:]) == {'history.log', 'changes.log'}
+    assert len(recording_store.read_lines('history.log')) == 5
+
+
+def test_failed_saves_are_retried_a_few_times(recording_store):
+    recording_store.failures = 10
+    fill_list(random.Random(36), 5)
+    v3code.save_tasks()
+    with pytest.raises(OSError):
+        v3code.flush_saves()
+    assert recording_store.attempts == v3code.SAVE_RETRIES
+    assert isinstance(v3code._saver.failure(), OSError)
+    # The history waits for the list it describes
+    assert recording_store.written == []
+    recording_store.failures = 0
+    v3code.commit_change({'type': 'delete', 'index': 0, 'task': dict(v3code.to_do_list[0])})
+    v3code.save_tasks()
+    v3code.flush_saves()
+    assert v3code._saver.failure() is None
+    assert recording_store.written[0] == 'tasks'
+    assert len(recording_store.read_lines('history.log')) == 6
+    assert recording_store.load_tasks(v3code.DEFAULT_LIST) == v3code.to_do_list
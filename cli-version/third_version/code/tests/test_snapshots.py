@@ -0,0 +1,114 @@
+"""Readers pin committed versions of a list, which later edits never change."""
+import gc
+import random
+import threading
+
+import pytest
+
+import v3code
+
+from .helpers import fill_list, random_edit
+
+
+def lines(tasks):
+    return [v3code.format_task_line(task) for task in tasks]
+
+
+def test_a_pinned_version_survives_later_edits(memory_store, capsys):
+    rng = random.Random(43)
+    fill_list(rng, 20)
+    v3code.save_tasks()
+    pinned = v3code.task_snapshot()
+    committed = lines(v3code.to_do_list)
+    for _ in range(50):
+        random_edit(rng)
+        v3code.save_tasks()
+    assert lines(pinned) == committed
+    assert v3code.task_snapshot().version > pinned.version
+    assert lines(v3code.task_snapshot()) == lines(v3code.to_do_list)
+    assert pinned.get(pinned.tasks[0]['id']) is pinned.tasks[0]
+    with pytest.raises(TypeError):
+        pinned.tasks[0]['task'] = "changed"
+    capsys.readouterr()
+
+
+def test_a_version_is_freed_when_no_reader_holds_it(memory_store):
+    fill_list(random.Random(1), 5)
+    v3code.save_tasks()
+    pinned = v3code.task_snapshot()
+    version = pinned.version
+    v3code.save_tasks()
+    v3code.save_tasks()
+    assert v3code.snapshot_version(version) is pinned
+    del pinned
+    gc.collect()
+    assert v3code.snapshot_version(version) is None
+    # The current version stays available without any reader
+    current = v3code.task_snapshot().version
+    gc.collect()
+    assert v3code.snapshot_version(current) is not None
+
+
+def test_an_unloaded_list_is_read_from_its_file(file_store):
+    tasks = [{'id': v3code.new_task_id(), 'task': "Report", 'status': "urgent", 'due_date': "No due date",
+              'category': "Work"}]
+    v3code.storage.create_list("work")
+    v3code.storage.save_tasks("work", tasks)
+    snapshot = v3code.task_snapshot("work")
+    assert snapshot.version == 0 and snapshot.list_name == "work"
+    assert lines(snapshot) == lines(tasks)
+    assert v3code.task_snapshot("work") is snapshot
+    # A new version of the file is picked up on the next read
+    tasks.append(dict(tasks[0], id=v3code.new_task_id(), task="Slides"))
+    v3code.storage.save_tasks("work", tasks)
+    assert lines(v3code.task_snapshot("work")) == lines(tasks)
+    assert lines(snapshot) == lines(tasks[:1])
+
+
+def test_an_unloaded_list_does_not_wait_for_the_saver(memory_store, monkeypatch):
+    tasks = [{'id': v3code.new_task_id(), 'task': "Report", 'status': "urgent", 'due_date': "No due date",
+              'category': "Work"}]
+    v3code.storage.create_list("work")
+
+    def no_flush():
+        raise AssertionError("task_snapshot() waited for the saver")
+    monkeypatch.setattr(v3code, 'flush_saves', no_flush)
+    monkeypatch.setattr(v3code._saver, 'flush', no_flush)
+    queued_lines = len(v3code._log_queue)
+    # A save still waiting in the saver is already the committed version
+    v3code._saver.schedule(v3code.storage, "work", tasks)
+    assert lines(v3code.task_snapshot("work")) == lines(tasks)
+    assert len(v3code._log_queue) == queued_lines
+
+
+def test_readers_on_other_threads_see_only_committed_versions(memory_store, monkeypatch, capsys):
+    rng = random.Random(44)
+    fill_list(rng, 10)
+    committed = {}
+    publish = v3code.publish_snapshot
+
+    def recording_publish(tasks, list_name=None):
+        snapshot = publish(tasks, list_name)
+        committed[snapshot.version] = lines(v3code.to_do_list)
+        return snapshot
+
+    monkeypatch.setattr(v3code, 'publish_snapshot', recording_publish)
+    v3code.save_tasks()
+    done = threading.Event()
+    seen = []
+
+    def reader():
+        while not done.is_set():
+            snapshot = v3code.task_snapshot()
+            seen.append((snapshot.version, lines(snapshot)))
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    for _ in range(200):
+        random_edit(rng)
+        v3code.save_tasks()
+    done.set()
+    thread.join()
+    assert len({version for version, _ in seen}) > 1
+    assert all(committed[version] == tasks for version, tasks in seen)
+    capsys.readouterr()
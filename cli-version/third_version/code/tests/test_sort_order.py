@@ -0,0 +1,88 @@
+"""sort_tasks(), next_tasks(), queries, saved views and the dashboard list tasks in the same order."""
+import io
+import random
+
+import v3code
+
+from .helpers import fill_list, random_edit
+
+
+def test_every_listing_uses_the_rolled_up_order(memory_store, capsys):
+    rng = random.Random(49)
+    v3code.save_view("everything", "sort:due")
+    for _ in range(30):
+        random_edit(rng)
+    v3code.save_tasks()
+    v3code.flush_saves()
+    dashboard = v3code.Dashboard(v3code.storage, v3code.current_list, io.StringIO())
+    for step in range(600):
+        random_edit(rng)
+        if step % 20:
+            continue
+        key = v3code.current_sort_key()
+        expected = sorted(key(task) for task in v3code.to_do_list)
+        assert [key(task) for task in v3code.sort_tasks(v3code.to_do_list)] == expected
+        assert [key(task) for task in v3code.next_tasks(v3code.to_do_list, 10, include_done=True)] == expected[:10]
+        found, _ = v3code.run_query(v3code.parse_query("sort:due"), v3code.get_task_index())
+        assert [key(task) for task in found] == expected
+        assert [key(task) for task in v3code.open_saved_view("everything")] == expected
+        # The dashboard follows the change log, which is written after the list is saved
+        v3code.save_tasks()
+        v3code.flush_saves()
+        dashboard.poll()
+        assert dashboard.order == sorted(key(task) + (task['id'],) for task in v3code.to_do_list)
+    capsys.readouterr()
+
+
+def test_next_tasks_filters_keep_the_order(memory_store, capsys):
+    rng = random.Random(39)
+    fill_list(rng, 200)
+    for step in range(100):
+        random_edit(rng)
+        if step % 10:
+            continue
+        key = v3code.current_sort_key()
+        ordered = sorted(map(key, v3code.to_do_list))
+        assert [key(task) for task in v3code.next_tasks(v3code.to_do_list, 10, include_done=True)] == ordered[:10]
+        not_done = [task for task in v3code.to_do_list if task['status'] != "Done"]
+        assert [key(task) for task in v3code.next_tasks(v3code.to_do_list, 10)] == \
+               sorted(map(key, not_done))[:10]
+        work = [task for task in not_done if task['category'] == "Work"]
+        assert [key(task) for task in v3code.next_tasks(v3code.to_do_list, 5, category="work")] == \
+               sorted(map(key, work))[:5]
+        done = [task for task in v3code.to_do_list if task['status'] == "Done"]
+        assert len(v3code.next_tasks(v3code.to_do_list, 1000, status="Done")) == len(done)
+    capsys.readouterr()
+
+
+def test_parent_sorts_by_its_earliest_open_subtask(memory_store):
+    parent = {'id': v3code.new_task_id(), 'task': "Project", 'status': "non-urgent", 'due_date': "01-06-2030",
+              'category': "General"}
+    other = {'id': v3code.new_task_id(), 'task': "Other", 'status': "non-urgent", 'due_date': "01-03-2030",
+             'category': "General"}
+    child = {'id': v3code.new_task_id(), 'task': "Step", 'status': "non-urgent", 'due_date': "01-01-2030",
+             'category': "General", 'parent': parent['id']}
+    for task in (parent, other, child):
+        v3code.commit_change({'type': 'add', 'index': len(v3code.to_do_list), 'task': task})
+    roots = [task['task'] for task in v3code.next_tasks(v3code.subtask_tree().roots(), 2)]
+    assert roots == ["Project", "Other"]
+    found, _ = v3code.run_query(v3code.parse_query("status:non-urgent sort:status"), v3code.get_task_index())
+    assert [task['task'] for task in found][-1] == "Other"
+
+
+def test_saved_view_resorts_a_parent_brought_back_by_undo(memory_store, capsys):
+    parent = {'id': v3code.new_task_id(), 'task': "Project", 'status': "non-urgent", 'due_date': "01-06-2030",
+              'category': "General"}
+    other = {'id': v3code.new_task_id(), 'task': "Other", 'status': "non-urgent", 'due_date': "01-03-2030",
+             'category': "General"}
+    child = {'id': v3code.new_task_id(), 'task': "Step", 'status': "urgent", 'due_date': "01-01-2030",
+             'category': "General", 'parent': parent['id']}
+    for task in (parent, other, child):
+        v3code.commit_change({'type': 'add', 'index': len(v3code.to_do_list), 'task': task})
+    v3code.save_view("by due", "sort:due")
+    v3code.commit_change({'type': 'delete', 'index': 0, 'task': dict(v3code.to_do_list[0])})
+    assert [task['task'] for task in v3code.open_saved_view("by due")] == ["Step", "Other"]
+    v3code.undo_last_change()
+    # Project comes back at its subtask's due date, ahead of Other
+    assert [task['task'] for task in v3code.open_saved_view("by due")] == ["Step", "Project", "Other"]
+    capsys.readouterr()
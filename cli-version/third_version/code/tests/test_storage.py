@@ -0,0 +1,145 @@
+"""Every storage backend gives back the tasks, archive, categories and lines it was given."""
+import os
+import random
+from datetime import datetime
+
+import pytest
+
+import v3code
+
+from .helpers import fill_list, random_edit, random_task
+
+
+BACKENDS = {'memory': lambda root: v3code.MemoryStorage(), 'text': v3code.TextFileStorage,
+            'binary': v3code.BinaryFileStorage}
+
+
+@pytest.fixture(params=list(BACKENDS))
+def backend(request, tmp_path):
+    return BACKENDS[request.param](str(tmp_path / 'data'))
+
+
+def archived_tasks(rng, count, completion_date):
+    return [{'task': f"Task {rng.random()}", 'status': "Done", 'due_date': "No due date",
+             'completion_date': completion_date, 'category': rng.choice(("Work", "Home"))} for _ in range(count)]
+
+
+# Fields holding task ids, which are random
+ID_FIELDS = ('id', 'blocked_by', 'parent')
+
+
+def without_empty(tasks, ids=True):
+    """The tasks as the file formats keep them: empty fields are not stored"""
+    return [{key: value for key, value in task.items() if value != '' and (ids or key not in ID_FIELDS)}
+            for task in tasks]
+
+
+def stored_data(backend, ids=False):
+    """Everything a backend holds, without the random task ids unless asked for"""
+    tasks = without_empty(backend.load_tasks(v3code.DEFAULT_LIST), ids)
+    archive = [task for chunk in backend.map_archive(list) for task in chunk]
+    return tasks, archive, backend.load_categories()
+
+
+def test_task_lists_round_trip(backend):
+    rng = random.Random(1)
+    tasks = []
+    for _ in range(50):
+        tasks.append(random_task(rng, tasks))
+    tasks[3]['recurrence'] = "monthly:31"
+    backend.save_tasks(v3code.DEFAULT_LIST, tasks)
+    backend.create_list("work")
+    backend.save_tasks("work", tasks[:5])
+    assert backend.list_names() == [v3code.DEFAULT_LIST, "work"]
+    assert without_empty(backend.load_tasks(v3code.DEFAULT_LIST)) == without_empty(tasks)
+    assert without_empty(backend.load_tasks("work")) == without_empty(tasks[:5])
+    assert backend.map_task_lists(len) == {v3code.DEFAULT_LIST: 50, "work": 5}
+    backend.save_tasks("work", [])
+    assert backend.load_tasks("work") == []
+
+
+def test_archive_append_read_and_truncate(backend):
+    rng = random.Random(2)
+    first, second = archived_tasks(rng, 10, "01-03-2026"), archived_tasks(rng, 5, "02-03-2026")
+    assert backend.archive_version() is None and backend.map_archive(list) == []
+    start, middle = backend.append_archive(first)
+    version = backend.archive_version()
+    middle_again, end = backend.append_archive(second)
+    assert start < middle == middle_again < end == backend.archive_size()
+    assert backend.archive_version() != version
+    assert [task for chunk in backend.map_archive(list) for task in chunk] == first + second
+    assert backend.read_archive_range(middle, end) == second
+    records = list(backend.iter_archive())
+    assert [task for task, _, _ in records] == first + second
+    assert all(record_end == next_start for (_, _, record_end), (_, next_start, _) in zip(records, records[1:]))
+    assert list(backend.iter_archive(middle)) == records[10:]
+    backend.truncate_archive(middle)
+    assert backend.archive_size() == middle
+    assert [task for chunk in backend.map_archive(list) for task in chunk] == first
+    assert backend.archive_version() not in (None, version)
+
+
+def test_categories_and_lines_round_trip(backend):
+    categories = {'Work': v3code.Colors.RED, 'Home': v3code.Colors.BLUE, 'General': v3code.Colors.RESET}
+    backend.save_categories(categories)
+    assert backend.load_categories() == categories
+    assert backend.read_lines('history.log') == []
+    backend.append_lines('history.log', ["one", "two"])
+    backend.append_lines('history.log', ["three"])
+    assert backend.read_lines('history.log') == ["one", "two", "three"]
+    backend.write_lines('history.log', ["four"])
+    assert backend.read_lines('history.log') == ["four"]
+
+
+def test_every_backend_ends_up_with_the_same_data(tmp_path, capsys):
+    results = []
+    for name, make_backend in BACKENDS.items():
+        backend = make_backend(str(tmp_path / name))
+        v3code.set_storage(backend)
+        rng = random.Random(33)
+        fill_list(rng, 20)
+        for _ in range(200):
+            random_edit(rng)
+        v3code.archive_completed_tasks()
+        v3code.save_tasks()
+        v3code.flush_saves()
+        results.append(stored_data(backend))
+    assert results[0] == results[1] == results[2]
+    capsys.readouterr()
+
+
+def test_convert_round_trip(tmp_path, capsys):
+    root = str(tmp_path / 'data')
+    v3code.set_storage(v3code.TextFileStorage(root))
+    rng = random.Random(34)
+    fill_list(rng, 30)
+    for _ in range(100):
+        random_edit(rng)
+    v3code.archive_completed_tasks()
+    v3code.save_tasks()
+    v3code.flush_saves()
+    text = stored_data(v3code.TextFileStorage(root), ids=True)
+    v3code.convert_storage(root, to_binary=True)
+    assert stored_data(v3code.BinaryFileStorage(root), ids=True) == text
+    # The completion index is rebuilt for the binary positions
+    v3code.set_storage(v3code.BinaryFileStorage(root))
+    assert v3code.load_completed_between(datetime(2000, 1, 1), datetime(2100, 1, 1)) == text[1]
+    for name in os.listdir(root):
+        if name.endswith('.txt') and name != 'categories.txt':
+            os.remove(os.path.join(root, name))
+    v3code.convert_storage(root, to_binary=False)
+    assert stored_data(v3code.TextFileStorage(root), ids=True) == text
+    capsys.readouterr()
+
+
+@pytest.mark.parametrize('make_backend', [v3code.TextFileStorage, v3code.BinaryFileStorage])
+def test_saves_keep_file_permissions(tmp_path, make_backend):
+    backend = make_backend(str(tmp_path / 'data'))
+    umask = os.umask(0)
+    os.umask(umask)
+    backend.save_tasks(v3code.DEFAULT_LIST, [])
+    path = backend.list_file(v3code.DEFAULT_LIST)
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~umask
+    os.chmod(path, 0o640)
+    backend.save_tasks(v3code.DEFAULT_LIST, [random_task(random.Random(5))])
+    assert os.stat(path).st_mode & 0o777 == 0o640
@@ -0,0 +1,47 @@
+"""Subtask progress stays right as subtasks are completed, archived and brought back by undo."""
+import v3code
+
+
+def add_task(name, parent='', due_date="No due date"):
+    task = {'id': v3code.new_task_id(), 'task': name, 'status': "non-urgent", 'due_date': due_date,
+            'category': "General", 'parent': parent}
+    v3code.commit_change({'type': 'add', 'index': len(v3code.to_do_list), 'task': task})
+    return task['id']
+
+
+def set_status(task_id, status):
+    index = next(index for index, task in enumerate(v3code.to_do_list) if task['id'] == task_id)
+    v3code.commit_change({'type': 'edit', 'index': index, 'before': {'status': v3code.to_do_list[index]['status']},
+                          'after': {'status': status}})
+
+
+def test_progress_counts_archived_subtasks(memory_store, capsys):
+    project = add_task("Project")
+    step = add_task("Step", project)
+    detail = add_task("Detail", step)
+    add_task("Other step", project)
+    tree = v3code.subtask_tree()
+    assert tree.progress(project) == (0, 3)
+    set_status(detail, "Done")
+    assert tree.progress(project) == (1, 3) and tree.progress(step) == (1, 1)
+    # Archived subtasks leave the list but stay counted in their parent
+    v3code.archive_completed_tasks()
+    assert detail not in tree.tasks
+    assert tree.progress(project) == (1, 3) and tree.progress(step) == (1, 1)
+    assert next(task for task in v3code.to_do_list if task['id'] == step)['subtasks_done'] == "1"
+    v3code.undo_last_change()
+    assert detail in tree.tasks
+    assert tree.progress(project) == (1, 3) and tree.progress(step) == (1, 1)
+    assert v3code.subtask_tree() is tree
+    capsys.readouterr()
+
+
+def test_a_parent_sorts_by_its_earliest_open_subtask(memory_store):
+    project = add_task("Project", due_date="01-06-2030")
+    add_task("Other", due_date="01-03-2030")
+    step = add_task("Step", project, due_date="01-01-2030")
+    roots = [task['task'] for task in v3code.sort_tasks(v3code.subtask_tree().roots())]
+    assert roots == ["Project", "Other"]
+    set_status(step, "Done")
+    roots = [task['task'] for task in v3code.sort_tasks(v3code.subtask_tree().roots())]
+    assert roots == ["Other", "Project"]
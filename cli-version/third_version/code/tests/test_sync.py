@@ -0,0 +1,214 @@
+"""Two stores edited separately hold the same tasks after a sync."""
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import v3code
+
+from .helpers import edit, fill_list, random_edit
+
+
+def store_contents(root):
+    backend = v3code.storage_for(root)
+    tasks = {task['id']: v3code.format_task_line(task) for task in backend.load_tasks(v3code.DEFAULT_LIST)}
+    archive = sorted(v3code.format_archived_line(task) for chunk in backend.map_archive(list) for task in chunk)
+    return tasks, archive, backend.load_categories()
+
+
+def open_store(root):
+    v3code.set_storage(v3code.TextFileStorage(str(root)))
+
+
+def close_store():
+    """What quitting does: archive the tasks marked Done and save"""
+    v3code.archive_completed_tasks()
+    v3code.save_tasks()
+
+
+@pytest.mark.parametrize('seed', [6, 26, 48, 75])
+def test_random_edits_on_both_sides_converge(tmp_path, capsys, seed):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    second.mkdir()
+    rng = random.Random(seed)
+    open_store(first)
+    fill_list(rng, 30)
+    v3code.save_tasks()
+    v3code.sync_stores(str(second))
+    assert store_contents(first) == store_contents(second)
+    for _ in range(5):
+        for root in (second, first):
+            open_store(root)
+            for _ in range(rng.randrange(1, 15)):
+                random_edit(rng)
+            close_store()
+        v3code.sync_stores(str(second))
+        assert store_contents(first) == store_contents(second)
+    capsys.readouterr()
+
+
+def test_newest_edit_of_a_field_wins(tmp_path):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    second.mkdir()
+    open_store(first)
+    fill_list(random.Random(1), 3)
+    v3code.save_tasks()
+    v3code.sync_stores(str(second))
+    edit(0, status="urgent", task="renamed here")
+    v3code.save_tasks()
+    open_store(second)
+    edit(0, status="non-urgent")
+    v3code.save_tasks()
+    open_store(first)
+    v3code.sync_stores(str(second))
+    for root in (first, second):
+        task = v3code.storage_for(str(root)).load_tasks(v3code.DEFAULT_LIST)[0]
+        assert (task['task'], task['status']) == ("renamed here", "non-urgent")
+
+
+def test_separate_edits_on_both_sides_converge(tmp_path):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    second.mkdir()
+    open_store(first)
+    fill_list(random.Random(5), 10)
+    v3code.save_tasks()
+    v3code.sync_stores(str(second))
+    assert store_contents(first) == store_contents(second)
+    edit(1, task="renamed in first")
+    fill_list(random.Random(6), 2)
+    close_store()
+    open_store(second)
+    edit(2, status="urgent")
+    v3code.commit_change({'type': 'delete', 'index': 5, 'task': dict(v3code.to_do_list[5])})
+    edit(7, status="Done")
+    close_store()
+    open_store(first)
+    v3code.sync_stores(str(second))
+    v3code.flush_saves()
+    assert store_contents(first) == store_contents(second)
+    assert len(v3code.to_do_list) == 10
+
+
+def test_a_second_sync_sends_only_new_changes(tmp_path):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    second.mkdir()
+    open_store(first)
+    fill_list(random.Random(2), 200)
+    v3code.save_tasks()
+    v3code.sync_stores(str(second))
+    v3code.sync_stores(str(second))
+    edit(5, status="urgent")
+    v3code.save_tasks()
+    sent, applied, _ = v3code.sync_stores(str(second))
+    assert (sent, applied) == (1, 0)
+
+
+def exchange_file(path, sender, receiver):
+    open_store(sender)
+    sent = v3code.write_sync_file(path)
+    open_store(receiver)
+    return sent, v3code.read_sync_file(path)
+
+
+def test_sync_files_carry_only_new_changes_once_both_sides_know_each_other(tmp_path):
+    first, second, path = tmp_path / 'first', tmp_path / 'second', str(tmp_path / 'changes.sync')
+    open_store(first)
+    fill_list(random.Random(3), 20)
+    v3code.save_tasks()
+    # Until a store has heard back from its peer it sends its whole list
+    assert exchange_file(path, first, second) == (20, (20, 0))
+    assert exchange_file(path, second, first) == (20, (0, 20))
+    assert exchange_file(path, first, second) == (0, (0, 0))
+    edit(0, task="changed in second")
+    edit(4, status="Done")
+    close_store()
+    assert exchange_file(path, second, first) == (3, (3, 0))
+    close_store()
+    v3code.flush_saves()
+    assert store_contents(first) == store_contents(second)
+
+
+def test_a_file_that_is_not_a_sync_file_is_refused(memory_store, tmp_path):
+    path = tmp_path / 'tasks.txt'
+    path.write_text('{"task": "not a sync file"}\n')
+    with pytest.raises(ValueError, match="not a sync file"):
+        v3code.read_sync_file(str(path))
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def sync_with_server(root, expected):
+    """Serve the store in root from its own process, as it would run on another machine, and
+    connect_sync() to it from the current store"""
+    port = free_port()
+    env = dict(os.environ, TODO_DATA_DIR=str(root), TODO_WARM_CACHES='0')
+    server = subprocess.Popen([sys.executable, v3code.__file__, '--sync-serve', str(port)], env=env,
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        for _ in range(100):
+            try:
+                assert v3code.connect_sync('127.0.0.1', port) == expected
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.05)
+        else:
+            pytest.fail("the sync server did not start")
+        server.wait(timeout=30)
+    finally:
+        server.kill()
+
+
+def test_sync_over_a_socket(tmp_path):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    second.mkdir()
+    open_store(first)
+    fill_list(random.Random(4), 10)
+    v3code.save_tasks()
+    v3code.sync_stores(str(second))
+    edit(2, status="urgent", task="changed in first")
+    v3code.save_tasks()
+    open_store(second)
+    edit(3, task="changed in second")
+    v3code.save_tasks()
+    v3code.flush_saves()
+    open_store(first)
+    sync_with_server(second, (1, 1, 0))
+    v3code.flush_saves()
+    assert store_contents(first) == store_contents(second)
+
+
+def test_the_undo_history_is_kept_until_the_peer_has_the_changes(tmp_path):
+    first, second, path = tmp_path / 'first', tmp_path / 'second', str(tmp_path / 'changes.sync')
+    second.mkdir()
+    open_store(first)
+    fill_list(random.Random(5), 10)
+    v3code.save_tasks()
+    v3code.sync_stores(str(second))
+    # A sync file may never be read, so writing one keeps the history
+    edit(1, task="changed in first")
+    v3code.save_tasks()
+    assert v3code.write_sync_file(path) == 1
+    assert v3code.undo_stack
+    open_store(second)
+    assert v3code.read_sync_file(path) == (1, 0)
+    assert v3code.write_sync_file(path) == 0
+    open_store(first)
+    assert v3code.undo_stack
+    # The answer applies nothing here, but confirms the change arrived
+    assert v3code.read_sync_file(path) == (0, 0)
+    assert v3code.undo_stack == []
+    # Over a socket the store serving confirms the bundle it applied
+    edit(2, task="changed again")
+    v3code.save_tasks()
+    sync_with_server(second, (1, 0, 0))
+    assert v3code.undo_stack == []
+    v3code.flush_saves()
+    assert store_contents(first) == store_contents(second)
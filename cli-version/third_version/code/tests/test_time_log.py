@@ -0,0 +1,108 @@
+"""Time tracking: totals and day buckets match the sessions, whether built live or replayed from the log."""
+import random
+from datetime import date, datetime
+
+import pytest
+
+import v3code
+
+from .helpers import edit, fill_list
+
+
+class Clock:
+    """Stands in for time.time() so sessions have known lengths"""
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+def tracked_state():
+    state = v3code.time_tracking()
+    return state['running'], state['totals'], state['days'], state['day_list']
+
+
+def reload_time_log():
+    v3code._time_state['storage'] = None
+    return tracked_state()
+
+
+def test_totals_add_up_sessions_split_at_midnight(memory_store, monkeypatch):
+    clock = Clock(datetime(2026, 3, 10, 23, 30).timestamp())
+    monkeypatch.setattr(v3code.time, 'time', clock)
+    fill_list(random.Random(5), 2)
+    work, home = v3code.to_do_list
+    v3code.start_timer(dict(work, category='Work'))
+    clock.now += 3600
+    assert v3code.start_timer(dict(home, category='Home')) == work['id']
+    clock.now += 600
+    assert v3code.stop_timer(home['id']) == 600
+    assert v3code.time_spent(work['id']) == 3600
+    assert v3code.time_totals(date(2026, 3, 10), date(2026, 3, 10)) == {'Work': 1800}
+    assert v3code.time_totals(date(2026, 3, 11), date(2026, 3, 11)) == {'Work': 1800, 'Home': 600}
+    assert v3code.time_totals(date(2026, 3, 1), date(2026, 3, 31), by='task') == {work['id']: 3600, home['id']: 600}
+    v3code.start_timer(dict(home, category='Home'))
+    clock.now += 60
+    assert v3code.time_totals(date(2026, 3, 11), date(2026, 3, 11))['Home'] == 660
+
+
+def test_replaying_the_log_gives_the_live_state(memory_store, monkeypatch):
+    rng = random.Random(50)
+    clock = Clock(datetime(2026, 1, 1, 8, 0).timestamp())
+    monkeypatch.setattr(v3code.time, 'time', clock)
+    fill_list(rng, 10)
+    for step in range(300):
+        task = rng.choice(v3code.to_do_list)
+        clock.now += rng.randrange(1, 20000)
+        if task['id'] in v3code.time_tracking()['running']:
+            v3code.stop_timer(task['id'])
+        else:
+            v3code.start_timer(task)
+        if step == 150:
+            v3code.save_time_summary()
+    live = tracked_state()
+    assert reload_time_log() == live
+    # Without the summary the whole log is replayed
+    v3code.storage.write_lines(v3code.TIME_SUMMARY, [])
+    assert reload_time_log() == live
+
+
+def test_completing_a_task_stops_its_timer(memory_store, monkeypatch, capsys):
+    clock = Clock(datetime(2026, 5, 4, 9, 0).timestamp())
+    monkeypatch.setattr(v3code.time, 'time', clock)
+    fill_list(random.Random(6), 3)
+    task = v3code.to_do_list[1]
+    v3code.start_timer(task)
+    clock.now += 900
+    edit(1, status="Done")
+    v3code.archive_completed_tasks()
+    assert task['id'] not in v3code.time_tracking()['running']
+    assert v3code.time_tracking()['totals'][task['id']] == 900
+    capsys.readouterr()
+
+
+def test_names_with_tabs_and_newlines_are_logged_safely(file_store, monkeypatch):
+    clock = Clock(datetime(2026, 6, 1, 9, 0).timestamp())
+    monkeypatch.setattr(v3code.time, 'time', clock)
+    fill_list(random.Random(7), 1)
+    task = dict(v3code.to_do_list[0], task="plan\ttrip\nto \\ \"Rome\"", category="Work\tHome")
+    v3code.start_timer(task)
+    clock.now += 120
+    v3code.stop_timer(task['id'])
+    assert len(v3code.storage.read_lines(v3code.TIME_LOG)) == 2
+    live = tracked_state()
+    assert reload_time_log() == live
+    assert v3code.time_tracking()['names'][task['id']] == ["Work\tHome", task['task']]
+
+
+def test_a_damaged_line_is_an_error(memory_store, monkeypatch):
+    monkeypatch.setattr(v3code.time, 'time', Clock(datetime(2026, 6, 1, 9, 0).timestamp()))
+    fill_list(random.Random(8), 1)
+    v3code.start_timer(v3code.to_do_list[0])
+    v3code.storage.append_lines(v3code.TIME_LOG, ["S\t1780000000\tabc\tWork"])
+    with pytest.raises(ValueError, match="damaged line"):
+        reload_time_log()
+    # It stays an error instead of being skipped on the next load
+    with pytest.raises(ValueError, match="damaged line"):
+        v3code.time_tracking()
@@ -1,6 +1,38 @@
 
 import os
-from datetime import datetime
+import sys
+import json
+import struct
+import time
+import heapq
+import bisect
+import shlex
+import operator
+import uuid
+import hashlib
+import calendar
+import zlib
+import atexit
+import threading
+import socket
+import weakref
+from types import MappingProxyType
+from collections import deque, Counter
+from functools import partial, lru_cache
+from itertools import groupby
+import tempfile
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+# NumPy is optional - it is only needed for the analytics mode
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Archives smaller than this (in bytes) are parsed in a single process
+PARALLEL_ARCHIVE_THRESHOLD = 8 * 1024 * 1024
 
 # ANSI color codes for different urgencies
 class Colors:
@@ -14,179 +46,3647 @@ class Colors:
     BOLD = '\033[1m'      # bold text
     RESET = '\033[0m'     # Reset to default color
 
-# Available colors for categories
-CATEGORY_COLORS = {
-    '1': '\033[94m',  # Blue
-    '2': '\033[92m',  # Green
-    '3': '\033[93m',  # Yellow
-    '4': '\033[95m',  # Magenta
-    '5': '\033[96m',  # Cyan
-    '6': '\033[97m',  # White
-    '7': '\033[91m',  # Red
-}
+# Available colors for categories
+CATEGORY_COLORS = {
+    '1': '\033[94m',  # Blue
+    '2': '\033[92m',  # Green
+    '3': '\033[93m',  # Yellow
+    '4': '\033[95m',  # Magenta
+    '5': '\033[96m',  # Cyan
+    '6': '\033[97m',  # White
+    '7': '\033[91m',  # Red
+}
+
+def get_color_for_status(status, due_date=None):
+    """Return the appropriate color code for a task status"""
+    # Check if overdue first (for non-completed tasks)
+    if due_date and status.lower() != "done" and is_overdue(due_date):
+        return Colors.MAGENTA + Colors.BOLD
+    
+    status_lower = status.lower()
+    if status_lower == "urgent":
+        return Colors.RED
+    elif status_lower == "semi-urgent":
+        return Colors.YELLOW
+    elif status_lower == "non-urgent":
+        return Colors.GREEN
+    elif status_lower == "done":
+        return Colors.BLUE
+    else:
+        return Colors.RESET
+
+# Cached, since the same few dates are parsed over and over when sorting and filtering
+@lru_cache(maxsize=4096)
+def parse_date(date_string):
+    """Parse date string and return datetime object. Return None for invalid dates."""
+    if date_string == "No due date":
+        return None
+    try:
+        return datetime.strptime(date_string, "%d-%m-%Y")
+    except ValueError:
+        return None
+
+def is_overdue(due_date_str):
+    """Check if a task is overdue"""
+    if due_date_str == "No due date":
+        return False
+    due_date = parse_date(due_date_str)
+    if due_date is None:
+        return False
+    return due_date < datetime.now()
+
+def get_urgency_priority(status):
+    """Return numeric priority for urgency (lower number = higher priority)"""
+    status_lower = status.lower()
+    if status_lower == "urgent":
+        return 1
+    elif status_lower == "semi-urgent":
+        return 2
+    elif status_lower == "non-urgent":
+        return 3
+    elif status_lower == "done":
+        return 4
+    else:
+        return 5
+
+def task_sort_key(task):
+    """Due date first, then urgency"""
+    due_date = parse_date(task['due_date'])
+    urgency_priority = get_urgency_priority(task['status'])
+    
+    # Tasks with no due date go to the end
+    if due_date is None:
+        return (datetime.max, urgency_priority)
+    else:
+        return (due_date, urgency_priority)
+
+def sort_tasks(tasks):
+    """Sort tasks by due date first, then by urgency. A parent task sorts by the earliest
+    due date of it and its open subtasks."""
+    return sorted(tasks, key=current_sort_key())
+
+def current_sort_key():
+    """The key sort_tasks() orders by. Everything listing tasks "by due date" uses it, so they all agree."""
+    rolled_due = subtask_tree().due
+    return partial(rolled_up_sort_key, rolled_due) if rolled_due else task_sort_key
+
+def rolled_up_sort_key(rolled_due, task):
+    key = task_sort_key(task)
+    due_date = rolled_due.get(task.get('id'))
+    return (due_date, key[1]) if due_date is not None and due_date < key[0] else key
+
+def next_tasks(tasks, count, category=None, status=None, include_done=False):
+    """The first 'count' tasks in sort_tasks() order, optionally only one category or status.
+    Keeps a heap of 'count' tasks while scanning, O(n log count) instead of a full sort."""
+    category = category.lower() if category else None
+    status = status.lower() if status else None
+    matching = (task for task in tasks
+                if (category is None or task.get('category', 'General').lower() == category)
+                and (status is None or task['status'].lower() == status)
+                and (include_done or status == 'done' or task['status'].lower() != 'done'))
+    return heapq.nsmallest(count, matching, key=current_sort_key())
+
+# Optional task fields, stored as "key=value;key=value" in the fifth column of tasks.txt
+TASK_EXTRA_FIELDS = ('id', 'recurrence', 'tags', 'blocked_by', 'parent', 'subtasks_done')
+
+# Value of a field that a task dict does not have
+TASK_FIELD_DEFAULTS = {'category': 'General', 'tags': '', 'blocked_by': '', 'parent': '', 'subtasks_done': ''}
+
+def format_task_extras(task, exclude=()):
+    return ";".join(f"{key}={task[key]}" for key in TASK_EXTRA_FIELDS if task.get(key) and key not in exclude)
+
+def parse_task_extras(text):
+    extras = {}
+    for pair in text.split(';'):
+        if '=' in pair:
+            key, value = pair.split('=', 1)
+            if key in TASK_EXTRA_FIELDS:
+                extras[key] = value
+    return extras
+
+# Recurrence rules are "daily", "weekly" or "monthly:<day of month>"
+RECURRENCE_CHOICES = ('daily', 'weekly', 'monthly')
+
+def make_recurrence_rule(frequency, due_date):
+    """Build the stored rule for a frequency, anchoring monthly rules to the due date's day"""
+    if frequency == 'monthly':
+        return f"monthly:{due_date.day}"
+    return frequency
+
+def next_occurrence(rule, date):
+    """Return the first occurrence of a recurrence rule after 'date'"""
+    frequency, _, anchor = rule.partition(':')
+    if frequency == 'daily':
+        return date + timedelta(days=1)
+    if frequency == 'weekly':
+        return date + timedelta(weeks=1)
+    if frequency == 'monthly':
+        year, month = (date.year + 1, 1) if date.month == 12 else (date.year, date.month + 1)
+        # Clamp to the end of short months without losing the anchor day
+        day = min(int(anchor) if anchor.isdigit() else date.day, calendar.monthrange(year, month)[1])
+        return date.replace(year=year, month=month, day=day)
+    raise ValueError(f"unknown recurrence rule '{rule}'")
+
+def iter_occurrences(task, start=None, end=None):
+    """Yield the task's due dates between start and end (inclusive), generating
+    recurring occurrences lazily instead of storing them"""
+    due_date = parse_date(task['due_date'])
+    if due_date is None:
+        return
+    rule = task.get('recurrence')
+    if rule in ('daily', 'weekly') and start is not None and due_date < start:
+        # Skip straight to the window instead of stepping through every missed occurrence
+        step = 1 if rule == 'daily' else 7
+        due_date += timedelta(days=(start - due_date).days // step * step)
+    while end is None or due_date <= end:
+        if start is None or due_date >= start:
+            yield due_date
+        if not rule:
+            return
+        due_date = next_occurrence(rule, due_date)
+
+def recurrence_text(task):
+    rule = task.get('recurrence')
+    return f" (repeats {rule.partition(':')[0]})" if rule else ""
+
+# Tags are stored as "tags=work,home" in the extras: lower case, without spaces or separators
+def normalize_tags(text):
+    """Turn user input like "Work, big project" into the stored form "work,big-project" """
+    tags = []
+    for tag in text.split(','):
+        tag = "-".join(tag.strip().lower().replace(';', ' ').replace('=', ' ').split())
+        if tag and tag not in tags:
+            tags.append(tag)
+    return ",".join(tags)
+
+def task_tags(task):
+    return [tag for tag in task.get('tags', '').split(',') if tag]
+
+def tags_text(task):
+    return "".join(f" #{tag}" for tag in task_tags(task))
+
+# Parse one line of tasks.txt. Returns None for blank or malformed lines.
+def parse_task_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    # Parse format: "task_name | status | due_date | category | extras"
+    parts = line.split(' | ')
+    if len(parts) < 2:
+        return None
+    task_name = parts[0]
+    status = parts[1]
+    due_date = parts[2] if len(parts) > 2 else "No due date"
+    category = parts[3] if len(parts) > 3 else "General"
+    task = {"task": task_name, "status": status, "due_date": due_date, "category": category}
+    if len(parts) > 4:
+        task.update(parse_task_extras(parts[4]))
+    return task
+
+def format_task_line(task):
+    category = task.get('category', 'General')
+    extras = format_task_extras(task)
+    line = f"{task['task']} | {task['status']} | {task['due_date']} | {category}"
+    return f"{line} | {extras}\n" if extras else f"{line}\n"
+
+# Load tasks from a task list file
+def load_tasks_file(path):
+    tasks = []
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            for line in file:
+                task = parse_task_line(line)
+                if task:
+                    tasks.append(task)
+    return tasks
+
+# Parse one line of completed_tasks.txt. Returns None for blank or malformed lines.
+def parse_archived_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    # Parse format: "task_name | status | due_date | completion_date | category"
+    parts = line.split(' | ')
+    if len(parts) < 3:
+        return None
+    task_name = parts[0]
+    status = parts[1]
+    due_date = parts[2] if len(parts) > 2 else "No due date"
+    completion_date = parts[3] if len(parts) > 3 else "Unknown"
+    category = parts[4] if len(parts) > 4 else "General"
+    return {"task": task_name, "status": status, "due_date": due_date, "completion_date": completion_date, "category": category}
+
+def format_archived_line(task):
+    category = task.get('category', 'General')
+    return f"{task['task']} | {task['status']} | {task['due_date']} | {task['completion_date']} | {category}\n"
+
+# Split a file into byte ranges that start and end on newline boundaries
+def split_file_on_lines(path, chunk_count):
+    size = os.path.getsize(path)
+    if chunk_count <= 1 or size == 0:
+        return [(0, size)]
+    ranges = []
+    with open(path, 'rb') as file:
+        start = 0
+        for i in range(1, chunk_count):
+            if start >= size:
+                break
+            file.seek(max(start, size * i // chunk_count))
+            file.readline()  # move to the start of the next full line
+            end = min(file.tell(), size)
+            if end > start:
+                ranges.append((start, end))
+                start = end
+        if start < size:
+            ranges.append((start, size))
+    return ranges
+
+# Parse the archive lines inside one byte range of a file
+def _read_archive_range(path, start, end):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start).decode('utf-8', errors='replace')
+    tasks = []
+    for line in data.splitlines():
+        task = parse_archived_line(line)
+        if task:
+            tasks.append(task)
+    return tasks
+
+# Worker: apply a reducer to the archive tasks inside one byte range
+def _archive_chunk_worker(args):
+    reducer, path, start, end = args
+    return reducer(_read_archive_range(path, start, end))
+
+# Worker: apply a reducer to the tasks of one list file
+def _task_list_worker(args):
+    reducer, loader, path = args
+    return reducer(loader(path))
+
+# Reducer: count tasks per category
+def count_by_category(tasks):
+    summary = {}
+    for task in tasks:
+        category = task.get('category', 'General')
+        summary[category] = summary.get(category, 0) + 1
+    return summary
+
+# Storage backends. The rest of the program only talks to the module-level 'storage'
+# object, so a different engine can be dropped in with set_storage().
+#
+# Archive positions (returned by append_archive and used by the completion index) are
+# opaque to callers: byte offsets for the text backend, record numbers in memory.
+# Read once at import, while only one thread runs (os.umask can only be read by setting it)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+class TextFileStorage:
+    """The original pipe-separated text files, under a configurable root directory"""
+
+    archive_file = 'completed_tasks.txt'
+    list_loader = staticmethod(load_tasks_file)
+
+    def __init__(self, root='CLI_VERSION'):
+        self.root = root
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def _prepare(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    # Auxiliary line-based files (indexes, history, change feed)
+    def read_lines(self, name):
+        if not os.path.exists(self.path(name)):
+            return []
+        with open(self.path(name), 'r') as file:
+            return [line.rstrip('\n') for line in file]
+
+    def append_lines(self, name, lines):
+        self._prepare()
+        with open(self.path(name), 'a') as file:
+            file.writelines(line + "\n" for line in lines)
+
+    def write_lines(self, name, lines):
+        self._write_atomic(self.path(name), "".join(line + "\n" for line in lines).encode('utf-8'))
+
+    def read_lines_from(self, name, offset):
+        """The complete lines after a byte offset and the offset to continue from,
+        or None if the file is now shorter than offset (it was rewritten)"""
+        path = self.path(name)
+        if not os.path.exists(path):
+            return ([], 0) if offset == 0 else None
+        with open(path, 'rb') as file:
+            if file.seek(0, os.SEEK_END) < offset:
+                return None
+            file.seek(offset)
+            data = file.read()
+        end = data.rfind(b'\n') + 1
+        return data[:end].decode('utf-8').splitlines(), offset + end
+
+    def _write_atomic(self, path, data):
+        """Replace a file without ever leaving it truncated: write a temporary file next to it,
+        fsync it and rename it over the original. A crash keeps either the old or the new file."""
+        self._prepare()
+        directory = os.path.dirname(path) or '.'
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            # mkstemp creates the file private; give it the permissions the file had (or would get)
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o666 & ~_UMASK)
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        # fsync the directory too, so the rename itself survives a crash (not possible on Windows)
+        if hasattr(os, 'O_DIRECTORY'):
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    # Categories
+    def load_categories(self):
+        categories = {}
+        for line in self.read_lines('categories.txt'):
+            line = line.strip()
+            if line and ' | ' in line:
+                name, color = line.split(' | ')
+                # Convert string escape sequences to actual ANSI codes
+                color = color.encode().decode('unicode_escape')
+                categories[name] = color
+        return categories
+
+    def save_categories(self, categories):
+        self.write_lines('categories.txt', [f"{name} | {color}" for name, color in categories.items()])
+
+    # Task lists: "name | file" lines in lists.txt; the default list is tasks.txt
+    def _list_registry(self):
+        lists = {DEFAULT_LIST: 'tasks.txt'}
+        for line in self.read_lines('lists.txt'):
+            if ' | ' in line:
+                name, filename = line.strip().split(' | ', 1)
+                lists[name] = filename
+        return lists
+
+    def list_names(self):
+        return list(self._list_registry())
+
+    def create_list(self, list_name):
+        lists = self._list_registry()
+        lists[list_name] = f"tasks_{list_name}.txt"
+        self.write_lines('lists.txt', [f"{name} | {filename}" for name, filename in lists.items()])
+
+    def list_file(self, list_name):
+        return self.path(self._list_registry().get(list_name, 'tasks.txt'))
+
+    def load_tasks(self, list_name):
+        return load_tasks_file(self.list_file(list_name))
+
+    def save_tasks(self, list_name, tasks):
+        self._write_atomic(self.list_file(list_name), "".join(format_task_line(task) for task in tasks).encode('utf-8'))
+
+    def list_version(self, list_name):
+        """A value that changes whenever the list's file does (for caches)"""
+        path = self.list_file(list_name)
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def map_task_lists(self, reducer):
+        """Apply reducer(tasks) to every list, reading the files in parallel when they are big"""
+        lists = self._list_registry()
+        paths = [self.list_file(name) for name in lists]
+        total_size = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+        args = [(reducer, self.list_loader, path) for path in paths]
+        if len(paths) > 1 and total_size >= PARALLEL_ARCHIVE_THRESHOLD and (os.cpu_count() or 1) > 1:
+            with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count())) as executor:
+                results = list(executor.map(_task_list_worker, args))
+        else:
+            results = [_task_list_worker(arg) for arg in args]
+        return dict(zip(lists, results))
+
+    # Archive of completed tasks
+    def archive_size(self):
+        path = self.path(self.archive_file)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def archive_version(self):
+        """A value that changes whenever the archive does (for caches)"""
+        path = self.path(self.archive_file)
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def map_archive(self, reducer, workers=None):
+        """Apply reducer(tasks) to the archive, in parallel chunks for big files. Results come back in file order."""
+        path = self.path(self.archive_file)
+        if not os.path.exists(path):
+            return []
+        if workers is None:
+            workers = os.cpu_count() or 1
+        size = os.path.getsize(path)
+        if workers <= 1 or size < PARALLEL_ARCHIVE_THRESHOLD:
+            return [_archive_chunk_worker((reducer, path, 0, size))]
+        # Use a few chunks per worker so one slow chunk does not hold up the others
+        ranges = split_file_on_lines(path, workers * 4)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_archive_chunk_worker, [(reducer, path, start, end) for start, end in ranges]))
+
+    def read_archive_range(self, start, end):
+        return _read_archive_range(self.path(self.archive_file), start, end)
+
+    def iter_archive(self, start=0):
+        """Yield (task or None, start, end) for each archive record from position 'start'"""
+        path = self.path(self.archive_file)
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as file:
+            file.seek(start)
+            offset = start
+            for raw_line in file:
+                line_end = offset + len(raw_line)
+                yield parse_archived_line(raw_line.decode('utf-8', errors='replace')), offset, line_end
+                offset = line_end
+
+    def append_archive(self, tasks):
+        """Append archived tasks (with completion_date set). Returns the (start, end) positions written."""
+        self._prepare()
+        with open(self.path(self.archive_file), 'ab') as file:
+            start = file.tell()
+            file.write("".join(format_archived_line(task) for task in tasks).encode('utf-8'))
+            return start, file.tell()
+
+    def truncate_archive(self, start):
+        with open(self.path(self.archive_file), 'r+b') as file:
+            file.truncate(start)
+
+    def rewrite_archive(self, tasks):
+        """Replace the whole archive (positions of the kept tasks change)"""
+        self._write_atomic(self.path(self.archive_file), "".join(format_archived_line(task) for task in tasks).encode('utf-8'))
+
+class MemoryStorage:
+    """Keeps everything in memory as Python objects - for tests and benchmarks"""
+
+    def __init__(self):
+        self.files = {}
+        self.categories = {}
+        self.lists = {DEFAULT_LIST: []}
+        self.archive = []
+        self.archive_changes = 0
+        self.list_changes = {}
+
+    def read_lines(self, name):
+        return list(self.files.get(name, []))
+
+    def append_lines(self, name, lines):
+        self.files.setdefault(name, []).extend(lines)
+
+    def write_lines(self, name, lines):
+        self.files[name] = list(lines)
+
+    def read_lines_from(self, name, offset):
+        lines = self.files.get(name, [])
+        if len(lines) < offset:
+            return None
+        return lines[offset:], len(lines)
+
+    def load_categories(self):
+        return dict(self.categories)
+
+    def save_categories(self, categories):
+        self.categories = dict(categories)
+
+    def list_names(self):
+        return list(self.lists)
+
+    def create_list(self, list_name):
+        self.lists.setdefault(list_name, [])
+
+    def load_tasks(self, list_name):
+        return [dict(task) for task in self.lists.get(list_name, [])]
+
+    def save_tasks(self, list_name, tasks):
+        self.lists[list_name] = [dict(task) for task in tasks]
+        self.list_changes[list_name] = self.list_changes.get(list_name, 0) + 1
+
+    def list_version(self, list_name):
+        return self.list_changes.get(list_name, 0)
+
+    def map_task_lists(self, reducer):
+        return {name: reducer(self.load_tasks(name)) for name in self.lists}
+
+    def archive_size(self):
+        return len(self.archive)
+
+    def archive_version(self):
+        return (len(self.archive), self.archive_changes) if self.archive else None
+
+    def map_archive(self, reducer, workers=None):
+        return [reducer([dict(task) for task in self.archive])] if self.archive else []
+
+    def read_archive_range(self, start, end):
+        return [dict(task) for task in self.archive[start:end]]
+
+    def iter_archive(self, start=0):
+        for position in range(start, len(self.archive)):
+            yield dict(self.archive[position]), position, position + 1
+
+    def append_archive(self, tasks):
+        # Keep the same fields the text archive stores
+        start = len(self.archive)
+        self.archive.extend({"task": task['task'], "status": task['status'], "due_date": task['due_date'],
+                             "completion_date": task['completion_date'], "category": task.get('category', 'General')}
+                            for task in tasks)
+        self.archive_changes += 1
+        return start, len(self.archive)
+
+    def truncate_archive(self, start):
+        del self.archive[start:]
+        self.archive_changes += 1
+
+    def rewrite_archive(self, tasks):
+        self.archive = []
+        self.append_archive(tasks)
+
+# Binary record format (.bin files). A file starts with BINARY_MAGIC, followed by records:
+#   string record: type 0, u16 length, UTF-8 bytes - defines the next string code
+#   task record:   type 1, u16 name length, i32 due date, i32 completion date, u16 status code,
+#                  u16 category code, u16 extras length, 6-byte task id, name bytes, extras bytes
+# Dates are date ordinals; 0 means "No due date"/"Unknown", and a negative value -(code + 1)
+# points at a string for text that is not a valid date. Statuses and categories are string
+# codes, so each distinct value is stored once per file and shared when decoding.
+BINARY_MAGIC = b'TDB1'
+_RECORD_STRING = 0
+_RECORD_TASK = 1
+_STRING_HEADER = struct.Struct('<BH')
+_TASK_HEADER = struct.Struct('<BHiiHHH6s')
+_NO_BINARY_ID = bytes(6)
+# Longest name, extras or string a record can hold (u16 lengths); also the number of string codes
+BINARY_MAX_LENGTH = 0xFFFF
+
+def check_task_fits(task):
+    """Raise ValueError if a field of the task is too long to be saved in the binary format.
+    Both backends refuse it, so a list can always be moved from one to the other."""
+    fields = [("task name", task.get('task', '')), ("status", task.get('status', '')),
+              ("due date", task.get('due_date', '')), ("category", task.get('category', 'General')),
+              ("rest of the task (tags, parent, ...)", format_task_extras(task, exclude=('id',)))]
+    for label, text in fields:
+        size = len(text.encode('utf-8'))
+        if size > BINARY_MAX_LENGTH:
+            raise ValueError(f"the {label} is too long ({size:,} bytes, at most {BINARY_MAX_LENGTH:,})")
+
+# Parsed dates are cached both ways so equal dates are only converted once
+_date_ordinals = {}
+_ordinal_date_strings = {}
+
+class BinaryRecordEncoder:
+    """Encodes tasks as binary records, emitting string records for values it has not seen"""
+
+    def __init__(self, strings=None):
+        self.codes = {string: code for code, string in enumerate(strings or [])}
+
+    def _code(self, string, out):
+        code = self.codes.get(string)
+        if code is None:
+            if len(self.codes) > BINARY_MAX_LENGTH:
+                raise ValueError("too many different statuses, categories and invalid dates for the binary format")
+            code = self.codes[string] = len(self.codes)
+            data = string.encode('utf-8')
+            out += _STRING_HEADER.pack(_RECORD_STRING, len(data))
+            out += data
+        return code
+
+    def _date(self, text, empty, out):
+        if text == empty:
+            return 0
+        if text not in _date_ordinals:
+            date = parse_date(text)
+            _date_ordinals[text] = date.toordinal() if date is not None else None
+        ordinal = _date_ordinals[text]
+        if ordinal is not None:
+            return ordinal
+        return -(self._code(text, out) + 1)
+
+    def encode(self, tasks, archived=False):
+        out = bytearray()
+        for task in tasks:
+            name = task['task'].encode('utf-8')
+            # Archived records keep only the archive fields, like completed_tasks.txt
+            task_id = '' if archived else task.get('id', '')
+            try:
+                id_bytes = bytes.fromhex(task_id) if len(task_id) == 12 else None
+            except ValueError:
+                id_bytes = None
+            # Ids that do not fit the packed field are kept in the extras instead
+            extras = b'' if archived else format_task_extras(task, exclude=('id',) if id_bytes else ()).encode('utf-8')
+            due = self._date(task['due_date'], "No due date", out)
+            completion = self._date(task['completion_date'], "Unknown", out) if archived else 0
+            status = self._code(task['status'], out)
+            category = self._code(task.get('category', 'General'), out)
+            out += _TASK_HEADER.pack(_RECORD_TASK, len(name), due, completion, status, category,
+                                     len(extras), id_bytes or _NO_BINARY_ID)
+            out += name
+            out += extras
+        return bytes(out)
+
+def _decode_binary_date(value, strings, empty):
+    if value == 0:
+        return empty
+    if value < 0:
+        return strings[-value - 1]
+    text = _ordinal_date_strings[value] = datetime.fromordinal(value).strftime("%d-%m-%Y")
+    return text
+
+def decode_binary_records(buffer, strings, start=0, end=None, archived=False, collect_strings=True, positions=False):
+    """Decode the task records in buffer[start:end]. Fields are read with struct.unpack_from
+    straight from a memoryview. String records extend 'strings' unless collect_strings is
+    False (when the table is already complete). With positions=True, returns
+    (task, record_start, record_end) tuples instead of tasks."""
+    view = memoryview(buffer)
+    if end is None:
+        end = len(view)
+    unpack_task = _TASK_HEADER.unpack_from
+    task_header_size = _TASK_HEADER.size
+    date_strings = _ordinal_date_strings
+    results = []
+    offset = start
+    while offset < end:
+        if view[offset] == _RECORD_STRING:
+            _, length = _STRING_HEADER.unpack_from(view, offset)
+            offset += _STRING_HEADER.size
+            if collect_strings:
+                strings.append(str(view[offset:offset + length], 'utf-8'))
+            offset += length
+            continue
+        record_start = offset
+        _, name_length, due, completion, status, category, extras_length, id_bytes = unpack_task(view, offset)
+        offset += task_header_size
+        due_date = date_strings.get(due) or _decode_binary_date(due, strings, "No due date")
+        task = {"task": str(view[offset:offset + name_length], 'utf-8'), "status": strings[status], "due_date": due_date}
+        if archived:
+            task['completion_date'] = date_strings.get(completion) or _decode_binary_date(completion, strings, "Unknown")
+        task['category'] = strings[category]
+        if id_bytes != _NO_BINARY_ID:
+            task['id'] = id_bytes.hex()
+        offset += name_length
+        if extras_length:
+            task.update(parse_task_extras(str(view[offset:offset + extras_length], 'utf-8')))
+            offset += extras_length
+        results.append((task, record_start, offset) if positions else task)
+    return results
+
+def encode_task_records(tasks, archived=False):
+    """Encode tasks as a complete binary file"""
+    return BINARY_MAGIC + BinaryRecordEncoder().encode(tasks, archived)
+
+def decode_task_records(buffer, archived=False):
+    """Decode a complete binary file into task dictionaries"""
+    if not buffer:
+        return []
+    if bytes(buffer[:len(BINARY_MAGIC)]) != BINARY_MAGIC:
+        raise ValueError("not a binary task file")
+    return decode_binary_records(buffer, [], len(BINARY_MAGIC), archived=archived)
+
+def load_binary_tasks_file(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as file:
+        return decode_task_records(file.read())
+
+class BinaryFileStorage(TextFileStorage):
+    """Same layout as TextFileStorage, but task lists and the archive use the binary record format"""
+
+    archive_file = 'completed_tasks.bin'
+    list_loader = staticmethod(load_binary_tasks_file)
+
+    def __init__(self, root='CLI_VERSION'):
+        super().__init__(root)
+        self._archive_strings = None
+
+    def list_file(self, list_name):
+        return os.path.splitext(super().list_file(list_name))[0] + '.bin'
+
+    def load_tasks(self, list_name):
+        return load_binary_tasks_file(self.list_file(list_name))
+
+    def save_tasks(self, list_name, tasks):
+        self._write_atomic(self.list_file(list_name), encode_task_records(tasks))
+
+    def _read_archive(self):
+        path = self.path(self.archive_file)
+        if not os.path.exists(path):
+            return b''
+        with open(path, 'rb') as file:
+            return file.read()
+
+    def _string_table(self):
+        """Every string defined in the archive, loaded once and kept up to date by appends"""
+        if self._archive_strings is None:
+            strings = []
+            data = self._read_archive()
+            if data:
+                decode_binary_records(data, strings, len(BINARY_MAGIC), archived=True)
+            self._archive_strings = strings
+        return self._archive_strings
+
+    def map_archive(self, reducer, workers=None):
+        data = self._read_archive()
+        if not data:
+            return []
+        return [reducer(decode_task_records(data, archived=True))]
+
+    def read_archive_range(self, start, end):
+        strings = self._string_table()
+        with open(self.path(self.archive_file), 'rb') as file:
+            file.seek(start)
+            data = file.read(end - start)
+        return decode_binary_records(data, strings, archived=True, collect_strings=False)
+
+    def iter_archive(self, start=0):
+        data = self._read_archive()
+        if not data:
+            return
+        # A task's range starts right after the previous task, so it covers any strings defined for it
+        previous_end = max(start, len(BINARY_MAGIC))
+        for task, _, record_end in decode_binary_records(data, [], len(BINARY_MAGIC), archived=True, positions=True):
+            if record_end > previous_end:
+                yield task, previous_end, record_end
+                previous_end = record_end
+
+    def append_archive(self, tasks):
+        self._prepare()
+        encoder = BinaryRecordEncoder(self._string_table())
+        data = encoder.encode(tasks, archived=True)
+        with open(self.path(self.archive_file), 'ab') as file:
+            if file.tell() == 0:
+                file.write(BINARY_MAGIC)
+            start = file.tell()
+            file.write(data)
+            end = file.tell()
+        self._archive_strings = sorted(encoder.codes, key=encoder.codes.get)
+        return start, end
+
+    def truncate_archive(self, start):
+        super().truncate_archive(start)
+        self._archive_strings = None
+
+    def rewrite_archive(self, tasks):
+        self._write_atomic(self.path(self.archive_file), encode_task_records(tasks, archived=True))
+        self._archive_strings = None
+
+# Convert the task lists and archive under 'root' between the text and binary formats
+def convert_storage(root='CLI_VERSION', to_binary=True):
+    text, binary = TextFileStorage(root), BinaryFileStorage(root)
+    source, target = (text, binary) if to_binary else (binary, text)
+    for list_name in source.list_names():
+        target.save_tasks(list_name, source.load_tasks(list_name))
+    archive_path = target.path(target.archive_file)
+    if os.path.exists(archive_path):
+        os.remove(archive_path)
+    archived = [task for chunk in source.map_archive(list) for task in chunk]
+    if archived:
+        target.append_archive(archived)
+    # Archive positions differ between formats, so the completion index is rebuilt
+    target.write_lines('completed_index.txt', [])
+    print(f"Converted {len(source.list_names())} list(s) and {len(archived)} archived task(s) "
+          f"to the {'binary' if to_binary else 'text'} format in {root}.")
+
+# Backups. Every file of the data directory is cut into chunks at content-defined points: a
+# line ends a chunk when the CRC of the line has its low bits zero (between a minimum and a
+# maximum chunk size). Boundaries depend only on nearby content, so appending to the archive
+# or editing a task changes one or two chunks and the others hash the same as last time.
+# Chunks are stored once, compressed, under backups/chunks/ by SHA-256, and each backup is a
+# small JSON manifest listing the chunks of each file. Files whose size and modification
+# time match the previous backup are not even read again.
+BACKUP_DIR = os.environ.get('TODO_BACKUP_DIR')
+BACKUP_MIN_CHUNK = 16 * 1024
+BACKUP_MAX_CHUNK = 256 * 1024
+BACKUP_CHUNK_MASK = 0x3ff
+
+def backup_dir_for(root):
+    """Backups live next to the data directory (CLI_VERSION_backups), not inside it"""
+    return BACKUP_DIR or os.path.normpath(root) + '_backups'
+
+def split_chunks(data):
+    """Cut bytes into content-defined chunks at line ends"""
+    view = memoryview(data)
+    start = position = 0
+    while position < len(data):
+        end = data.find(b'\n', position)
+        end = len(data) if end < 0 else end + 1
+        if end - start > BACKUP_MAX_CHUNK:
+            end = start + BACKUP_MAX_CHUNK
+            yield data[start:end]
+            start = end
+        elif end - start >= BACKUP_MIN_CHUNK and zlib.crc32(view[position:end]) & BACKUP_CHUNK_MASK == 0:
+            yield data[start:end]
+            start = end
+        position = end
+    if start < len(data):
+        yield data[start:]
+
+def _chunk_path(backup_dir, digest):
+    return os.path.join(backup_dir, 'chunks', digest[:2], digest)
+
+# Files this program writes in a data directory. A restore only ever removes these (or files
+# an earlier backup of the same directory had), never files it does not know about.
+DATA_FILES = ('tasks.txt', 'tasks.bin', 'completed_tasks.txt', 'completed_tasks.bin', 'categories.txt',
+              'completed_index.txt', 'history.log', 'lists.txt', 'changes.log', 'views.txt', 'archive_rollups.txt',
+              'completed_bloom.txt', 'replica.txt', 'sync_state.json', 'timelog.txt', 'time_summary.json')
+
+def is_data_file(name):
+    """True for the files of a data directory, including the shards and histories of named lists"""
+    return name in DATA_FILES or (name.startswith('tasks_') and name.endswith(('.txt', '.bin'))) \
+        or (name.startswith('history_') and name.endswith('.log'))
+
+def _backup_files(root):
+    """The data files of a directory (not temporary files)"""
+    return sorted(name for name in os.listdir(root)
+                  if not name.startswith('.') and os.path.isfile(os.path.join(root, name)))
+
+def list_backups(backup_dir):
+    """(name, manifest) of every backup, oldest first"""
+    manifest_dir = os.path.join(backup_dir, 'manifests')
+    if not os.path.isdir(manifest_dir):
+        return []
+    backups = []
+    for name in sorted(name[:-5] for name in os.listdir(manifest_dir) if name.endswith('.json')):
+        with open(os.path.join(manifest_dir, name + '.json')) as file:
+            backups.append((name, json.load(file)))
+    return backups
+
+def create_backup(root, backup_dir=None):
+    """Back up every file of root. Returns (name, files, total bytes, new chunks, bytes written)."""
+    backup_dir = backup_dir or backup_dir_for(root)
+    if not os.path.isdir(root):
+        raise ValueError(f"there is no data directory '{root}'")
+    previous = list_backups(backup_dir)
+    previous_files = previous[-1][1]['files'] if previous else {}
+    files, new_chunks, written, total = {}, 0, 0, 0
+    for name in _backup_files(root):
+        stat = os.stat(os.path.join(root, name))
+        entry = previous_files.get(name)
+        total += stat.st_size
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            files[name] = entry
+            continue
+        with open(os.path.join(root, name), 'rb') as file:
+            data = file.read()
+        chunks = []
+        for chunk in split_chunks(data):
+            digest = hashlib.sha256(chunk).hexdigest()
+            chunks.append(digest)
+            path = _chunk_path(backup_dir, digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                compressed = zlib.compress(chunk)
+                with open(path + '.tmp', 'wb') as file:
+                    file.write(compressed)
+                os.replace(path + '.tmp', path)
+                new_chunks += 1
+                written += len(compressed)
+        files[name] = {"size": len(data), "mtime_ns": stat.st_mtime_ns, "mode": stat.st_mode & 0o777,
+                       "sha256": hashlib.sha256(data).hexdigest(), "chunks": chunks}
+    name = datetime.now().strftime("%Y%m%d-%H%M%S")
+    taken = {backup_name for backup_name, _ in previous}
+    suffix = 1
+    while (name if suffix == 1 else f"{name}-{suffix}") in taken:
+        suffix += 1
+    name = name if suffix == 1 else f"{name}-{suffix}"
+    manifest = {"created": datetime.now().isoformat(timespec='seconds'), "root": os.path.abspath(root), "files": files}
+    os.makedirs(os.path.join(backup_dir, 'manifests'), exist_ok=True)
+    path = os.path.join(backup_dir, 'manifests', name + '.json')
+    with open(path + '.tmp', 'w') as file:
+        json.dump(manifest, file)
+    os.replace(path + '.tmp', path)
+    return name, len(files), total, new_chunks, written
+
+def _read_backup_file(backup_dir, entry):
+    parts = []
+    for digest in entry['chunks']:
+        with open(_chunk_path(backup_dir, digest), 'rb') as file:
+            parts.append(zlib.decompress(file.read()))
+    data = b''.join(parts)
+    if hashlib.sha256(data).hexdigest() != entry['sha256']:
+        raise ValueError("the backup is damaged (a file does not match its checksum)")
+    return data
+
+def restore_backup(name, root, backup_dir=None):
+    """Make root hold the files of a backup. Every file is checked before any is written. Data
+    files the backup did not have are removed; other files are left alone, and a non-empty
+    directory without task data is refused. Returns the number of files restored."""
+    backup_dir = backup_dir or backup_dir_for(root)
+    manifests = dict(list_backups(backup_dir))
+    if name not in manifests:
+        raise ValueError(f"there is no backup '{name}'")
+    files = manifests[name]['files']
+    present = _backup_files(root) if os.path.isdir(root) else []
+    if present and not any(is_data_file(file_name) for file_name in present):
+        raise ValueError(f"{root} is not empty and is not a task data directory; restore into an empty directory")
+    for file_name, entry in files.items():
+        missing = [digest for digest in entry['chunks'] if not os.path.exists(_chunk_path(backup_dir, digest))]
+        if missing:
+            raise ValueError(f"the backup is missing {len(missing)} chunk(s) of {file_name}")
+        _read_backup_file(backup_dir, entry)
+    target = TextFileStorage(root)
+    for file_name, entry in files.items():
+        path = target.path(file_name)
+        target._write_atomic(path, _read_backup_file(backup_dir, entry))
+        os.chmod(path, entry['mode'])
+    # Remove what the backup did not have, but only files we own
+    owned = {file_name for manifest in manifests.values() if manifest.get('root') == os.path.abspath(root)
+             for file_name in manifest['files']}
+    for file_name in present:
+        if file_name not in files and (is_data_file(file_name) or file_name in owned):
+            os.remove(target.path(file_name))
+    return len(files)
+
+# Named task lists. Each list is stored separately (its own file for the text backend)
+# and only the selected list is loaded.
+DEFAULT_LIST = 'default'
+current_list = DEFAULT_LIST
+
+# Data directory can be changed with the TODO_DATA_DIR environment variable,
+# and TODO_STORAGE=binary selects the binary record format
+storage = (BinaryFileStorage if os.environ.get('TODO_STORAGE') == 'binary' else TextFileStorage)(
+    os.environ.get('TODO_DATA_DIR', 'CLI_VERSION'))
+
+# Saves are written behind: save_tasks() queues a snapshot and returns, and a background thread
+# writes it after SAVE_COALESCE_DELAY seconds. Snapshots queued in the meantime replace it,
+# so a burst of edits costs one write per list. The history and change feed lines of those
+# edits are queued with the snapshot and appended only after it is written, so a crash never
+# leaves a history that describes changes the list file does not have. A failed write is tried
+# SAVE_RETRIES times, then left (and shown in the menu) until the next save of that list.
+SAVE_COALESCE_DELAY = 0.2
+SAVE_RETRIES = 3
+
+class WriteBehindSaver:
+    """Background writer that keeps only the newest queued snapshot of each task list"""
+
+    def __init__(self, delay=SAVE_COALESCE_DELAY):
+        self.delay = delay
+        self.pending = {}
+        self.batch = {}
+        self.logs = []
+        self.attempts = {}
+        self.failed = {}
+        self.writing = False
+        self.flushing = 0
+        self.error = None
+        self.writes = 0
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def schedule(self, backend, list_name, tasks, logs=()):
+        """Queue a snapshot of a list (unless list_name is None), and (backend, file name, line)
+        log lines to append once it is written. A new save also retries a write that was given up."""
+        with self.condition:
+            if list_name is not None:
+                self.pending[(backend, list_name)] = tasks
+            # Log lines are keyed (backend, None)
+            for key in {(backend, list_name)} | {(line[0], None) for line in logs}:
+                self.attempts.pop(key, None)
+                self.failed.pop(key, None)
+            self.logs.extend(logs)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='task-writer', daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def _held(self):
+        # The log lines of a store wait while a list they may describe could not be written
+        return {backend for backend, _ in self.failed}
+
+    def _has_work(self):
+        held = self._held()
+        return self.pending or any(line[0] not in held for line in self.logs)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(self._has_work)
+                # Let more edits arrive before writing, unless someone is waiting for a flush
+                self.condition.wait_for(lambda: self.flushing, self.delay)
+                batch, self.pending = self.pending, {}
+                self.batch = batch
+                self.writing = True
+            failed = {}
+            for key, tasks in batch.items():
+                try:
+                    key[0].save_tasks(key[1], tasks)
+                    self.writes += 1
+                except Exception as error:
+                    failed[key] = (tasks, error)
+            with self.condition:
+                held = self._held() | {backend for backend, _ in failed}
+                logs = [line for line in self.logs if line[0] not in held]
+                self.logs = [line for line in self.logs if line[0] in held]
+            written = 0
+            for (backend, name), lines in groupby(logs, key=lambda line: line[:2]):
+                lines = [line for _, _, line in lines]
+                try:
+                    backend.append_lines(name, lines)
+                except Exception as error:
+                    failed[(backend, None)] = (None, error)
+                    break
+                written += len(lines)
+            with self.condition:
+                self.logs[:0] = logs[written:]
+                for key in (set(batch) | {(line[0], None) for line in logs}) - set(failed):
+                    self.attempts.pop(key, None)
+                for key, (tasks, error) in failed.items():
+                    self.attempts[key] = self.attempts.get(key, 0) + 1
+                    if self.attempts[key] >= SAVE_RETRIES:
+                        # Give up until the next save
+                        self.failed[key] = (tasks, error)
+                        self.error = error
+                    elif key[1] is not None:
+                        # Retry, unless a newer snapshot was queued meanwhile
+                        self.pending.setdefault(key, tasks)
+                self.batch = {}
+                self.writing = False
+                self.condition.notify_all()
+
+    def queued(self, backend, list_name):
+        """The newest snapshot of a list that is not on disk yet (queued, being written or given up), or None"""
+        key = (backend, list_name)
+        with self.condition:
+            if key in self.pending:
+                return self.pending[key]
+            if key in self.batch:
+                return self.batch[key]
+            return self.failed[key][0] if key in self.failed else None
+
+    def failure(self):
+        """The error of a write that was given up, or None"""
+        with self.condition:
+            return next((error for _, error in self.failed.values()), None)
+
+    def flush(self):
+        """Write everything queued now and wait for it. Raises the error of a failed write."""
+        with self.condition:
+            self.flushing += 1
+            self.condition.notify_all()
+            try:
+                self.condition.wait_for(lambda: not self.writing and not self._has_work())
+            finally:
+                self.flushing -= 1
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+_saver = WriteBehindSaver()
+
+# History and change feed lines not yet handed to the saver (they go with the next save)
+_log_queue = []
+
+def queue_log_lines(name, lines):
+    """Append lines to a log file of the current storage once the list it describes is saved"""
+    _log_queue.extend((storage, name, line) for line in lines)
+
+def _take_log_lines():
+    lines = _log_queue[:]
+    del _log_queue[:]
+    return lines
+
+# Wait until every queued save is on disk, with the log lines queued since the last save
+def flush_saves():
+    if _log_queue:
+        _saver.schedule(storage, None, None, _take_log_lines())
+    _saver.flush()
+
+# Don't lose queued saves if the program exits another way (e.g. Ctrl+C)
+atexit.register(flush_saves)
+
+# Load categories
+def load_categories():
+    return storage.load_categories()
+
+# Save categories
+def save_categories(categories):
+    storage.save_categories(categories)
+
+# Load the tasks of the selected list
+def load_tasks():
+    return storage.load_tasks(current_list)
+
+def history_name(list_name=None):
+    """Each list keeps its own undo history"""
+    list_name = list_name or current_list
+    if list_name == DEFAULT_LIST:
+        return 'history.log'
+    return f"history_{list_name}.log"
+
+# Load archived (completed) tasks
+def load_archived_tasks(workers=None):
+    tasks = []
+    for chunk in storage.map_archive(list, workers):
+        tasks.extend(chunk)
+    return tasks
+
+# Count archived tasks per category without keeping the tasks in memory,
+# including the tasks folded into the rollups. Kept until the archive changes.
+_summary_cache = {'key': None, 'summary': None}
+
+def summarize_archived_tasks(workers=None):
+    key = (storage, storage.archive_version())
+    if _summary_cache['key'] != key:
+        summary = {}
+        for chunk in storage.map_archive(count_by_category, workers):
+            for category, count in chunk.items():
+                summary[category] = summary.get(category, 0) + count
+        for (_, category), values in load_archive_rollups().items():
+            summary[category] = summary.get(category, 0) + values[0]
+        _summary_cache['key'], _summary_cache['summary'] = key, summary
+    return dict(_summary_cache['summary'])
+
+# Snapshots for readers running next to the CLI (a dashboard, a reminder thread, an API).
+# Every commit (save_tasks) publishes a new immutable TaskSnapshot of the list, and a reader
+# pins one by taking a reference to it: it then sees that version however the list changes,
+# without locks. A version is freed when the last reader drops it; until then it can also be
+# looked up by number. Other processes read the files, which saves replace atomically.
+class TaskSnapshot:
+    """One committed version of a task list. The tasks are read-only mappings."""
+
+    def __init__(self, version, list_name, tasks):
+        self.version = version
+        self.list_name = list_name
+        self.tasks = tuple(MappingProxyType(task) for task in tasks)
+        self.committed_at = datetime.now()
+        self._by_id = None
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __iter__(self):
+        return iter(self.tasks)
+
+    def get(self, task_id):
+        """The task with this id in this version, or None"""
+        if self._by_id is None:
+            self._by_id = {task.get('id'): task for task in self.tasks}
+        return self._by_id.get(task_id)
+
+# 'unloaded' holds the version 0 snapshots of lists not loaded in this session, with what they were read from
+_snapshot_state = {'version': 0, 'current': {}, 'unloaded': {}, 'versions': weakref.WeakValueDictionary()}
+
+def publish_snapshot(tasks, list_name=None):
+    """Make tasks (dicts nobody changes any more) the current version of a list"""
+    list_name = list_name or current_list
+    _snapshot_state['version'] += 1
+    snapshot = TaskSnapshot(_snapshot_state['version'], list_name, tasks)
+    _snapshot_state['versions'][snapshot.version] = snapshot
+    _snapshot_state['current'][list_name] = snapshot
+    return snapshot
+
+def task_snapshot(list_name=None):
+    """Pin the current version of a list (the selected one by default). Safe from any thread."""
+    list_name = list_name or current_list
+    snapshot = _snapshot_state['current'].get(list_name)
+    if snapshot is not None:
+        return snapshot
+    # Not loaded in this session: the committed version is the newest save still queued for it, or
+    # else its file. It is read again when either changes, without waiting for the saver.
+    backend = storage
+    queued = _saver.queued(backend, list_name)
+    source = ('queued', id(queued)) if queued is not None else ('file', backend.list_version(list_name))
+    cached = _snapshot_state['unloaded'].get(list_name)
+    if cached is not None and cached[0] == source:
+        return cached[2]
+    tasks = queued if queued is not None else backend.load_tasks(list_name)
+    snapshot = TaskSnapshot(0, list_name, tasks)
+    # The queued tasks are kept with it, so their id is not reused while it is cached
+    _snapshot_state['unloaded'][list_name] = (source, queued, snapshot)
+    return snapshot
+
+def snapshot_version(version):
+    """A version that some reader still holds, or None once it has been freed"""
+    return _snapshot_state['versions'].get(version)
+
+# Save active tasks (excluding completed ones) and publish the new version. The write happens in
+# the background; the tasks are copied so later edits change neither the queued save nor the snapshot.
+def save_tasks():
+    tasks = [dict(task) for task in to_do_list]
+    publish_snapshot(tasks)
+    active_tasks = [task for task in tasks if task['status'].lower() != 'done']
+    _saver.schedule(storage, current_list, active_tasks, _take_log_lines())
+    # The logs are only rewritten once the lines queued with this save are written
+    if _history_line_count > HISTORY_LIMIT * 3:
+        _compact_history()
+    if _feed_state['lines'] > FEED_RETENTION * 2:
+        _compact_feed()
+
+# Append archived tasks and index them. Returns the (start, end) archive positions written.
+def append_to_archive(tasks):
+    previous_version = storage.archive_version()
+    start, end = storage.append_archive(tasks)
+    record_completion_batch(tasks[0]['completion_date'], start, end, len(tasks))
+    _add_to_completed_bloom(tasks, start, end)
+    _add_to_archive_fuzzy_index(tasks, previous_version)
+    return start, end
+
+# Remove the last batch from the archive, as long as nothing was appended after it
+def truncate_archive(start, end):
+    if storage.archive_size() != end:
+        raise ValueError("the archive has changed since these tasks were archived")
+    storage.truncate_archive(start)
+    truncate_completion_index(start)
+
+# Archive completed tasks
+def archive_completed_tasks():
+    done = [index for index, task in enumerate(to_do_list) if task['status'].lower() == 'done']
+    if done:
+        commit_change({"type": "group", "label": f"archive {len(done)} completed task(s)",
+                       "changes": subtask_completion_edits(done) + [{"type": "archive"}]})
+
+# Load the completion-date index (completed_index.txt): a list of (completion_date, start, end, count)
+# entries, one per run of archive records with the same completion date
+def read_completion_index():
+    entries = []
+    for line in storage.read_lines('completed_index.txt'):
+        parts = line.strip().split(' | ')
+        if len(parts) == 4:
+            entries.append((parts[0], int(parts[1]), int(parts[2]), int(parts[3])))
+    return entries
+
+def _append_completion_index(entries, rewrite=False):
+    lines = [f"{completion_date} | {start} | {end} | {count}" for completion_date, start, end, count in entries]
+    if rewrite:
+        storage.write_lines('completed_index.txt', lines)
+    else:
+        storage.append_lines('completed_index.txt', lines)
+
+# Index archive records from position 'start' to the end of the archive
+def _scan_completion_runs(start):
+    entries = []
+    for task, offset, line_end in storage.iter_archive(start):
+        if task:
+            completion_date = task['completion_date']
+            if entries and entries[-1][0] == completion_date and entries[-1][2] == offset:
+                entries[-1] = (completion_date, entries[-1][1], line_end, entries[-1][3] + 1)
+            else:
+                entries.append((completion_date, offset, line_end, 1))
+    return entries
+
+# Record a batch that was just appended to the archive
+def record_completion_batch(completion_date, start, end, count):
+    entries = read_completion_index()
+    indexed_end = entries[-1][2] if entries else 0
+    if indexed_end == start:
+        _append_completion_index([(completion_date, start, end, count)])
+    else:
+        # The index is missing or behind the archive, catch it up
+        load_completion_index()
+
+# Return the index, first bringing it up to date with the archive.
+# Only the part of the archive the index has not seen yet is read.
+def load_completion_index():
+    entries = read_completion_index()
+    archive_size = storage.archive_size()
+    indexed_end = entries[-1][2] if entries else 0
+    if indexed_end > archive_size:
+        # The archive was rewritten or truncated, rebuild the whole index
+        entries = _scan_completion_runs(0)
+        _append_completion_index(entries, rewrite=True)
+    elif indexed_end < archive_size:
+        new_entries = _scan_completion_runs(indexed_end)
+        _append_completion_index(new_entries)
+        entries.extend(new_entries)
+    return entries
+
+# Drop index entries for archive positions at or after 'offset'
+def truncate_completion_index(offset):
+    entries = [entry for entry in read_completion_index() if entry[2] <= offset]
+    _append_completion_index(entries, rewrite=True)
+
+# Return the index entries whose completion date is between start_date and end_date (datetimes, inclusive)
+def completion_index_between(start_date, end_date):
+    matching = []
+    for completion_date, start, end, count in load_completion_index():
+        date = parse_date(completion_date)
+        if date is not None and start_date <= date <= end_date:
+            matching.append((date, start, end, count))
+    return matching
+
+# Return the archived tasks completed between two dates, reading only the matching records
+def load_completed_between(start_date, end_date):
+    tasks = []
+    ranges = [(start, end) for _, start, end, _ in completion_index_between(start_date, end_date)]
+    if not ranges:
+        return tasks
+    # Merge adjacent ranges so consecutive days are read in one go
+    merged = [list(ranges[0])]
+    for start, end in ranges[1:]:
+        if start == merged[-1][1]:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    for start, end in merged:
+        tasks.extend(storage.read_archive_range(start, end))
+    return tasks
+
+# Count completions per day between two dates using only the index
+def daily_completion_counts(start_date, end_date):
+    counts = {}
+    for date, _, _, count in completion_index_between(start_date, end_date):
+        counts[date] = counts.get(date, 0) + count
+    return dict(sorted(counts.items()))
+
+# Archive retention. Tasks completed more than ARCHIVE_RETENTION_DAYS ago can be folded into
+# monthly per-category rollups and removed from the detailed archive, so reading the archive
+# stays fast. Rollups are "YYYY-MM | category | count | dated | late | lateness_days" lines in
+# archive_rollups.txt, where 'dated' tasks had a due date, 'late' ones were completed after it,
+# and lateness_days sums completion minus due date over the dated tasks. Statistics and the
+# completed views add the rollups to what is still in the archive.
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('TODO_ARCHIVE_RETENTION_DAYS', 365))
+
+def load_archive_rollups():
+    """{(month, category): [count, dated, late, lateness_days]}"""
+    rollups = {}
+    for line in storage.read_lines('archive_rollups.txt'):
+        parts = line.split(' | ')
+        if len(parts) != 6:
+            continue
+        try:
+            rollups[(parts[0], parts[1])] = [int(part) for part in parts[2:]]
+        except ValueError:
+            continue
+    return rollups
+
+def save_archive_rollups(rollups):
+    storage.write_lines('archive_rollups.txt', [f"{month} | {category} | " + " | ".join(str(value) for value in values)
+                                                for (month, category), values in sorted(rollups.items())])
+
+def rollup_archived_task(rollups, task):
+    completion_date = parse_date(task['completion_date'])
+    due_date = parse_date(task['due_date'])
+    values = rollups.setdefault((completion_date.strftime('%Y-%m'), task.get('category', 'General')), [0, 0, 0, 0])
+    values[0] += 1
+    if due_date is not None:
+        lateness = (completion_date - due_date).days
+        values[1] += 1
+        values[2] += lateness > 0
+        values[3] += lateness
+
+def compact_archive(retention_days=ARCHIVE_RETENTION_DAYS):
+    """Fold archived tasks completed more than retention_days ago into the rollups.
+    Returns the number of tasks folded. Tasks without a valid completion date are kept."""
+    cutoff = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=retention_days)
+    kept, expired = [], []
+    for chunk in storage.map_archive(list):
+        for task in chunk:
+            completion_date = parse_date(task['completion_date'])
+            (expired if completion_date is not None and completion_date < cutoff else kept).append(task)
+    if not expired:
+        return 0
+    rollups = load_archive_rollups()
+    for task in expired:
+        rollup_archived_task(rollups, task)
+    # Rollups are written first: a crash in between counts tasks twice instead of losing them
+    save_archive_rollups(rollups)
+    storage.rewrite_archive(kept)
+    # Archive positions changed: rebuild the completion index, and drop the undo history,
+    # whose completions refer to the old positions
+    storage.write_lines('completed_index.txt', [])
+    load_completion_index()
+    clear_undo_history()
+    emit_change('archive_compacted', folded=len(expired), kept=len(kept))
+    return len(expired)
+
+# Change feed. Every mutation is published as an event with a sequence number, appended
+# to changes.log and passed to in-process subscribers, so frontends can apply deltas
+# instead of reloading the list, and resume from the last sequence number they saw.
+# Each event also records the store it was made in ("origin") and when ("stamp"), for sync.
+# Events: add, edit, delete, complete, complete_occurrence, uncomplete_occurrence, category,
+# archive_compacted.
+FEED_RETENTION = 10000
+
+_feed_subscribers = []
+_recent_changes = deque(maxlen=1000)
+_feed_state = {'sequence': None, 'lines': 0}
+
+def new_task_id():
+    return uuid.uuid4().hex[:12]
+
+# Give every task a stable id (tasks saved before ids existed get one now)
+def ensure_task_ids(tasks):
+    missing = [task for task in tasks if not task.get('id')]
+    for task in missing:
+        task['id'] = new_task_id()
+    return bool(missing)
+
+def _read_feed_file():
+    flush_saves()
+    events = []
+    for line in storage.read_lines('changes.log'):
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            continue
+    return events
+
+def latest_sequence():
+    """Sequence number of the newest event (0 if there are none)"""
+    if _feed_state['sequence'] is None:
+        events = _read_feed_file()
+        _feed_state['sequence'] = events[-1]['seq'] if events else 0
+        _feed_state['lines'] = len(events)
+        _recent_changes.extend(events)
+    return _feed_state['sequence']
+
+def emit_change(event, **data):
+    """Publish one change event to the feed and its subscribers"""
+    entry = {"seq": latest_sequence() + 1, "time": datetime.now().isoformat(timespec='seconds'),
+             "list": current_list, "event": event, "origin": _sync_origin['replica'] or replica_id(),
+             "stamp": _sync_origin['stamp'] or datetime.now().isoformat(timespec='microseconds')}
+    entry.update(data)
+    queue_log_lines('changes.log', [json.dumps(entry)])
+    _feed_state['sequence'] = entry['seq']
+    _feed_state['lines'] += 1
+    _recent_changes.append(entry)
+    for callback in list(_feed_subscribers):
+        try:
+            callback(entry)
+        except Exception as error:
+            print(f"Change subscriber failed: {error}")
+    return entry
+
+# Keep only the newest FEED_RETENTION events on disk
+def _compact_feed():
+    events = _read_feed_file()[-FEED_RETENTION:]
+    storage.write_lines('changes.log', [json.dumps(entry) for entry in events])
+    _feed_state['lines'] = len(events)
+
+def read_changes(since_sequence=0, limit=None):
+    """Return the events after since_sequence, oldest first. Returns None if some of
+    those events were already compacted away, in which case the client must reload."""
+    latest_sequence()
+    if _recent_changes and since_sequence >= _recent_changes[0]['seq'] - 1:
+        events = [entry for entry in _recent_changes if entry['seq'] > since_sequence]
+    else:
+        all_events = _read_feed_file()
+        if all_events and since_sequence < all_events[0]['seq'] - 1:
+            return None
+        events = [entry for entry in all_events if entry['seq'] > since_sequence]
+    return events[:limit] if limit is not None else events
+
+def subscribe_changes(callback, since_sequence=None):
+    """Call callback(event) for every new change. If since_sequence is given, the events
+    missed since then are delivered first. Returns False if a full reload is needed."""
+    if since_sequence is not None:
+        missed = read_changes(since_sequence)
+        if missed is None:
+            return False
+        for entry in missed:
+            callback(entry)
+    _feed_subscribers.append(callback)
+    return True
+
+def unsubscribe_changes(callback):
+    if callback in _feed_subscribers:
+        _feed_subscribers.remove(callback)
+
+# Sync between two stores. A sync sends the other store only the events it has not seen
+# yet and the other store replays them as ordinary changes, so full files are never
+# exchanged. sync_state.json remembers, per peer, the last sequence received from it and
+# the last of ours it confirmed. The first sync with a peer (or one whose events were
+# compacted away) sends a snapshot of the tasks and categories instead.
+# Conflicts: a field edited in both stores since the last sync keeps the newest value
+# (ties go to the larger replica id); completing or deleting a task wins over edits.
+SYNC_PORT = 8765
+SYNC_EVENTS = ('add', 'edit', 'delete', 'complete', 'complete_occurrence', 'category')
+
+_replica_state = {'storage': None, 'id': None}
+# Origin and stamp of the remote event being replayed, so emit_change keeps them
+_sync_origin = {'replica': None, 'stamp': None}
+
+def replica_id():
+    """Id of the current store (created the first time it is needed)"""
+    if _replica_state['storage'] is not storage:
+        lines = storage.read_lines('replica.txt')
+        if not lines:
+            lines = [uuid.uuid4().hex]
+            storage.write_lines('replica.txt', lines)
+        _replica_state['storage'], _replica_state['id'] = storage, lines[0].strip()
+    return _replica_state['id']
+
+def load_sync_state():
+    lines = storage.read_lines('sync_state.json')
+    return json.loads(lines[0]) if lines else {}
+
+def save_sync_state(state):
+    storage.write_lines('sync_state.json', [json.dumps(state)])
+
+# (stamp, origin) of an event; events from before sync existed were made in this store
+def event_clock(entry):
+    return (entry.get('stamp', entry['time']), entry.get('origin', replica_id()))
+
+def export_changes(peer=None):
+    """The sync bundle for peer: a header followed by the events it has not seen. Without a
+    peer, the only known peer is used; an unknown peer gets a full snapshot."""
+    flush_saves()
+    state = load_sync_state()
+    if peer is None and len(state) == 1:
+        peer = next(iter(state))
+    known = state.get(peer, {})
+    events = read_changes(known['sent']) if 'sent' in known else None
+    header = {"replica": replica_id(), "sequence": latest_sequence(),
+              "received": known.get('received'), "full": events is None}
+    if events is None:
+        base = {"seq": header['sequence'], "time": "", "stamp": "", "origin": header['replica']}
+        events = [dict(base, list=name, event='add', task=task)
+                  for name, tasks in storage.map_task_lists(list).items() for task in tasks]
+        events += [dict(base, list=DEFAULT_LIST, event='category', action='add', name=name, color=color)
+                   for name, color in load_categories().items()]
+    else:
+        events = [entry for entry in events if entry['event'] in SYNC_EVENTS and entry.get('origin') != peer]
+    return [header] + events
+
+def confirm_sent(peer, sequence):
+    """Record that peer has our events up to sequence. Returns True if that is news. Undoing a
+    change the peer already has would only be undone here (an undone completion stays in the
+    peer's archive), so the caller then clears the undo history."""
+    state = load_sync_state()
+    known = state.setdefault(peer, {'received': 0})
+    previous = known.get('sent')
+    if previous is not None and sequence <= previous:
+        return False
+    known['sent'] = sequence
+    save_sync_state(state)
+    return sequence > (previous or 0)
+
+def import_changes(bundle):
+    """Replay a sync bundle from another store. Returns (applied, skipped) event counts."""
+    header, events = bundle[0], bundle[1:]
+    peer = header['replica']
+    if peer == replica_id():
+        raise ValueError("both stores have the same replica id (if one is a copy of the other, "
+                         "delete replica.txt in the copy)")
+    state = load_sync_state()
+    known = state.setdefault(peer, {'received': 0})
+    # Changes made here that the peer had not seen when it made its events (it made them after
+    # its previous bundle, which confirmed our events up to known['sent']): newer field values
+    # and removed tasks
+    local = read_changes(known.get('sent', 0))
+    if local is None:
+        local = _read_feed_file()
+    written, removed, deleted = {}, {}, set()
+    for entry in local:
+        if entry.get('origin') == peer:
+            continue
+        if entry['event'] in ('edit', 'add'):
+            # An add (new, or brought back by an undo) writes every field of the task
+            task_id = entry['task_id'] if entry['event'] == 'edit' else entry['task'].get('id')
+            for field in entry['fields'] if entry['event'] == 'edit' else entry['task']:
+                written[(task_id, field)] = max(written.get((task_id, field), ('', '')), event_clock(entry))
+        elif entry['event'] in ('delete', 'complete'):
+            removed[entry['task_id']] = max(removed.get(entry['task_id'], ('', '')), event_clock(entry))
+            if entry['event'] == 'delete':
+                deleted.add(entry['task_id'])
+    # A deletion or completion that was undone before this sync (the task was added back later
+    # in the bundle) is not replayed: the add then only brings the fields that are newer here,
+    # and the task does not reach the archive. If the task was removed here meanwhile, that
+    # add does not bring it back either (for the peer it never went away)
+    added_back = {entry['task']['id']: position for position, entry in enumerate(events) if entry['event'] == 'add'}
+    undone = set()
+    list_name = current_list
+    positions = {}
+    applied = skipped = 0
+    try:
+        for position, entry in enumerate(events):
+            if (entry['seq'] <= known['received'] and not header['full']) or entry.get('origin') == replica_id():
+                continue
+            if entry['event'] in ('delete', 'complete') and added_back.get(entry['task_id'], -1) > position:
+                undone.add(entry['task_id'])
+                skipped += 1
+                continue
+            _sync_origin['replica'], _sync_origin['stamp'] = entry.get('origin', peer), entry.get('stamp', entry['time'])
+            if _apply_synced_event(entry, written, removed, deleted, undone, positions):
+                applied += 1
+            else:
+                skipped += 1
+    finally:
+        _sync_origin['replica'] = _sync_origin['stamp'] = None
+        select_list(list_name)
+        save_tasks()
+    known['received'] = header['sequence']
+    save_sync_state(state)
+    # The header confirms the events of ours the peer had when it wrote the bundle
+    confirmed = header['received'] is not None and confirm_sent(peer, header['received'])
+    if applied or confirmed:
+        clear_undo_history()
+    return applied, skipped
+
+# Replay one remote event. Returns False if it no longer applies or lost a conflict.
+def _apply_synced_event(entry, written, removed, deleted, undone, positions):
+    event = entry['event']
+    if event == 'category':
+        return _apply_synced_category(entry)
+    if entry['list'] != current_list:
+        if entry['list'] not in storage.list_names():
+            storage.create_list(entry['list'])
+        select_list(entry['list'])
+        positions.clear()
+    if not positions:
+        positions.update((task.get('id'), index) for index, task in enumerate(to_do_list))
+    task_id = entry['task']['id'] if event == 'add' else entry['task_id']
+    index = positions.get(task_id)
+    if event == 'add' and index is None:
+        # A task deleted here stays deleted, unless it was added back (an undo) after that
+        if task_id in undone or removed.get(task_id, ('', '')) >= event_clock(entry):
+            return False
+        commit_change({"type": "add", "index": len(to_do_list), "task": dict(entry['task'])})
+        positions[task_id] = len(to_do_list) - 1
+        return True
+    if event == 'complete' and index is None and task_id in deleted and entry.get('task'):
+        # Completed there but deleted here: the completion wins, or only one archive would have it
+        completed = dict(entry['task'], status="Done")
+        commit_change({"type": "group", "label": f"complete '{completed['task']}'", "changes": [
+            {"type": "add", "index": len(to_do_list), "task": completed},
+            {"type": "archive", "removed": [[len(to_do_list), completed]], "completion_date": entry['completion_date']}]})
+        return True
+    if index is None:
+        return False
+    task = to_do_list[index]
+    if event == 'delete':
+        commit_change({"type": "delete", "index": index, "task": dict(task)})
+    elif event == 'complete':
+        # Archive the task as it was completed there, even if it was edited here since
+        completed = dict(entry.get('task') or task, status="Done")
+        fields = [field for field in set(task) | set(completed)
+                  if field != 'id' and task.get(field, TASK_FIELD_DEFAULTS.get(field, '')) != completed.get(field, TASK_FIELD_DEFAULTS.get(field, ''))]
+        edits = [{"type": "edit", "index": index,
+                  "before": {field: task.get(field, TASK_FIELD_DEFAULTS.get(field, '')) for field in fields},
+                  "after": {field: completed.get(field, TASK_FIELD_DEFAULTS.get(field, '')) for field in fields}}] if fields else []
+        commit_change({"type": "group", "label": f"complete '{completed['task']}'", "changes": edits + [
+            {"type": "archive", "removed": [[index, completed]], "completion_date": entry['completion_date']}]})
+    elif event == 'complete_occurrence':
+        commit_change({"type": "archive_occurrence", "task": dict(task, due_date=entry['due_date']),
+                       "completion_date": entry['completion_date']})
+        return True
+    else:
+        # An edit, or an add of a task that is already here: take the fields that are newer
+        fields = entry['fields'] if event == 'edit' else {key: value for key, value in entry['task'].items() if key != 'id'}
+        clock = event_clock(entry)
+        changed = {field: value for field, value in fields.items()
+                   if task.get(field, TASK_FIELD_DEFAULTS.get(field)) != value and written.get((task_id, field), ('', '')) < clock}
+        if not changed:
+            return False
+        commit_change({"type": "edit", "index": index, "after": changed,
+                       "before": {field: task.get(field, TASK_FIELD_DEFAULTS.get(field)) for field in changed}})
+        return True
+    positions.clear()
+    return True
+
+def _apply_synced_category(entry):
+    categories = load_categories()
+    name = entry['name']
+    if entry['action'] == 'add':
+        if name in categories:
+            return False
+        categories[name] = entry['color']
+        save_categories(categories)
+        emit_change('category', action='add', name=name, color=entry['color'])
+    elif name not in categories:
+        return False
+    elif entry['action'] == 'delete':
+        commit_change({"type": "delete_category", "name": name, "color": categories[name],
+                       "position": list(categories).index(name)})
+    else:
+        commit_change({"type": "edit_category", "old_name": name, "new_name": entry['new_name'],
+                       "old_color": categories[name], "new_color": entry['color']})
+    return True
+
+# Open a data directory with the backend its files were written with
+def storage_for(root):
+    binary = os.path.isdir(root) and any(name.endswith('.bin') for name in os.listdir(root))
+    return (BinaryFileStorage if binary else TextFileStorage)(root)
+
+def sync_stores(other_root):
+    """Sync the current store with the one in other_root, both ways.
+    Returns (events sent, events applied here, events skipped here)."""
+    if not os.path.isdir(other_root):
+        raise ValueError(f"{other_root} is not a directory")
+    # The stores are reloaded below, so archive tasks marked Done first, as switching lists does
+    archive_completed_tasks()
+    save_tasks()
+    mine, list_name, my_id = storage, current_list, replica_id()
+    other = storage_for(other_root)
+    try:
+        set_storage(other)
+        their_id = replica_id()
+        received = export_changes(my_id)
+        set_storage(mine)
+        applied, skipped = import_changes(received)
+        sent = export_changes(their_id)
+        set_storage(other)
+        import_changes(sent)
+    finally:
+        set_storage(mine)
+        select_list(list_name)
+    # The other store has applied our bundle
+    if confirm_sent(their_id, sent[0]['sequence']):
+        clear_undo_history()
+    return len(sent) - 1, applied, skipped
+
+def write_sync_file(path, peer=None):
+    """Write the changes the peer has not seen to a sync file. Returns the number of events.
+    The undo history is kept until a sync file from the peer confirms it read this one."""
+    bundle = export_changes(peer)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.writelines(json.dumps(entry) + "\n" for entry in bundle)
+    return len(bundle) - 1
+
+def read_sync_file(path):
+    """Apply a sync file written by another store. Returns (applied, skipped)."""
+    with open(path, encoding='utf-8') as file:
+        bundle = [json.loads(line) for line in file if line.strip()]
+    if not bundle or 'replica' not in bundle[0]:
+        raise ValueError(f"{path} is not a sync file")
+    return import_changes(bundle)
+
+# Over a socket a bundle is sent as JSON lines ended by an empty line. The store that serves
+# sends its bundle first, and once it has applied the other's bundle it confirms it with one
+# more line, {"received": <sequence>}.
+def _send_bundle(stream, bundle):
+    stream.writelines(json.dumps(entry) + "\n" for entry in bundle)
+    stream.write("\n")
+    stream.flush()
+
+def _receive_bundle(stream):
+    bundle = []
+    for line in stream:
+        if not line.strip():
+            return bundle
+        bundle.append(json.loads(line))
+    raise ValueError("the connection closed in the middle of a sync")
+
+def serve_sync(port=SYNC_PORT, host='127.0.0.1'):
+    """Wait for one store to connect and sync with it. Returns (sent, applied, skipped)."""
+    with socket.create_server((host, port)) as server:
+        connection, _ = server.accept()
+    with connection, connection.makefile('rw', encoding='utf-8') as stream:
+        peer = json.loads(stream.readline())['replica']
+        bundle = export_changes(peer)
+        _send_bundle(stream, bundle)
+        received = _receive_bundle(stream)
+        result = (len(bundle) - 1,) + import_changes(received)
+        stream.write(json.dumps({"received": received[0]['sequence']}) + "\n")
+        stream.flush()
+        return result
+
+def connect_sync(host='127.0.0.1', port=SYNC_PORT):
+    """Sync with a store waiting in serve_sync. Returns (sent, applied, skipped)."""
+    with socket.create_connection((host, port)) as connection, connection.makefile('rw', encoding='utf-8') as stream:
+        stream.write(json.dumps({"replica": replica_id()}) + "\n")
+        stream.flush()
+        received = _receive_bundle(stream)
+        applied, skipped = import_changes(received)
+        bundle = export_changes(received[0]['replica'])
+        _send_bundle(stream, bundle)
+        reply = stream.readline()
+    if not reply:
+        raise ValueError("the connection closed before the other store confirmed the sync")
+    if confirm_sent(received[0]['replica'], json.loads(reply)['received']):
+        clear_undo_history()
+    return len(bundle) - 1, applied, skipped
+
+# Bitmap index over the current list, used by filters. Bit i of a bitmap is set when task i
+# has that term, so AND/OR/NOT filters are integer &, | and ~. Terms are (field, value) pairs:
+# ('tag', tag id), ('status', ...), ('category', ...) and ('due', bucket). Tag names get small
+# integer ids. Edits update the index in place through the change feed; other changes
+# (adds, deletes, archiving) shift positions, so the index is rebuilt on the next filter.
+DUE_BUCKETS = ('overdue', 'today', 'week', 'later', 'nodate')
+FILTER_FIELDS = ('tag', 'status', 'category', 'due')
+
+def due_bucket(due_date, today):
+    date = parse_date(due_date)
+    if date is None:
+        return 'nodate'
+    if date < today:
+        return 'overdue'
+    if date == today:
+        return 'today'
+    if date <= today + timedelta(days=7):
+        return 'week'
+    return 'later'
+
+def bitmap_count(bitmap):
+    return bin(bitmap).count('1')
+
+# Positions of the set bits of a bitmap, lowest first
+def bitmap_positions(bitmap):
+    bits = bin(bitmap)[:1:-1]
+    positions = []
+    position = bits.find('1')
+    while position != -1:
+        positions.append(position)
+        position = bits.find('1', position + 1)
+    return positions
+
+# Build a bitmap from a list of positions in one pass (OR-ing bits one by one into a
+# big integer copies it every time)
+def bitmap_from_positions(positions, size):
+    bits = bytearray(size // 8 + 1)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+class TaskBitmapIndex:
+    """Per-term bitmaps over the positions of a task list"""
+
+    def __init__(self, tasks, today=None):
+        self.tasks = tasks
+        self.today = today or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.tag_ids = {}
+        self.positions = {}
+        self._buckets = {}
+        self._due_order = None
+        self._words = None
+        self.all = (1 << len(tasks)) - 1
+        self.task_terms = [self._terms(task) for task in tasks]
+        term_positions = {}
+        for position, terms in enumerate(self.task_terms):
+            for term in terms:
+                term_positions.setdefault(term, []).append(position)
+        self.bitmaps = {term: bitmap_from_positions(positions, len(tasks))
+                        for term, positions in term_positions.items()}
+        for position, task in enumerate(tasks):
+            if task.get('id'):
+                self.positions[task['id']] = position
+
+    def tag_id(self, tag):
+        return self.tag_ids.setdefault(tag, len(self.tag_ids))
+
+    def _terms(self, task):
+        terms = [('tag', self.tag_id(tag)) for tag in task_tags(task)]
+        terms.append(('status', task['status'].lower()))
+        terms.append(('category', task.get('category', 'General').lower()))
+        terms.append(('due', self._due_bucket(task['due_date'])))
+        return terms
+
+    def _due_bucket(self, due_date):
+        # Many tasks share a due date, so each date is only parsed once
+        if due_date not in self._buckets:
+            self._buckets[due_date] = due_bucket(due_date, self.today)
+        return self._buckets[due_date]
+
+    def update(self, position):
+        """Re-index one task after it was edited"""
+        self._due_order = self._words = None
+        mask = ~(1 << position)
+        for term in self.task_terms[position]:
+            self.bitmaps[term] &= mask
+        terms = self.task_terms[position] = self._terms(self.tasks[position])
+        for term in terms:
+            self.bitmaps[term] = self.bitmaps.get(term, 0) | (1 << position)
+
+    def due_order(self):
+        """(ordinals, positions) of the tasks with a due date, sorted by date; built on first use"""
+        if self._due_order is None:
+            ordinals = {}
+            dated = []
+            for position, task in enumerate(self.tasks):
+                due_date = task['due_date']
+                if due_date not in ordinals:
+                    date = parse_date(due_date)
+                    ordinals[due_date] = date.toordinal() if date is not None else None
+                if ordinals[due_date] is not None:
+                    dated.append((ordinals[due_date], position))
+            dated.sort()
+            self._due_order = ([ordinal for ordinal, _ in dated], [position for _, position in dated])
+        return self._due_order
+
+    def due_range(self, low=None, high=None):
+        """Bitmap of the tasks due from ordinal 'low' up to but not including 'high'"""
+        ordinals, positions = self.due_order()
+        start = bisect.bisect_left(ordinals, low) if low is not None else 0
+        end = bisect.bisect_left(ordinals, high) if high is not None else len(ordinals)
+        return bitmap_from_positions(positions[start:end], len(self.tasks))
+
+    def words(self):
+        """Positions of the tasks containing each lower-case word of the task names; built on
+        first use. Most words are rare, so they are kept as position lists rather than bitmaps."""
+        if self._words is None:
+            word_positions = {}
+            for position, task in enumerate(self.tasks):
+                for word in set(task['task'].lower().split()):
+                    word_positions.setdefault(word, []).append(position)
+            self._words = word_positions
+        return self._words
+
+    def term(self, field, value):
+        value = value.lower()
+        if field == 'tag':
+            value = self.tag_ids.get(value)
+        return self.bitmaps.get((field, value), 0)
+
+    def lookup(self, word):
+        """Bitmap for "field:value", or for a bare word matching any tag, status, category or due bucket"""
+        field, _, value = word.partition(':')
+        if value and field.lower() in FILTER_FIELDS:
+            return self.term(field.lower(), value)
+        bitmap = 0
+        for field in FILTER_FIELDS:
+            bitmap |= self.term(field, word)
+        return bitmap
+
+    def evaluate(self, expression):
+        """Bitmap of the tasks matching e.g. "work AND urgent AND NOT school". NOT binds tightest,
+        then AND, then OR; words next to each other are ANDed."""
+        result = 0
+        group = self.all
+        negate = False
+        expecting_term = True
+        for word in expression.split():
+            operator = word.upper()
+            if operator == 'NOT':
+                negate = not negate
+                continue
+            if operator in ('AND', 'OR'):
+                if expecting_term:
+                    raise ValueError(f"'{word}' must come after a filter term")
+                if operator == 'OR':
+                    result |= group
+                    group = self.all
+                expecting_term = True
+                continue
+            bitmap = self.lookup(word)
+            group &= (self.all & ~bitmap) if negate else bitmap
+            negate = False
+            expecting_term = False
+        if expecting_term or negate:
+            raise ValueError("the filter is empty or ends with an operator")
+        return result | group
+
+    def select(self, expression):
+        return [self.tasks[position] for position in bitmap_positions(self.evaluate(expression))]
+
+_task_index = {'index': None}
+
+def get_task_index():
+    """The index of the current list, rebuilt if the list or the date changed since it was built"""
+    index = _task_index['index']
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if index is None or index.tasks is not to_do_list or index.today != today:
+        index = _task_index['index'] = TaskBitmapIndex(to_do_list, today)
+    return index
+
+def _update_task_index(event):
+    index = _task_index['index']
+    if index is None:
+        return
+    position = index.positions.get(event.get('task_id')) if event['event'] == 'edit' else None
+    if position is not None and position < len(index.tasks) and index.tasks[position].get('id') == event['task_id']:
+        index.update(position)
+    elif event['event'] in ('add', 'delete', 'complete', 'edit'):
+        _task_index['index'] = None
+
+subscribe_changes(_update_task_index)
+
+# Query language, e.g. "category:Work status:urgent due<01-11-2025 text:report sort:due limit:50".
+# Clauses are ANDed and a '-' in front of one excludes its matches. Plain words (and quoted
+# phrases) search the task names. Queries are planned against the bitmap index: clauses are
+# ordered by how many tasks they match, indexed clauses are intersected while many candidates
+# remain, and once few are left the remaining clauses are checked on those tasks directly.
+QUERY_SCAN_THRESHOLD = 64
+QUERY_FIELDS = FILTER_FIELDS + ('text',)
+QUERY_OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+QUERY_SORTS = {
+    'due': lambda task, due_key: due_key(task),
+    'status': lambda task, due_key: (get_urgency_priority(task['status']), due_key(task)),
+    'name': lambda task, due_key: task['task'].lower(),
+    'category': lambda task, due_key: (task.get('category', 'General').lower(), due_key(task)),
+}
+
+def query_sort_key(sort):
+    """Key function of a sort: clause, comparing due dates like sort_tasks() does"""
+    return partial(QUERY_SORTS[sort], due_key=current_sort_key())
+
+def parse_query_date(text):
+    if text.lower() == 'today':
+        return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for date_format in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    raise ValueError(f"'{text}' is not a date (use DD-MM-YYYY, YYYY-MM-DD or today)")
+
+def parse_query(text):
+    """Parse a query into {'clauses', 'sort', 'limit', 'explain'}. Raises ValueError for bad input."""
+    query = {"clauses": [], "sort": "due", "limit": None, "explain": False}
+    words = shlex.split(text)
+    if words and words[0].lower() == 'explain':
+        query['explain'] = True
+        words = words[1:]
+    for word in words:
+        negate = word.startswith('-') and len(word) > 1
+        body = word[1:] if negate else word
+        comparison = next((op for op in ('<=', '>=', '<', '>') if body.lower().startswith('due' + op)), None)
+        if comparison:
+            value = parse_query_date(body[3 + len(comparison):]).toordinal()
+            clause = {"field": "due", "op": comparison, "value": value}
+        else:
+            field, _, value = body.partition(':')
+            field = field.lower()
+            if field == 'sort':
+                if value.lower() not in QUERY_SORTS:
+                    raise ValueError(f"cannot sort by '{value}' (use {', '.join(QUERY_SORTS)})")
+                query['sort'] = value.lower()
+                continue
+            if field == 'limit':
+                if not value.isdigit():
+                    raise ValueError(f"limit must be a number, not '{value}'")
+                query['limit'] = int(value)
+                continue
+            if not value or field not in QUERY_FIELDS:
+                field, value = 'text', body
+            if field == 'due' and value.lower() not in DUE_BUCKETS:
+                raise ValueError(f"unknown due bucket '{value}' (use {', '.join(DUE_BUCKETS)})")
+            clause = {"field": field, "op": "=", "value": value.lower()}
+        clause['negate'] = negate
+        clause['source'] = word
+        query['clauses'].append(clause)
+    return query
+
+def _clause_estimate(index, clause):
+    """Number of tasks the index says a clause matches (an upper bound for text), or None
+    if no index can answer the clause"""
+    field, value = clause['field'], clause['value']
+    if field == 'due' and clause['op'] != '=':
+        estimate = len(_due_positions(index, clause))
+    elif field == 'text':
+        if ' ' in value:
+            return None
+        estimate = min(sum(len(positions) for word, positions in index.words().items() if value in word), len(index.tasks))
+    else:
+        estimate = bitmap_count(index.term(field, value))
+    return len(index.tasks) - estimate if clause['negate'] else estimate
+
+def _due_positions(index, clause):
+    ordinals, positions = index.due_order()
+    value = clause['value']
+    if clause['op'] in ('<', '<='):
+        return positions[:bisect.bisect_left(ordinals, value + (clause['op'] == '<='))]
+    return positions[bisect.bisect_left(ordinals, value + (clause['op'] == '>')):]
+
+def _clause_bitmap(index, clause):
+    field, value = clause['field'], clause['value']
+    if field == 'due' and clause['op'] != '=':
+        bitmap = bitmap_from_positions(_due_positions(index, clause), len(index.tasks))
+    elif field == 'text':
+        # A term without spaces can only occur inside a single word, so the words containing it
+        # give exactly the tasks that contain it
+        positions = [position for word, word_positions in index.words().items() if value in word
+                     for position in word_positions]
+        bitmap = bitmap_from_positions(positions, len(index.tasks))
+    else:
+        bitmap = index.term(field, value)
+    return index.all & ~bitmap if clause['negate'] else bitmap
+
+def _clause_matches(task, clause, today):
+    field, value = clause['field'], clause['value']
+    if field == 'text':
+        result = value in task['task'].lower()
+    elif field == 'due' and clause['op'] != '=':
+        date = parse_date(task['due_date'])
+        result = date is not None and QUERY_OPERATORS[clause['op']](date.toordinal(), value)
+    elif field == 'due':
+        result = due_bucket(task['due_date'], today) == value
+    elif field == 'tag':
+        result = value in task_tags(task)
+    elif field == 'status':
+        result = task['status'].lower() == value
+    else:
+        result = task.get('category', 'General').lower() == value
+    return result != clause['negate']
+
+def run_query(query, index):
+    """Run a parsed query. Returns (tasks, plan): the matching tasks, sorted and limited,
+    and one line per step of the plan with its row counts and timing."""
+    started = time.perf_counter()
+    plan = []
+    indexed, scanned = [], []
+    for clause in query['clauses']:
+        estimate = _clause_estimate(index, clause)
+        if estimate is None:
+            scanned.append(clause)
+        else:
+            indexed.append((estimate, clause))
+    indexed.sort(key=lambda item: item[0])
+    plan.append(f"plan    {len(indexed)} indexed, {len(scanned)} scanned clause(s) "
+                f"({(time.perf_counter() - started) * 1000:.2f} ms, includes building indexes on first use)")
+    
+    candidates = index.all
+    count = len(index.tasks)
+    for estimate, clause in indexed:
+        if count <= QUERY_SCAN_THRESHOLD:
+            scanned.append(clause)
+            continue
+        step_start = time.perf_counter()
+        candidates &= _clause_bitmap(index, clause)
+        count = bitmap_count(candidates)
+        plan.append(f"index   {clause['source']:<24} estimate {estimate:>7} -> {count} tasks "
+                    f"({(time.perf_counter() - step_start) * 1000:.2f} ms)")
+    tasks = [index.tasks[position] for position in bitmap_positions(candidates)]
+    
+    if scanned:
+        step_start = time.perf_counter()
+        checked = len(tasks)
+        tasks = [task for task in tasks if all(_clause_matches(task, clause, index.today) for clause in scanned)]
+        sources = " ".join(clause['source'] for clause in scanned)
+        plan.append(f"{'filter' if indexed else 'scan':<7} {sources:<24} checked {checked:>8} -> {len(tasks)} tasks "
+                    f"({(time.perf_counter() - step_start) * 1000:.2f} ms)")
+    
+    step_start = time.perf_counter()
+    key = query_sort_key(query['sort'])
+    if query['limit'] is not None:
+        # Only the first 'limit' tasks are needed, so keep a heap of that size instead of sorting everything
+        tasks = heapq.nsmallest(query['limit'], tasks, key=key)
+        plan.append(f"top {query['limit']} by {query['sort']} -> {len(tasks)} tasks "
+                    f"({(time.perf_counter() - step_start) * 1000:.2f} ms)")
+    else:
+        tasks = sorted(tasks, key=key)
+        plan.append(f"sort by {query['sort']} -> {len(tasks)} tasks ({(time.perf_counter() - step_start) * 1000:.2f} ms)")
+    plan.append(f"total {(time.perf_counter() - started) * 1000:.2f} ms")
+    return tasks, plan
+
+# Saved views: named queries ("name | query" lines in views.txt) whose results are kept up to date.
+# A view is computed once with run_query(); after that the change feed re-checks only the task
+# that was added or edited and removes deleted or completed ones, so opening a view just reads
+# its stored result. Views are recomputed when the list is switched or the date changes.
+class SavedView:
+    """A saved query and its current result, kept sorted as (sort key, task id) entries"""
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self.query = parse_query(text)
+        self.entries = []
+        self.keys = {}
+
+    def _entry(self, task):
+        return (query_sort_key(self.query['sort'])(task), task['id'])
+
+    def build(self, index):
+        # Re-parse so relative dates like due<today move with the day
+        self.query = parse_query(self.text)
+        tasks, _ = run_query(dict(self.query, limit=None), index)
+        key = query_sort_key(self.query['sort'])
+        self.entries = sorted((key(task), task['id']) for task in tasks)
+        self.keys = {entry[1]: entry for entry in self.entries}
+
+    def discard(self, task_id):
+        entry = self.keys.pop(task_id, None)
+        if entry is not None:
+            del self.entries[bisect.bisect_left(self.entries, entry)]
+
+    def refresh(self, task, today):
+        """Re-check one added or edited task"""
+        self.discard(task['id'])
+        if all(_clause_matches(task, clause, today) for clause in self.query['clauses']):
+            entry = self._entry(task)
+            bisect.insort(self.entries, entry)
+            self.keys[task['id']] = entry
+
+    def results(self, tasks_by_id):
+        entries = self.entries if self.query['limit'] is None else self.entries[:self.query['limit']]
+        return [tasks_by_id[task_id] for _, task_id in entries]
+
+_view_state = {'views': None, 'tasks': None, 'today': None, 'by_id': {}}
+
+def _read_view_definitions():
+    views = {}
+    for line in storage.read_lines('views.txt'):
+        if ' | ' not in line:
+            continue
+        name, text = line.split(' | ', 1)
+        try:
+            views[name] = SavedView(name, text)
+        except ValueError:
+            continue
+    return views
+
+def saved_views():
+    """The saved views, computed for the current list if they are not up to date"""
+    if _view_state['views'] is None:
+        _view_state['views'] = _read_view_definitions()
+        _view_state['tasks'] = None
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if _view_state['tasks'] is not to_do_list or _view_state['today'] != today:
+        _view_state['by_id'] = {task['id']: task for task in to_do_list}
+        index = get_task_index()
+        for view in _view_state['views'].values():
+            view.build(index)
+        _view_state['tasks'] = to_do_list
+        _view_state['today'] = today
+    return _view_state['views']
+
+def open_saved_view(name):
+    return saved_views()[name].results(_view_state['by_id'])
+
+def save_view(name, text):
+    """Add or replace a saved view. Raises ValueError for an invalid name or query."""
+    name = name.strip()
+    if not name or ' | ' in name:
+        raise ValueError("view names cannot be empty or contain ' | '")
+    view = SavedView(name, text)
+    views = saved_views()
+    views[name] = view
+    view.build(get_task_index())
+    storage.write_lines('views.txt', [f"{view.name} | {view.text}" for view in views.values()])
+
+def delete_view(name):
+    views = saved_views()
+    del views[name]
+    storage.write_lines('views.txt', [f"{view.name} | {view.text}" for view in views.values()])
+
+def _moves_other_tasks(event, task):
+    """True if an event can change rolled-up due dates, and so move other tasks in the views:
+    those of the task's parents, or of a task whose subtasks are waiting for it to come back"""
+    if event['event'] == 'add':
+        return bool(task.get('parent')) or task.get('id') in subtask_tree().waiting
+    if event['event'] == 'edit':
+        return bool(task.get('parent') or 'parent' in event['fields']) and \
+            bool(set(event['fields']) & {'parent', 'status', 'due_date'})
+    return bool(task.get('parent'))
+
+def _update_saved_views(event):
+    views = _view_state['views']
+    if not views or _view_state['tasks'] is not to_do_list:
+        return
+    by_id = _view_state['by_id']
+    kind = event['event']
+    if kind in ('delete', 'complete'):
+        if _moves_other_tasks(event, by_id.get(event['task_id'], {})):
+            _view_state['tasks'] = None
+            return
+        by_id.pop(event['task_id'], None)
+        for view in views.values():
+            view.discard(event['task_id'])
+        return
+    if kind == 'add':
+        index = event['index']
+        task = to_do_list[index] if 0 <= index < len(to_do_list) else None
+        if task is None or task.get('id') != event['task'].get('id'):
+            task = None
+    elif kind == 'edit':
+        task = by_id.get(event['task_id'])
+    else:
+        return
+    if task is None or not task.get('id'):
+        # Can't tell which task changed, recompute on the next open
+        _view_state['tasks'] = None
+        return
+    if _moves_other_tasks(event, task):
+        _view_state['tasks'] = None
+        return
+    by_id[task['id']] = task
+    for view in views.values():
+        view.refresh(task, _view_state['today'])
+
+subscribe_changes(_update_saved_views)
+
+# Duplicate detection. Names are compared after normalize_task_name(). The active tasks of the
+# current list are kept in a hash index (normalized name -> task ids), updated from the change
+# feed. Archived names go into a Bloom filter saved in completed_bloom.txt, so "was this done
+# before?" is answered without reading the archive. A Bloom filter can report a name it never
+# saw (about 1% of the time at its sizing) but never misses one, so that answer is a "probably".
+def normalize_task_name(name):
+    """Lower case, punctuation dropped, whitespace collapsed: "Buy  milk!" -> "buy milk" """
+    return " ".join("".join(char if char.isalnum() else " " for char in name.lower()).split())
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, using double hashing of a BLAKE2 digest"""
+
+    BITS_PER_ITEM = 10
+
+    def __init__(self, bit_count, hash_count=7, bits=None, count=0):
+        self.bit_count = bit_count
+        self.hash_count = hash_count
+        self.bits = bits if bits is not None else bytearray((bit_count + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity):
+        return cls(max(8192, capacity * cls.BITS_PER_ITEM))
+
+    def is_full(self):
+        return self.count > self.bit_count // self.BITS_PER_ITEM
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+# 'end' is the archive position the filter covers; 'saved_end' what completed_bloom.txt covers
+_bloom_state = {'storage': None, 'filter': None, 'end': 0, 'saved_end': 0}
+
+def _save_completed_bloom():
+    bloom = _bloom_state['filter']
+    storage.write_lines('completed_bloom.txt', [f"{bloom.bit_count} {bloom.hash_count} {bloom.count} {_bloom_state['end']}",
+                                                bloom.bits.hex()])
+    _bloom_state['saved_end'] = _bloom_state['end']
+
+def _read_completed_bloom():
+    lines = storage.read_lines('completed_bloom.txt')
+    try:
+        bit_count, hash_count, count, end = (int(value) for value in lines[0].split())
+        bits = bytearray.fromhex(lines[1])
+    except (IndexError, ValueError):
+        return None, 0
+    if len(bits) != (bit_count + 7) // 8:
+        return None, 0
+    return BloomFilter(bit_count, hash_count, bits, count), end
+
+def completed_bloom():
+    """The Bloom filter of archived task names, caught up with the end of the archive"""
+    if _bloom_state['storage'] is not storage:
+        _bloom_state['filter'], _bloom_state['end'] = _read_completed_bloom()
+        _bloom_state['saved_end'] = _bloom_state['end']
+        _bloom_state['storage'] = storage
+    bloom, end = _bloom_state['filter'], _bloom_state['end']
+    archive_size = storage.archive_size()
+    if bloom is None or end > archive_size or bloom.is_full():
+        # Missing, the archive was rewritten or truncated, or the filter got too full: rebuild,
+        # with room for the archive to double
+        names = [normalize_task_name(task['task']) for chunk in storage.map_archive(list) for task in chunk]
+        bloom = BloomFilter.for_capacity(2 * len(names))
+        for name in names:
+            bloom.add(name)
+        _bloom_state['filter'], _bloom_state['end'] = bloom, archive_size
+        _save_completed_bloom()
+    elif end < archive_size:
+        for task, _, _ in storage.iter_archive(end):
+            if task is not None:
+                bloom.add(normalize_task_name(task['task']))
+        _bloom_state['end'] = archive_size
+        _save_completed_bloom()
+    return bloom
+
+def _add_to_completed_bloom(tasks, start, end):
+    """Called for each archive append, keeps a loaded filter current without a re-scan"""
+    if _bloom_state['storage'] is storage and _bloom_state['filter'] is not None and _bloom_state['end'] == start:
+        for task in tasks:
+            _bloom_state['filter'].add(normalize_task_name(task['task']))
+        _bloom_state['end'] = end
+
+# Save the filter if appends happened since it was last written (otherwise the next start catches up)
+def save_completed_bloom():
+    if _bloom_state['storage'] is storage and _bloom_state['filter'] is not None \
+            and _bloom_state['end'] != _bloom_state['saved_end']:
+        _save_completed_bloom()
+
+_name_index = {'tasks': None, 'names': {}, 'by_id': {}, 'keys': {}}
+
+def _index_task_name(task):
+    key = normalize_task_name(task['task'])
+    _name_index['names'].setdefault(key, set()).add(task['id'])
+    _name_index['by_id'][task['id']] = task
+    _name_index['keys'][task['id']] = key
+
+def _unindex_task_name(task_id):
+    key = _name_index['keys'].pop(task_id, None)
+    _name_index['by_id'].pop(task_id, None)
+    if key is not None:
+        _name_index['names'][key].discard(task_id)
+        if not _name_index['names'][key]:
+            del _name_index['names'][key]
+
+def active_name_index():
+    """normalized name -> ids of the active tasks of the current list with that name"""
+    if _name_index['tasks'] is not to_do_list:
+        _name_index.update(tasks=to_do_list, names={}, by_id={}, keys={})
+        for task in to_do_list:
+            if task.get('id'):
+                _index_task_name(task)
+    return _name_index['names']
+
+def _update_name_index(event):
+    if _name_index['tasks'] is not to_do_list:
+        return
+    kind = event['event']
+    if kind in ('delete', 'complete'):
+        _unindex_task_name(event['task_id'])
+    elif kind == 'edit' and 'task' in event['fields']:
+        task = _name_index['by_id'].get(event['task_id'])
+        _unindex_task_name(event['task_id'])
+        if task is not None:
+            _index_task_name(task)
+    elif kind == 'add':
+        index = event['index']
+        if 0 <= index < len(to_do_list) and to_do_list[index].get('id') == event['task'].get('id'):
+            _index_task_name(to_do_list[index])
+        else:
+            _name_index['tasks'] = None
+
+subscribe_changes(_update_name_index)
+
+def find_duplicates(name, exclude_id=None):
+    """(active tasks with the same normalized name, whether the name was probably completed before)"""
+    key = normalize_task_name(name)
+    ids = active_name_index().get(key, ())
+    active = [_name_index['by_id'][task_id] for task_id in ids if task_id != exclude_id]
+    return active, key in completed_bloom()
+
+# Warn about duplicates of a task name. Returns False if the user decides not to go ahead.
+def confirm_not_duplicate(name, exclude_id=None):
+    active, completed_before = find_duplicates(name, exclude_id)
+    if completed_before:
+        print("Note: a task with this name was probably completed before.")
+    if not active:
+        return True
+    print("This looks like a duplicate of:")
+    for task in active:
+        print(f"  {task['task']} - {task['status']} (Due: {task['due_date']}) [Category: {task.get('category', 'General')}]")
+    return input("Continue anyway? (yes/no): ").lower() == "yes"
+
+# Fuzzy search. Names (normalized) are split into the trigrams of " name ", and a trigram index
+# maps each trigram to the names containing it. A query's candidates are the names sharing
+# enough of its trigrams (one typo changes at most three), and only the FUZZY_CANDIDATES best
+# of them are ranked by the edit distance between the query and their closest substring.
+# Trigrams found in more than FUZZY_LONG_POSTINGS names (" th", "ing") are left out of the
+# count, up to half of the trigrams a candidate needs; see TrigramIndex.candidates().
+# The current list's index is updated from the change feed; the archive's is built once per
+# archive version and extended on appends.
+FUZZY_CANDIDATES = 200
+FUZZY_LONG_POSTINGS = 1000
+
+def name_trigrams(name):
+    padded = f" {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def fuzzy_max_distance(query):
+    return 1 if len(query) <= 5 else 2 if len(query) <= 10 else 3
+
+def substring_edit_distance(pattern, text):
+    """Fewest edits turning pattern into some substring of text (Sellers' algorithm)"""
+    previous = list(range(len(pattern) + 1))
+    best = previous[-1]
+    for char in text:
+        current = [0]
+        for j, pattern_char in enumerate(pattern, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (pattern_char != char)))
+        best = min(best, current[-1])
+        previous = current
+    return best
+
+class TrigramIndex:
+    """Trigram -> ids of the names containing it, and the tasks (by key) behind each name"""
+
+    def __init__(self):
+        self.names = []
+        self.name_ids = {}
+        self.tasks = []
+        self.keys = {}
+        self.postings = {}
+
+    def add(self, key, task):
+        name = normalize_task_name(task['task'])
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+            self.tasks.append({})
+            for trigram in name_trigrams(name):
+                self.postings.setdefault(trigram, []).append(name_id)
+        self.tasks[name_id][key] = task
+        self.keys[key] = name_id
+
+    def discard(self, key):
+        # The name stays in the postings; names without tasks are skipped when searching
+        name_id = self.keys.pop(key, None)
+        if name_id is not None:
+            self.tasks[name_id].pop(key, None)
+
+    def candidates(self, trigrams, minimum):
+        """(shared trigram count, name id) of the best matching names that still have tasks.
+        Up to minimum // 2 of the longest postings are not counted: a name sharing 'minimum' trigrams
+        still shares minimum - skipped of the others, and only those names are looked up in them."""
+        postings = sorted((self.postings.get(trigram, ()) for trigram in trigrams), key=len, reverse=True)
+        skipped = 0
+        while skipped < minimum // 2 and len(postings[skipped]) > FUZZY_LONG_POSTINGS:
+            skipped += 1
+        long_postings = postings[:skipped][::-1]
+        counts = Counter()
+        for names in postings[skipped:]:
+            counts.update(names)
+        matching = []
+        for name_id, count in counts.items():
+            if count < minimum - skipped or not self.tasks[name_id]:
+                continue
+            # Name ids are added in increasing order, so each posting is sorted. Stop once the
+            # name can no longer reach 'minimum'; a match is looked up everywhere for its full count.
+            left = skipped
+            for names in long_postings:
+                if count + left < minimum:
+                    break
+                left -= 1
+                at = bisect.bisect_left(names, name_id)
+                count += at < len(names) and names[at] == name_id
+            if count >= minimum:
+                matching.append((count, name_id))
+        return heapq.nlargest(FUZZY_CANDIDATES, matching)
+
+_fuzzy_state = {'tasks': None, 'active': None, 'archive_key': None, 'archive': None}
+
+def active_fuzzy_index():
+    if _fuzzy_state['tasks'] is not to_do_list:
+        index = TrigramIndex()
+        for task in to_do_list:
+            index.add(task.get('id'), task)
+        _fuzzy_state['tasks'], _fuzzy_state['active'] = to_do_list, index
+    return _fuzzy_state['active']
 
-def get_color_for_status(status, due_date=None):
-    """Return the appropriate color code for a task status"""
-    # Check if overdue first (for non-completed tasks)
-    if due_date and status.lower() != "done" and is_overdue(due_date):
-        return Colors.MAGENTA + Colors.BOLD
-    
-    status_lower = status.lower()
-    if status_lower == "urgent":
-        return Colors.RED
-    elif status_lower == "semi-urgent":
-        return Colors.YELLOW
-    elif status_lower == "non-urgent":
-        return Colors.GREEN
-    elif status_lower == "done":
-        return Colors.BLUE
-    else:
-        return Colors.RESET
+def archive_fuzzy_index():
+    key = (storage, storage.archive_version())
+    if _fuzzy_state['archive_key'] != key:
+        index = TrigramIndex()
+        position = 0
+        for chunk in storage.map_archive(list):
+            for task in chunk:
+                index.add(position, task)
+                position += 1
+        _fuzzy_state['archive'], _fuzzy_state['archive_key'] = index, key
+    return _fuzzy_state['archive']
 
-def parse_date(date_string):
-    """Parse date string and return datetime object. Return None for invalid dates."""
-    if date_string == "No due date":
+def _add_to_archive_fuzzy_index(tasks, previous_version):
+    """Called for each archive append, so the next search doesn't rebuild the archive index"""
+    index = _fuzzy_state['archive']
+    if index is not None and _fuzzy_state['archive_key'] == (storage, previous_version):
+        for task in tasks:
+            index.add(len(index.keys), task)
+        _fuzzy_state['archive_key'] = (storage, storage.archive_version())
+
+def _update_fuzzy_index(event):
+    index = _fuzzy_state['active']
+    if index is None or _fuzzy_state['tasks'] is not to_do_list:
+        return
+    kind = event['event']
+    if kind in ('delete', 'complete'):
+        index.discard(event['task_id'])
+    elif kind == 'edit' and 'task' in event['fields']:
+        name_id = index.keys.get(event['task_id'])
+        task = index.tasks[name_id].get(event['task_id']) if name_id is not None else None
+        index.discard(event['task_id'])
+        if task is not None:
+            index.add(event['task_id'], task)
+    elif kind == 'add':
+        position = event['index']
+        if 0 <= position < len(to_do_list) and to_do_list[position].get('id') == event['task'].get('id'):
+            index.add(to_do_list[position]['id'], to_do_list[position])
+        else:
+            _fuzzy_state['tasks'] = None
+
+subscribe_changes(_update_fuzzy_index)
+
+def fuzzy_search(query, limit=10, include_archive=True):
+    """Best matches for a possibly misspelled query, as (distance, source, tasks) with source
+    'active' or 'completed' and the tasks sharing that name. Queries under 3 letters match nothing."""
+    query = normalize_task_name(query)
+    if len(query) < 3:
+        return []
+    max_distance = fuzzy_max_distance(query)
+    trigrams = name_trigrams(query)
+    minimum = max(1, len(trigrams) - 3 * max_distance)
+    indexes = [('active', active_fuzzy_index())]
+    if include_archive:
+        indexes.append(('completed', archive_fuzzy_index()))
+    ranked = []
+    for source, index in indexes:
+        for overlap, name_id in index.candidates(trigrams, minimum):
+            distance = substring_edit_distance(query, index.names[name_id])
+            if distance <= max_distance:
+                ranked.append((distance, -overlap, len(index.names[name_id]), source, list(index.tasks[name_id].values())))
+    ranked.sort(key=lambda match: match[:3])
+    return [(distance, source, tasks) for distance, _, _, source, tasks in ranked[:limit]]
+
+# Dependencies. A task's "blocked_by" extra holds the ids of the tasks that must be finished
+# first. Only open tasks (in the list and not Done) block; an id that is archived or deleted
+# no longer does. The graph keeps a topological order as one position per task and fixes
+# it up locally when an edge goes against it (Pearce-Kelly), which is also where cycles are
+# found. For each task it keeps the longest chain of open blockers up to it and its deadline
+# (the earliest due date of it and everything waiting on it); both are pushed only through
+# the tasks an edit affects. It follows the change feed like the other indexes.
+def task_blockers(task):
+    return [task_id for task_id in task.get('blocked_by', '').split(',') if task_id]
+
+class DependencyGraph:
+    """Blocked-by edges between the open tasks of a list, with cached order, chains and deadlines"""
+
+    def __init__(self, tasks):
+        self.all = {}
+        self.tasks = {}
+        self.declared = {}
+        self.waiting = {}
+        self.blockers = {}
+        self.dependents = {}
+        self.position = {}
+        self.next_position = 0
+        self.blocked = set()
+        self.ignored = set()
+        self.chain = {}
+        self.deadline = {}
+        for task in tasks:
+            self.all[task['id']] = task
+            if task['status'].lower() != 'done':
+                self._add_node(task, connect=False)
+        # Lay out the initial order in one pass (Kahn), then add the edges in that order
+        for task_id in self._initial_order():
+            self.position[task_id] = self.next_position
+            self.next_position += 1
+        for task_id, declared in self.declared.items():
+            for blocker in declared:
+                if blocker in self.tasks:
+                    self._add_edge(blocker, task_id)
+        self._refresh(self.tasks, self.tasks)
+
+    def _initial_order(self):
+        indegree = {task_id: sum(blocker in self.tasks for blocker in declared)
+                    for task_id, declared in self.declared.items()}
+        ready = deque(task_id for task_id, count in indegree.items() if count == 0)
+        order = []
+        while ready:
+            task_id = ready.popleft()
+            order.append(task_id)
+            for waiting in self.waiting.get(task_id, ()):
+                indegree[waiting] -= 1
+                if indegree[waiting] == 0:
+                    ready.append(waiting)
+        # Tasks on a cycle (only possible in a hand-edited file) go last; one edge of each cycle is ignored
+        placed = set(order)
+        return order + [task_id for task_id in self.tasks if task_id not in placed]
+
+    def _add_node(self, task, connect=True):
+        task_id = task['id']
+        self.tasks[task_id] = task
+        self.blockers[task_id], self.dependents[task_id] = set(), set()
+        self.declared[task_id] = set(task_blockers(task))
+        for blocker in self.declared[task_id]:
+            self.waiting.setdefault(blocker, set()).add(task_id)
+        if connect:
+            self.position[task_id] = self.next_position
+            self.next_position += 1
+            for blocker in self.declared[task_id]:
+                if blocker in self.tasks:
+                    self._add_edge(blocker, task_id)
+            for waiting in self.waiting.get(task_id, ()):
+                self._add_edge(task_id, waiting)
+            self._refresh([task_id], [task_id])
+
+    def _remove_node(self, task_id):
+        if task_id not in self.tasks:
+            return
+        del self.tasks[task_id]
+        dependents, blockers = self.dependents.pop(task_id), self.blockers.pop(task_id)
+        for waiting in dependents:
+            self.blockers[waiting].discard(task_id)
+            if not self.blockers[waiting]:
+                self.blocked.discard(waiting)
+        for blocker in blockers:
+            self.dependents[blocker].discard(task_id)
+        for blocker in self.declared.pop(task_id):
+            self.waiting[blocker].discard(task_id)
+        self.ignored = {edge for edge in self.ignored if task_id not in edge}
+        self.blocked.discard(task_id)
+        del self.position[task_id], self.chain[task_id], self.deadline[task_id]
+        self._refresh(dependents, blockers)
+        self._retry_ignored()
+
+    def _reaches(self, start, target, limit):
+        """Whether target can be reached from start following dependents, and the tasks visited.
+        Only tasks before position limit are followed: nothing after it can lead back."""
+        seen, stack = {start}, [start]
+        while stack:
+            for waiting in self.dependents[stack.pop()]:
+                if waiting == target:
+                    return True, seen
+                if waiting not in seen and self.position[waiting] < limit:
+                    seen.add(waiting)
+                    stack.append(waiting)
+        return False, seen
+
+    def _add_edge(self, blocker, task_id):
+        """Add blocker -> task_id, reordering the tasks between them if needed. False for a cycle."""
+        if blocker == task_id:
+            self.ignored.add((blocker, task_id))
+            return False
+        if self.position[blocker] > self.position[task_id]:
+            cycle, forward = self._reaches(task_id, blocker, self.position[blocker])
+            if cycle:
+                self.ignored.add((blocker, task_id))
+                return False
+            backward, stack = {blocker}, [blocker]
+            while stack:
+                for earlier in self.blockers[stack.pop()]:
+                    if earlier not in backward and self.position[earlier] > self.position[task_id]:
+                        backward.add(earlier)
+                        stack.append(earlier)
+            # The affected tasks keep their positions as a set; blockers take the first ones
+            moved = sorted(backward, key=self.position.get) + sorted(forward, key=self.position.get)
+            for task, position in zip(moved, sorted(self.position[task] for task in moved)):
+                self.position[task] = position
+        self.blockers[task_id].add(blocker)
+        self.dependents[blocker].add(task_id)
+        self.blocked.add(task_id)
+        return True
+
+    def _remove_edge(self, blocker, task_id):
+        self.ignored.discard((blocker, task_id))
+        if blocker in self.blockers.get(task_id, ()):
+            self.blockers[task_id].discard(blocker)
+            self.dependents[blocker].discard(task_id)
+            if not self.blockers[task_id]:
+                self.blocked.discard(task_id)
+
+    def _retry_ignored(self):
+        """Add edges that were left out for closing a cycle, if the cycle is gone now"""
+        for blocker, task_id in list(self.ignored):
+            self.ignored.discard((blocker, task_id))
+            if self._add_edge(blocker, task_id):
+                self._refresh([task_id], [blocker])
+
+    def _refresh(self, forward, backward):
+        """Recompute chains downstream of forward and deadlines upstream of backward,
+        in topological order, stopping wherever a value comes out unchanged"""
+        heap = [(self.position[task_id], task_id) for task_id in forward if task_id in self.tasks]
+        heapq.heapify(heap)
+        while heap:
+            _, task_id = heapq.heappop(heap)
+            chain = 1 + max((self.chain[blocker] for blocker in self.blockers[task_id]), default=0)
+            if self.chain.get(task_id) != chain:
+                self.chain[task_id] = chain
+                for waiting in self.dependents[task_id]:
+                    heapq.heappush(heap, (self.position[waiting], waiting))
+        heap = [(-self.position[task_id], task_id) for task_id in backward if task_id in self.tasks]
+        heapq.heapify(heap)
+        while heap:
+            _, task_id = heapq.heappop(heap)
+            deadline = min([parse_date(self.tasks[task_id]['due_date']) or datetime.max] +
+                           [self.deadline[waiting] for waiting in self.dependents[task_id]])
+            if self.deadline.get(task_id) != deadline:
+                self.deadline[task_id] = deadline
+                for blocker in self.blockers[task_id]:
+                    heapq.heappush(heap, (-self.position[blocker], blocker))
+
+    def would_cycle(self, task_id, blocker_ids):
+        """The first of blocker_ids that already (directly or not) waits on task_id, or None"""
+        for blocker in blocker_ids:
+            if blocker == task_id:
+                return blocker
+            if blocker in self.tasks and task_id in self.tasks and self.position[task_id] < self.position[blocker]:
+                if self._reaches(task_id, blocker, self.position[blocker])[0]:
+                    return blocker
         return None
+
+    def add(self, task):
+        self.all[task['id']] = task
+        if task['status'].lower() != 'done':
+            self._add_node(task)
+
+    def discard(self, task_id):
+        self.all.pop(task_id, None)
+        self._remove_node(task_id)
+
+    def update(self, task_id, fields):
+        """Follow an edit of a task's blocked_by, status or due date"""
+        task = self.all.get(task_id)
+        if task is None:
+            return
+        is_open = task['status'].lower() != 'done'
+        if task_id not in self.tasks or not is_open:
+            if task_id in self.tasks:
+                self._remove_node(task_id)
+            elif is_open:
+                self._add_node(task)
+            return
+        if 'blocked_by' in fields:
+            old, new = self.declared[task_id], set(task_blockers(task))
+            for blocker in old - new:
+                self.waiting[blocker].discard(task_id)
+                self._remove_edge(blocker, task_id)
+            for blocker in new - old:
+                self.waiting.setdefault(blocker, set()).add(task_id)
+                if blocker in self.tasks:
+                    self._add_edge(blocker, task_id)
+            self.declared[task_id] = new
+            self._refresh([task_id], old | new | {task_id})
+            self._retry_ignored()
+        else:
+            self._refresh([task_id], [task_id])
+
+    def ordered(self):
+        """Open tasks in an order where every task comes after its blockers"""
+        return [self.tasks[task_id] for task_id in sorted(self.tasks, key=self.position.get)]
+
+    def actionable(self):
+        return [task for task_id, task in self.tasks.items() if task_id not in self.blocked]
+
+    def critical_path(self):
+        """The longest chain of open tasks that have to be done one after another (ties go to
+        the earliest deadline), first task first"""
+        if not self.tasks:
+            return []
+        rank = lambda task_id: (self.chain[task_id], -self.deadline[task_id].toordinal(), -self.position[task_id])
+        task_id = max(self.tasks, key=rank)
+        path = [task_id]
+        while self.blockers[task_id]:
+            task_id = max(self.blockers[task_id], key=rank)
+            path.append(task_id)
+        return [self.tasks[task_id] for task_id in reversed(path)]
+
+_dependency_state = {'tasks': None, 'graph': None}
+
+def dependency_graph():
+    if _dependency_state['tasks'] is not to_do_list:
+        _dependency_state['graph'] = DependencyGraph(to_do_list)
+        _dependency_state['tasks'] = to_do_list
+    return _dependency_state['graph']
+
+def _update_dependency_graph(event):
+    graph = _dependency_state['graph']
+    if graph is None or _dependency_state['tasks'] is not to_do_list:
+        return
+    kind = event['event']
+    if kind in ('delete', 'complete'):
+        graph.discard(event['task_id'])
+    elif kind == 'edit' and set(event['fields']) & {'blocked_by', 'status', 'due_date'}:
+        graph.update(event['task_id'], event['fields'])
+    elif kind == 'add':
+        position = event['index']
+        if 0 <= position < len(to_do_list) and to_do_list[position].get('id') == event['task'].get('id'):
+            graph.add(to_do_list[position])
+        else:
+            _dependency_state['tasks'] = None
+
+subscribe_changes(_update_dependency_graph)
+
+# Subtasks. A subtask's "parent" extra holds its parent's id; a task whose parent is not in
+# the list (deleted, or in the archive) is shown at the top level. Completed subtasks are
+# counted in their parent's "subtasks_done" extra, since they leave the list. Each task has
+# a cached rollup of the subtasks below it (nested ones included): how many are open, how
+# many are done and the earliest due date among the open ones. A change to a task recomputes
+# only its ancestors, each from its direct subtasks. It follows the change feed like the
+# other indexes.
+class SubtaskTree:
+    """Parent/subtask links of a list with cached progress rollups"""
+
+    def __init__(self, tasks):
+        self.tasks = {}
+        self.declared = {}
+        self.parent = {}
+        self.children = {}
+        self.waiting = {}
+        self.open = {}
+        self.done = {}
+        self.due = {}
+        for task in tasks:
+            if task.get('id'):
+                self.tasks[task['id']] = task
+                self.children[task['id']] = set()
+        for task_id, task in self.tasks.items():
+            self._link(task_id, task.get('parent', ''))
+        # Rollups bottom-up: every task after all of its subtasks
+        order = [task_id for task_id in self.tasks if task_id not in self.parent]
+        for task_id in order:
+            order.extend(self.children[task_id])
+        for task_id in reversed(order):
+            self._recompute(task_id)
+
+    def _link(self, task_id, parent_id):
+        self.declared[task_id] = parent_id
+        if not parent_id:
+            return
+        if parent_id not in self.tasks or self.is_below(parent_id, task_id):
+            # Wait for the parent to come back (or for the cycle to be broken)
+            self.waiting.setdefault(parent_id, set()).add(task_id)
+            return
+        self.parent[task_id] = parent_id
+        self.children[parent_id].add(task_id)
+
+    def _unlink(self, task_id):
+        parent_id = self.declared.pop(task_id, '')
+        if self.parent.pop(task_id, None) is not None:
+            self.children[parent_id].discard(task_id)
+        elif parent_id in self.waiting:
+            self.waiting[parent_id].discard(task_id)
+            if not self.waiting[parent_id]:
+                del self.waiting[parent_id]
+        return parent_id
+
+    def is_below(self, task_id, ancestor_id):
+        """True if task_id is ancestor_id or one of its (nested) subtasks"""
+        while task_id is not None:
+            if task_id == ancestor_id:
+                return True
+            task_id = self.parent.get(task_id)
+        return False
+
+    def _recompute(self, task_id):
+        task = self.tasks[task_id]
+        open_count, done_count, due_dates = 0, int(task.get('subtasks_done') or 0), []
+        for child_id in self.children[task_id]:
+            child = self.tasks[child_id]
+            done_count += self.done[child_id]
+            if child['status'].lower() == 'done':
+                done_count += 1
+                continue
+            open_count += 1 + self.open[child_id]
+            due_dates.append(parse_date(child['due_date']))
+            due_dates.append(self.due.get(child_id))
+        self.open[task_id], self.done[task_id] = open_count, done_count
+        due_dates = [due_date for due_date in due_dates if due_date is not None]
+        if due_dates:
+            self.due[task_id] = min(due_dates)
+        else:
+            self.due.pop(task_id, None)
+
+    def _refresh(self, task_id):
+        """Recompute the rollups of task_id and everything above it"""
+        while task_id is not None:
+            self._recompute(task_id)
+            task_id = self.parent.get(task_id)
+
+    def add(self, task):
+        task_id = task['id']
+        self.tasks[task_id] = task
+        self.children[task_id] = set()
+        # Subtasks of a task that comes back (e.g. an undone delete) attach to it again
+        for child_id in self.waiting.pop(task_id, ()):
+            self.declared.pop(child_id)
+            self._link(child_id, task_id)
+        self._link(task_id, task.get('parent', ''))
+        self._recompute(task_id)
+        self._refresh(self.parent.get(task_id))
+
+    def discard(self, task_id):
+        if task_id not in self.tasks:
+            return
+        parent_id = self.parent.get(task_id)
+        self._unlink(task_id)
+        for child_id in list(self.children.pop(task_id)):
+            del self.parent[child_id]
+            self.waiting.setdefault(task_id, set()).add(child_id)
+        del self.tasks[task_id], self.open[task_id], self.done[task_id]
+        self.due.pop(task_id, None)
+        self._refresh(parent_id)
+
+    def update(self, task_id, fields):
+        """Follow an edit of a task's parent, status, due date or done count"""
+        if task_id not in self.tasks:
+            return
+        if 'parent' in fields:
+            old_parent = self.parent.get(task_id)
+            self._unlink(task_id)
+            self._link(task_id, fields['parent'])
+            self._refresh(old_parent)
+        self._refresh(task_id)
+
+    def subtasks(self, task_id):
+        return [self.tasks[child_id] for child_id in self.children.get(task_id, ())]
+
+    def roots(self):
+        return [task for task_id, task in self.tasks.items() if task_id not in self.parent]
+
+    def progress(self, task_id):
+        """(done, total) subtasks below a task, nested ones included"""
+        done = self.done.get(task_id, 0)
+        return done, done + self.open.get(task_id, 0)
+
+_subtask_state = {'tasks': None, 'tree': None}
+
+def subtask_tree():
+    if _subtask_state['tasks'] is not to_do_list:
+        _subtask_state['tree'] = SubtaskTree(to_do_list)
+        _subtask_state['tasks'] = to_do_list
+    return _subtask_state['tree']
+
+def _update_subtask_tree(event):
+    tree = _subtask_state['tree']
+    if tree is None or _subtask_state['tasks'] is not to_do_list:
+        return
+    kind = event['event']
+    if kind in ('delete', 'complete'):
+        tree.discard(event['task_id'])
+    elif kind == 'edit' and set(event['fields']) & {'parent', 'status', 'due_date', 'subtasks_done'}:
+        tree.update(event['task_id'], event['fields'])
+    elif kind == 'add':
+        position = event['index']
+        if 0 <= position < len(to_do_list) and to_do_list[position].get('id') == event['task'].get('id'):
+            tree.add(to_do_list[position])
+        else:
+            _subtask_state['tasks'] = None
+
+subscribe_changes(_update_subtask_tree)
+
+# Tasks in display order with their depth: each task followed by its subtasks, sorted
+def nested_tasks(tasks):
+    tree = subtask_tree()
+    rows = []
+    stack = [(task, 0) for task in reversed(sort_tasks(tasks))]
+    while stack:
+        task, depth = stack.pop()
+        rows.append((task, depth))
+        if tree.children.get(task.get('id')):
+            stack.extend((child, depth + 1) for child in reversed(sort_tasks(tree.subtasks(task['id']))))
+    return rows
+
+def subtask_progress_text(task):
+    done, total = subtask_tree().progress(task.get('id'))
+    if not total:
+        return ""
+    due_date = subtask_tree().due.get(task['id'])
+    next_due = f", next due {due_date.strftime('%d-%m-%Y')}" if due_date else ""
+    return f" [{done}/{total} subtasks done, {done * 100 // total}%{next_due}]"
+
+def subtask_completion_edits(indexes):
+    """Edits adding the tasks at these positions (about to be archived) to their parents' done counts"""
+    tree = subtask_tree()
+    completing = {to_do_list[index].get('id') for index in indexes}
+    added = Counter()
+    for index in indexes:
+        task_id = to_do_list[index].get('id')
+        parent_id = tree.parent.get(task_id)
+        if parent_id is not None and parent_id not in completing:
+            added[parent_id] += 1 + tree.done[task_id]
+    edits = []
+    for index, task in enumerate(to_do_list):
+        if task.get('id') in added:
+            before = task.get('subtasks_done', '')
+            edits.append({"type": "edit", "index": index, "before": {"subtasks_done": before},
+                          "after": {"subtasks_done": str(int(before or 0) + added[task['id']])}})
+    return edits
+
+# Time tracking. Starting and stopping a timer appends one short line to timelog.txt, which
+# is never rewritten: "S <time> <task id> <category> <name>" and "E <time> <task id>", tab-
+# separated, with times in Unix seconds. The category and name are JSON strings, so tabs and
+# newlines in them are escaped. A line that does not parse is an error, not skipped. In memory
+# each task has its total, and each day has a bucket of seconds per (category, task), so totals
+# for a date range add up day buckets instead of replaying sessions. time_summary.json saves
+# the totals and buckets together with the log offset they cover; loading reads it and
+# replays only the log lines written after it.
+# Only one timer runs at a time, and completing or deleting a task stops its timer.
+TIME_LOG = 'timelog.txt'
+TIME_SUMMARY = 'time_summary.json'
+TIME_SUMMARY_EVERY = 1000
+
+_time_state = {'storage': None}
+
+def time_tracking():
+    """Timers, per-task totals and day buckets of the current storage, loaded on first use"""
+    if _time_state['storage'] is not storage:
+        lines = storage.read_lines(TIME_SUMMARY)
+        summary = json.loads(lines[0]) if lines else None
+        tail = storage.read_lines_from(TIME_LOG, summary['offset']) if summary else None
+        if tail is None:
+            # No summary, or the log was replaced since: replay all of it
+            summary = {"offset": 0, "running": {}, "names": {}, "totals": {}, "days": {}}
+            tail = storage.read_lines_from(TIME_LOG, 0)
+        days = {int(day): {(category, task_id): seconds for category, task_id, seconds in buckets}
+                for day, buckets in summary['days'].items()}
+        _time_state.update(storage=storage, running=summary['running'], names=summary['names'],
+                           totals=summary['totals'], days=days, day_list=sorted(days), offset=summary['offset'], pending=0)
+        _apply_time_lines(tail)
+    return _time_state
+
+def _parse_time_line(line):
+    """(kind, time, task id, [category, name] or None) of a log line. Raises ValueError if it is damaged."""
+    parts = line.split('\t')
     try:
-        return datetime.strptime(date_string, "%d-%m-%Y")
+        if parts[0] == 'S' and len(parts) == 5 and parts[2]:
+            names = [json.loads(parts[3]), json.loads(parts[4])]
+            if all(isinstance(name, str) for name in names):
+                return 'S', int(parts[1]), parts[2], names
+        elif parts[0] == 'E' and len(parts) == 3 and parts[2]:
+            return 'E', int(parts[1]), parts[2], None
     except ValueError:
-        return None
+        pass
+    raise ValueError(f"{TIME_LOG} has a damaged line: {line[:80]!r}")
 
-def is_overdue(due_date_str):
-    """Check if a task is overdue"""
-    if due_date_str == "No due date":
-        return False
-    due_date = parse_date(due_date_str)
-    if due_date is None:
-        return False
-    return due_date < datetime.now()
+def _apply_time_lines(tail):
+    try:
+        for line in tail[0]:
+            kind, when, task_id, names = _parse_time_line(line)
+            if kind == 'S':
+                _time_state['running'][task_id] = when
+                _time_state['names'][task_id] = names
+            elif task_id in _time_state['running']:
+                _add_time_session(task_id, _time_state['running'].pop(task_id), when)
+    except ValueError:
+        # Load again (and fail again) next time instead of using half-applied totals
+        _time_state['storage'] = None
+        raise
+    _time_state['offset'] = tail[1]
+    _time_state['pending'] += len(tail[0])
 
-def get_urgency_priority(status):
-    """Return numeric priority for urgency (lower number = higher priority)"""
-    status_lower = status.lower()
-    if status_lower == "urgent":
-        return 1
-    elif status_lower == "semi-urgent":
-        return 2
-    elif status_lower == "non-urgent":
-        return 3
-    elif status_lower == "done":
-        return 4
+def session_days(start, end):
+    """(day ordinal, seconds) of a session from start to end (Unix seconds), split at midnight"""
+    while start < end:
+        day = datetime.fromtimestamp(start).date()
+        midnight = int(datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp())
+        yield day.toordinal(), min(end, midnight) - start
+        start = midnight
+
+def _add_time_session(task_id, start, end):
+    category = _time_state['names'][task_id][0]
+    _time_state['totals'][task_id] = _time_state['totals'].get(task_id, 0) + end - start
+    for day, seconds in session_days(start, end):
+        if day not in _time_state['days']:
+            _time_state['days'][day] = {}
+            bisect.insort(_time_state['day_list'], day)
+        bucket = _time_state['days'][day]
+        bucket[(category, task_id)] = bucket.get((category, task_id), 0) + seconds
+
+def _log_time(line):
+    time_tracking()
+    storage.append_lines(TIME_LOG, [line])
+    # Read back from the last offset, which also picks up lines written by other processes
+    tail = storage.read_lines_from(TIME_LOG, _time_state['offset'])
+    if tail is None:
+        _time_state['storage'] = None
+        time_tracking()
     else:
-        return 5
+        _apply_time_lines(tail)
+    if _time_state['pending'] >= TIME_SUMMARY_EVERY:
+        save_time_summary()
 
-def sort_tasks(tasks):
-    """Sort tasks by due date first, then by urgency"""
-    def sort_key(task):
-        due_date = parse_date(task['due_date'])
-        urgency_priority = get_urgency_priority(task['status'])
-        
-        # Tasks with no due date go to the end
-        if due_date is None:
-            return (datetime.max, urgency_priority)
+def save_time_summary():
+    if _time_state['storage'] is not storage or not _time_state['pending']:
+        return
+    days = {str(day): [[category, task_id, seconds] for (category, task_id), seconds in buckets.items()]
+            for day, buckets in _time_state['days'].items()}
+    storage.write_lines(TIME_SUMMARY, [json.dumps({
+        "offset": _time_state['offset'], "running": _time_state['running'], "names": _time_state['names'],
+        "totals": _time_state['totals'], "days": days})])
+    _time_state['pending'] = 0
+
+def start_timer(task):
+    """Start timing a task, stopping the timer that was running. Returns the stopped task id."""
+    state = time_tracking()
+    if task['id'] in state['running']:
+        raise ValueError(f"the timer of '{task['task']}' is already running")
+    stopped = next(iter(state['running']), None)
+    if stopped is not None:
+        stop_timer(stopped)
+    _log_time(f"S\t{int(time.time())}\t{task['id']}\t{json.dumps(task.get('category', 'General'))}\t{json.dumps(task['task'])}")
+    return stopped
+
+def stop_timer(task_id):
+    """Stop a task's timer. Returns the length of the session in seconds."""
+    state = time_tracking()
+    if task_id not in state['running']:
+        raise ValueError("that task's timer is not running")
+    start = state['running'][task_id]
+    end = max(int(time.time()), start)
+    _log_time(f"E\t{end}\t{task_id}")
+    return end - start
+
+def time_spent(task_id):
+    """Seconds tracked on a task, including its running timer"""
+    state = time_tracking()
+    running = int(time.time()) - state['running'][task_id] if task_id in state['running'] else 0
+    return state['totals'].get(task_id, 0) + max(running, 0)
+
+def time_totals(start_date, end_date, by='category'):
+    """Seconds tracked per category, task id or week ("2026-W42") between two dates
+    (inclusive), added up from the day buckets. Running timers count up to now."""
+    state = time_tracking()
+    first, last = start_date.toordinal(), end_date.toordinal()
+
+    def key(day, category, task_id):
+        if by == 'category':
+            return category
+        if by == 'task':
+            return task_id
+        year, week, _ = datetime.fromordinal(day).isocalendar()
+        return f"{year}-W{week:02d}"
+    totals = Counter()
+    days = state['day_list']
+    for day in days[bisect.bisect_left(days, first):bisect.bisect_right(days, last)]:
+        for (category, task_id), seconds in state['days'][day].items():
+            totals[key(day, category, task_id)] += seconds
+    for task_id, start in state['running'].items():
+        for day, seconds in session_days(start, int(time.time())):
+            if first <= day <= last:
+                totals[key(day, state['names'][task_id][0], task_id)] += seconds
+    return totals
+
+def _stop_timer_of_finished_task(event):
+    if event['event'] in ('complete', 'delete') and event['task_id'] in time_tracking()['running']:
+        stop_timer(event['task_id'])
+
+subscribe_changes(_stop_timer_of_finished_task)
+
+def import_tasks(path, mode='skip'):
+    """Add the tasks of a tasks.txt-format file to the current list as one undoable change.
+    Duplicates of active tasks (or of earlier lines) are skipped, merged into the existing task
+    (mode='merge': status, due date and category are taken from the file, tags are combined)
+    or added anyway (mode='add'). Returns (added, merged, skipped, completed_before) counts."""
+    positions = {task['id']: position for position, task in enumerate(to_do_list) if task.get('id')}
+    changes, merged_state, imported_names, new_ids = [], {}, set(), {}
+    added = merged = skipped = completed_before = 0
+    for task in load_tasks_file(path):
+        key = normalize_task_name(task['task'])
+        active, seen_archived = find_duplicates(task['task'])
+        completed_before += seen_archived
+        if mode != 'add' and (active or key in imported_names):
+            if active and task.get('id'):
+                new_ids[task['id']] = active[0]['id']
+            if mode == 'merge' and active:
+                target = active[0]
+                current = merged_state.setdefault(target['id'], {field: target.get(field, TASK_FIELD_DEFAULTS.get(field)) for field in ('status', 'due_date', 'category', 'tags')})
+                wanted = {"status": task['status'], "due_date": task['due_date'], "category": task['category'],
+                          "tags": normalize_tags(",".join(task_tags(target) + task_tags(task)))}
+                if wanted['due_date'] == "No due date":
+                    wanted['due_date'] = current['due_date']
+                after = {field: value for field, value in wanted.items() if current[field] != value}
+                if after:
+                    changes.append({"type": "edit", "index": positions[target['id']],
+                                    "before": {field: current[field] for field in after}, "after": after})
+                    current.update(after)
+                    merged += 1
+                    continue
+            skipped += 1
+            continue
+        new_task = dict(task, id=new_task_id())
+        if task.get('id'):
+            new_ids[task['id']] = new_task['id']
+        changes.append({"type": "add", "index": len(to_do_list) + added, "task": new_task})
+        imported_names.add(key)
+        added += 1
+    # Blocked-by and parent ids in the file refer to the file's ids: point them at the imported tasks
+    for change in changes:
+        if change['type'] == 'add' and change['task'].get('blocked_by'):
+            change['task']['blocked_by'] = ",".join(new_ids[task_id] for task_id in task_blockers(change['task']) if task_id in new_ids)
+        if change['type'] == 'add' and change['task'].get('parent'):
+            change['task']['parent'] = new_ids.get(change['task']['parent'], '')
+    if changes:
+        commit_change({"type": "group", "label": f"import {added} task(s) from {os.path.basename(path)}", "changes": changes})
+        save_tasks()
+    return added, merged, skipped, completed_before
+
+# Undo/redo history. Each change records only what it touched (an index and the
+# fields before/after), so undoing costs the size of the change, not of the list.
+# Changes are also appended to history.log so they can be undone after a restart.
+HISTORY_LIMIT = 100
+
+undo_stack = []
+redo_stack = []
+_history_line_count = 0
+
+# Check that the task at 'index' still has the expected field values
+def _expect_task(index, fields):
+    if not 0 <= index < len(to_do_list):
+        raise ValueError("the task list has changed since this change was made")
+    for key, value in fields.items():
+        if to_do_list[index].get(key, TASK_FIELD_DEFAULTS.get(key)) != value:
+            raise ValueError("the task list has changed since this change was made")
+
+# Apply a change to the task list and data files. With reverse=True the change is undone.
+# Raises ValueError (leaving everything untouched) if the data no longer matches the change.
+def _apply_change(change, reverse=False):
+    kind = change['type']
+    if kind == 'group':
+        parts = list(reversed(change['changes'])) if reverse else change['changes']
+        applied = []
+        try:
+            for part in parts:
+                _apply_change(part, reverse)
+                applied.append(part)
+        except (ValueError, OSError):
+            for part in reversed(applied):
+                _apply_change(part, not reverse)
+            raise
+    elif kind in ('add', 'delete'):
+        if (kind == 'add') != reverse:
+            if not 0 <= change['index'] <= len(to_do_list):
+                raise ValueError("the task list has changed since this change was made")
+            check_task_fits(change['task'])
+            to_do_list.insert(change['index'], dict(change['task']))
+            emit_change('add', task=dict(change['task']), index=change['index'])
         else:
-            return (due_date, urgency_priority)
-    
-    return sorted(tasks, key=sort_key)
+            _expect_task(change['index'], {"task": change['task']['task']})
+            removed = to_do_list.pop(change['index'])
+            emit_change('delete', task_id=removed.get('id'))
+    elif kind == 'edit':
+        _expect_task(change['index'], change['after'] if reverse else change['before'])
+        fields = change['before'] if reverse else change['after']
+        check_task_fits(dict(to_do_list[change['index']], **fields))
+        to_do_list[change['index']].update(fields)
+        emit_change('edit', task_id=to_do_list[change['index']].get('id'), fields=dict(fields))
+    elif kind == 'archive':
+        if reverse:
+            truncate_archive(change['archive_start'], change['archive_end'])
+            for index, task in change['removed']:
+                to_do_list.insert(index, dict(task))
+                emit_change('add', task=dict(task), index=index)
+            return
+        if 'removed' not in change:
+            # First time: archive every task currently marked as Done
+            completion_date = datetime.now().strftime("%d-%m-%Y")
+            change['removed'] = [[index, dict(task)] for index, task in enumerate(to_do_list)
+                                 if task['status'].lower() == 'done']
+            change['completion_date'] = completion_date
+        else:
+            for index, task in change['removed']:
+                _expect_task(index, {"task": task['task']})
+        # Written to the archive first: if that fails, the list and the feed are left as they were
+        if change['removed']:
+            change['archive_start'], change['archive_end'] = append_to_archive(
+                [dict(task, completion_date=change['completion_date']) for _, task in change['removed']])
+        for index, _ in reversed(change['removed']):
+            to_do_list.pop(index)
+        for _, task in change['removed']:
+            emit_change('complete', task_id=task.get('id'), completion_date=change['completion_date'], task=dict(task))
+    elif kind == 'archive_occurrence':
+        # One occurrence of a recurring task; the task itself stays in the list
+        if reverse:
+            truncate_archive(change['archive_start'], change['archive_end'])
+            emit_change('uncomplete_occurrence', task_id=change['task'].get('id'), due_date=change['task']['due_date'])
+            return
+        if 'completion_date' not in change:
+            change['completion_date'] = datetime.now().strftime("%d-%m-%Y")
+        change['archive_start'], change['archive_end'] = append_to_archive(
+            [dict(change['task'], completion_date=change['completion_date'])])
+        emit_change('complete_occurrence', task_id=change['task'].get('id'), due_date=change['task']['due_date'],
+                    completion_date=change['completion_date'])
+    elif kind in ('delete_category', 'edit_category'):
+        categories = load_categories()
+        if kind == 'delete_category':
+            if reverse:
+                names = list(categories.items())
+                names.insert(change['position'], (change['name'], change['color']))
+                categories = dict(names)
+                emit_change('category', action='add', name=change['name'], color=change['color'])
+            else:
+                if change['name'] not in categories:
+                    raise ValueError(f"category '{change['name']}' no longer exists")
+                del categories[change['name']]
+                emit_change('category', action='delete', name=change['name'])
+        else:
+            old_name, new_name = (change['new_name'], change['old_name']) if reverse else (change['old_name'], change['new_name'])
+            if old_name not in categories:
+                raise ValueError(f"category '{old_name}' no longer exists")
+            # Rename in place so the category keeps its position
+            color = change['old_color'] if reverse else change['new_color']
+            categories = {(new_name if name == old_name else name): (color if name == old_name else value)
+                          for name, value in categories.items()}
+            emit_change('category', action='edit', name=old_name, new_name=new_name, color=color)
+        save_categories(categories)
 
-# Load categories from categories.txt
-def load_categories():
-    if os.path.exists('CLI_VERSION/categories.txt'):
-        with open('CLI_VERSION/categories.txt', 'r') as file:
-            categories = {}
-            for line in file:
-                line = line.strip()
-                if line and ' | ' in line:
-                    name, color = line.split(' | ')
-                    # Convert string escape sequences to actual ANSI codes
-                    color = color.encode().decode('unicode_escape')
-                    categories[name] = color
-            return categories
-    return {}
-
-# Save categories to categories.txt
-def save_categories(categories):
-    with open('CLI_VERSION/categories.txt', 'w') as file:
-        for name, color in categories.items():
-            file.write(f"{name} | {color}\n")
+# Short description of a change for undo/redo messages
+def describe_change(change):
+    kind = change['type']
+    if kind == 'group':
+        return change.get('label') or describe_change(change['changes'][-1])
+    if kind in ('add', 'delete'):
+        return f"{kind} task '{change['task']['task']}'"
+    if kind == 'edit':
+        return f"edit task {change['index'] + 1}"
+    if kind == 'archive_occurrence':
+        return f"archive one occurrence of '{change['task']['task']}'"
+    if kind == 'archive':
+        return f"archive {len(change.get('removed', []))} completed task(s)"
+    if kind == 'delete_category':
+        return f"delete category '{change['name']}'"
+    return f"edit category '{change['old_name']}'"
 
-# Load tasks from tasks.txt
-def load_tasks():
-    if os.path.exists('CLI_VERSION/tasks.txt'):
-        with open('CLI_VERSION/tasks.txt', 'r') as file:
-            tasks = []
-            for line in file:
-                line = line.strip()
-                if line:
-                    # Parse format: "task_name | status | due_date | category"
-                    parts = line.split(' | ')
-                    if len(parts) >= 2:
-                        task_name = parts[0]
-                        status = parts[1]
-                        due_date = parts[2] if len(parts) > 2 else "No due date"
-                        category = parts[3] if len(parts) > 3 else "General"
-                        tasks.append({"task": task_name, "status": status, "due_date": due_date, "category": category})
-            return tasks
-    return []
-
-# Load archived (completed) tasks from completed_tasks.txt
-def load_archived_tasks():
-    if os.path.exists('CLI_VERSION/completed_tasks.txt'):
-        with open('CLI_VERSION/completed_tasks.txt', 'r') as file:
-            tasks = []
-            for line in file:
-                line = line.strip()
-                if line:
-                    # Parse format: "task_name | status | due_date | completion_date | category"
-                    parts = line.split(' | ')
-                    if len(parts) >= 3:
-                        task_name = parts[0]
-                        status = parts[1]
-                        due_date = parts[2] if len(parts) > 2 else "No due date"
-                        completion_date = parts[3] if len(parts) > 3 else "Unknown"
-                        category = parts[4] if len(parts) > 4 else "General"
-                        tasks.append({"task": task_name, "status": status, "due_date": due_date, "completion_date": completion_date, "category": category})
-            return tasks
-    return []
-
-# Save active tasks to tasks.txt (excluding completed ones)
-def save_tasks():
-    active_tasks = [task for task in to_do_list if task['status'].lower() != 'done']
-    with open('CLI_VERSION/tasks.txt', 'w') as file:
-        for task in active_tasks:
-            category = task.get('category', 'General')
-            file.write(f"{task['task']} | {task['status']} | {task['due_date']} | {category}\n")
+def _write_history(entry):
+    global _history_line_count
+    queue_log_lines(history_name(), [json.dumps(entry)])
+    _history_line_count += 1
 
-# Archive completed tasks to completed_tasks.txt
-def archive_completed_tasks():
-    global to_do_list
-    completed_tasks = [task for task in to_do_list if task['status'].lower() == 'done']
-    if completed_tasks:
-        with open('CLI_VERSION/completed_tasks.txt', 'a') as file:
-            for task in completed_tasks:
-                completion_date = datetime.now().strftime("%d-%m-%Y")
-                category = task.get('category', 'General')
-                file.write(f"{task['task']} | {task['status']} | {task['due_date']} | {completion_date} | {category}\n")
-        
-        # Remove completed tasks from active list
-        to_do_list = [task for task in to_do_list if task['status'].lower() != 'done']
+# Rewrite history.log so it only holds the changes still on the undo/redo stacks
+def _compact_history():
+    global _history_line_count
+    flush_saves()
+    entries = [{"action": "do", "change": change} for change in undo_stack + list(reversed(redo_stack))]
+    entries += [{"action": "undo"}] * len(redo_stack)
+    storage.write_lines(history_name(), [json.dumps(entry) for entry in entries])
+    _history_line_count = len(entries)
+
+# Rebuild the undo/redo stacks from history.log (the data files already reflect it)
+def load_history():
+    global _history_line_count
+    undo_stack.clear()
+    redo_stack.clear()
+    _history_line_count = 0
+    for line in storage.read_lines(history_name()):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        _history_line_count += 1
+        if entry['action'] == 'do':
+            undo_stack.append(entry['change'])
+            redo_stack.clear()
+        elif entry['action'] == 'undo' and undo_stack:
+            redo_stack.append(undo_stack.pop())
+        elif entry['action'] == 'redo' and redo_stack:
+            redo_stack.pop()
+            undo_stack.append(entry['change'])
+    del undo_stack[:-HISTORY_LIMIT]
+
+# Forget the undo/redo history of every list
+def clear_undo_history():
+    global _history_line_count
+    # History lines still queued are dropped; the ones handed to the saver are written first
+    names = {history_name(list_name) for list_name in storage.list_names()}
+    _log_queue[:] = [line for line in _log_queue if line[1] not in names]
+    _saver.flush()
+    for list_name in storage.list_names():
+        if storage.read_lines(history_name(list_name)):
+            storage.write_lines(history_name(list_name), [])
+    undo_stack.clear()
+    redo_stack.clear()
+    _history_line_count = 0
+    for list_name, (tasks, _, _, _) in list(_loaded_lists.items()):
+        _loaded_lists[list_name] = (tasks, [], [], 0)
+
+# Apply a new change and record it for undo
+def commit_change(change):
+    _apply_change(change)
+    undo_stack.append(change)
+    del undo_stack[:-HISTORY_LIMIT]
+    redo_stack.clear()
+    _write_history({"action": "do", "change": change})
+
+# function to undo the last change
+def undo_last_change():
+    if not undo_stack:
+        print("Nothing to undo.")
+        print(" ")
+        return
+    change = undo_stack[-1]
+    try:
+        _apply_change(change, reverse=True)
+    except ValueError as error:
+        print(f"Cannot undo: {error}")
+        print(" ")
+        return
+    redo_stack.append(undo_stack.pop())
+    _write_history({"action": "undo"})
+    save_tasks()
+    print(f"Undone: {describe_change(change)}")
+    print(" ")
+
+# function to redo the last undone change
+def redo_last_change():
+    if not redo_stack:
+        print("Nothing to redo.")
+        print(" ")
+        return
+    change = redo_stack[-1]
+    try:
+        _apply_change(change)
+    except ValueError as error:
+        print(f"Cannot redo: {error}")
+        print(" ")
+        return
+    undo_stack.append(redo_stack.pop())
+    # Log the change again: redoing an archive writes it at a new offset
+    _write_history({"action": "redo", "change": change})
+    save_tasks()
+    print(f"Redone: {describe_change(change)}")
+    print(" ")
 
-# Initialize to_do_list from file
+# Initialize to_do_list from file. Importing the module never writes: tasks saved before ids
+# existed get theirs when the program runs (see __main__)
 to_do_list = load_tasks()
+publish_snapshot([dict(task) for task in to_do_list])
+load_history()
 
-print("======= To-DO List =======")
+# Lists loaded during this session, so switching back to one does not re-read its shard
+_loaded_lists = {}
 
-# Function to view to-do list with categories
-def view_to_do_list():
-    print("")
-    print("Current to-do list: ")
-    if len(to_do_list) == 0:
-        print("")
-        print("You have no pending tasks :)")
+# Switch the selected list, loading only that list's shard
+def select_list(list_name):
+    global to_do_list, current_list, undo_stack, redo_stack, _history_line_count
+    if list_name == current_list:
+        return
+    archive_completed_tasks()
+    save_tasks()
+    _loaded_lists[current_list] = (to_do_list, undo_stack, redo_stack, _history_line_count)
+    current_list = list_name
+    if list_name in _loaded_lists:
+        to_do_list, undo_stack, redo_stack, _history_line_count = _loaded_lists.pop(list_name)
+    else:
+        to_do_list, undo_stack, redo_stack = load_tasks(), [], []
+        if ensure_task_ids(to_do_list):
+            save_tasks()
+        else:
+            publish_snapshot([dict(task) for task in to_do_list])
+        load_history()
+
+# Switch to another storage backend (e.g. MemoryStorage() or TextFileStorage('other/dir'))
+# and reload everything from it
+def set_storage(backend):
+    global storage, to_do_list, current_list, undo_stack, redo_stack
+    flush_saves()
+    storage = backend
+    current_list = DEFAULT_LIST
+    _loaded_lists.clear()
+    _view_state['views'] = None
+    _feed_state['sequence'] = None
+    _recent_changes.clear()
+    _snapshot_state['current'].clear()
+    _snapshot_state['unloaded'].clear()
+    _time_state['storage'] = None
+    to_do_list, undo_stack, redo_stack = load_tasks(), [], []
+    if ensure_task_ids(to_do_list):
+        save_tasks()
+    else:
+        publish_snapshot([dict(task) for task in to_do_list])
+    load_history()
+
+# Reducer: active, urgent and overdue counts of one list
+def summarize_task_list(tasks):
+    return {
+        "active": len(tasks),
+        "urgent": len([task for task in tasks if task['status'].lower() == "urgent"]),
+        "overdue": len([task for task in tasks if is_overdue(task['due_date'])]),
+    }
+
+# Reducer: the tasks of one list whose name contains a search term
+def search_task_list(search_term, tasks):
+    return [task for task in tasks if search_term in task['task'].lower()]
+
+# function to switch between (or create) named task lists
+def switch_task_list():
+    print("\n=== Task Lists ===")
+    names = storage.list_names()
+    for i, name in enumerate(names, 1):
+        marker = " (current)" if name == current_list else ""
+        print(f"{i}. {name}{marker}")
+    print(f"{len(names) + 1}. Create new list")
+    print("0. Back to main menu")
+    try:
+        choice = int(input("Enter your choice: "))
+        if choice == 0:
+            return
+        if 1 <= choice <= len(names):
+            select_list(names[choice - 1])
+        elif choice == len(names) + 1:
+            name = input("Enter new list name (letters, numbers, - and _): ").strip()
+            if not name or not all(char.isalnum() or char in "-_" for char in name):
+                print("Invalid list name.")
+                return
+            if name in names:
+                print(f"List '{name}' already exists.")
+                return
+            storage.create_list(name)
+            select_list(name)
+        else:
+            print("Invalid choice.")
+            return
+        print(f"Now using list '{current_list}' ({len(to_do_list)} tasks).")
         print(" ")
+    except ValueError:
+        print("Please enter a valid number.")
+
+# function to show statistics for every list
+def show_all_lists_statistics():
+    print("\n=== All Task Lists ===")
+    flush_saves()
+    summaries = storage.map_task_lists(summarize_task_list)
+    print(f"{'List':<20}{'Active':>8}{'Urgent':>8}{'Overdue':>9}")
+    for name, summary in summaries.items():
+        marker = "*" if name == current_list else " "
+        print(f"{marker}{name:<19}{summary['active']:>8}{summary['urgent']:>8}{Colors.MAGENTA}{summary['overdue']:>9}{Colors.RESET}")
+    print(f"{'Total':<20}{sum(s['active'] for s in summaries.values()):>8}"
+          f"{sum(s['urgent'] for s in summaries.values()):>8}{sum(s['overdue'] for s in summaries.values()):>9}")
+    print(" ")
+
+# Text of the to-do list view, grouped by category, with subtasks indented under their parent
+def render_to_do_list():
+    lines = []
+    lines.append("")
+    lines.append("Current to-do list: ")
+    if len(to_do_list) == 0:
+        lines.append("")
+        lines.append("You have no pending tasks :)")
+        lines.append(" ")
     else:
         categories = load_categories()
-        sorted_tasks = sort_tasks(to_do_list)
+        sorted_tasks = sort_tasks(subtask_tree().roots())
         
         # Group tasks by category
         tasks_by_category = {}
@@ -200,26 +3700,28 @@ def view_to_do_list():
         for category_name, tasks in tasks_by_category.items():
             # Display category header with color
             category_color = categories.get(category_name, Colors.RESET)
-            print(f"\n{category_color}{Colors.BOLD}=== {category_name} ==={Colors.RESET}")
+            lines.append(f"\n{category_color}{Colors.BOLD}=== {category_name} ==={Colors.RESET}")
             
-            for task in tasks:
+            for task, depth in nested_tasks(tasks):
                 color = get_color_for_status(task['status'], task['due_date'])
                 overdue_text = " [OVERDUE]" if is_overdue(task['due_date']) and task['status'].lower() != "done" else ""
-                print(f"{task_counter}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}){overdue_text}{Colors.RESET}")
+                lines.append(f"{'    ' * depth}{task_counter}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}){recurrence_text(task)}{tags_text(task)}{subtask_progress_text(task)}{overdue_text}{Colors.RESET}")
                 task_counter += 1
-            print("")
+            lines.append("")
+    return "\n".join(lines)
 
-# Function to view incompleted tasks with categories
-def view_incompleted_tasks():
-    print("")
-    print("Incompleted tasks: ")
+# Text of the incompleted tasks view, grouped by category
+def render_incompleted_tasks():
+    lines = []
+    lines.append("")
+    lines.append("Incompleted tasks: ")
     if len(to_do_list) == 0:
-        print("You have no incompleted tasks.")
-        print(" ")
+        lines.append("You have no incompleted tasks.")
+        lines.append(" ")
     else:
         incomplete_tasks = [task for task in to_do_list if task['status'].lower() != "done"]
         if len(incomplete_tasks) == 0:
-            print("You have no incompleted tasks.")
+            lines.append("You have no incompleted tasks.")
         else:
             categories = load_categories()
             sorted_incomplete_tasks = sort_tasks(incomplete_tasks)
@@ -236,23 +3738,26 @@ def view_incompleted_tasks():
             for category_name, tasks in tasks_by_category.items():
                 # Display category header with color
                 category_color = categories.get(category_name, Colors.RESET)
-                print(f"\n{category_color}{Colors.BOLD}=== {category_name} ==={Colors.RESET}")
+                lines.append(f"\n{category_color}{Colors.BOLD}=== {category_name} ==={Colors.RESET}")
                 
                 for task in tasks:
                     color = get_color_for_status(task['status'], task['due_date'])
                     overdue_text = " [OVERDUE]" if is_overdue(task['due_date']) and task['status'].lower() != "done" else ""
-                    print(f"{task_counter}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}){overdue_text}{Colors.RESET}")
+                    lines.append(f"{task_counter}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}){recurrence_text(task)}{tags_text(task)}{overdue_text}{Colors.RESET}")
                     task_counter += 1
-    print(" ")
+    lines.append(" ")
+    return "\n".join(lines)
 
-# Function to view completed tasks (from archive) with categories
-def view_completed_tasks():
-    print("")
-    print("Completed tasks (archived): ")
+# Text of the completed tasks view (from the archive), grouped by category
+def render_completed_tasks():
+    lines = []
+    lines.append("")
+    lines.append("Completed tasks (archived): ")
     archived_tasks = load_archived_tasks()
-    if len(archived_tasks) == 0:
-        print("You have no completed tasks.")
-        print(" ")
+    rollups = load_archive_rollups()
+    if len(archived_tasks) == 0 and not rollups:
+        lines.append("You have no completed tasks.")
+        lines.append(" ")
     else:
         categories = load_categories()
         
@@ -268,24 +3773,65 @@ def view_completed_tasks():
         for category_name, tasks in tasks_by_category.items():
             # Display category header with color
             category_color = categories.get(category_name, Colors.RESET)
-            print(f"\n{category_color}{Colors.BOLD}=== {category_name} ==={Colors.RESET}")
+            lines.append(f"\n{category_color}{Colors.BOLD}=== {category_name} ==={Colors.RESET}")
             
             for task in tasks:
                 color = get_color_for_status(task['status'])
                 completion_date = task.get('completion_date', 'Unknown')
-                print(f"{task_counter}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}) [Completed: {completion_date}]{Colors.RESET}")
+                lines.append(f"{task_counter}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}) [Completed: {completion_date}]{Colors.RESET}")
                 task_counter += 1
-    print(" ")
+        
+        # Older tasks only exist as monthly totals
+        if rollups:
+            lines.append(f"\n{Colors.BOLD}=== Older completions (monthly totals) ==={Colors.RESET}")
+            for (month, category_name), values in sorted(rollups.items()):
+                category_color = categories.get(category_name, Colors.RESET)
+                lines.append(f"{month}  {category_color}{category_name}{Colors.RESET}: {values[0]} tasks")
+    lines.append(" ")
+    return "\n".join(lines)
+
+# Views the cache warmer can render ahead of time, by menu number
+PRERENDERED_VIEWS = {1: render_to_do_list, 2: render_incompleted_tasks, 3: render_completed_tasks}
+
+# Function to view to-do list with categories
+def view_to_do_list():
+    print(cached_view(1))
+
+# Function to view incompleted tasks with categories
+def view_incompleted_tasks():
+    print(cached_view(2))
+
+# Function to view completed tasks (from archive) with categories
+def view_completed_tasks():
+    print(cached_view(3))
 
 # Function to add task with category selection
-def add_task():
+def add_task(parent=None):
     print("")
+    if parent is not None:
+        print(f"Adding a subtask of '{parent['task']}'")
     task = input("Enter the task you want to add: ")
+    if not confirm_not_duplicate(task):
+        print("Task not added.")
+        print(" ")
+        return
     status_of_task = input("Enter the status of the task (urgent, non-urgent, semi-urgent): ")
     due_date = input("Enter the due date (DD-MM-YYYY) or press Enter for no due date: ")
     if not due_date.strip():
         due_date = "No due date"
     
+    new_task = {"id": new_task_id(), "task": task, "status": status_of_task, "due_date": due_date}
+    repeat = input("Repeat this task? (daily, weekly, monthly) or press Enter for no repeat: ").strip().lower()
+    if repeat in RECURRENCE_CHOICES:
+        # Recurring tasks need a first occurrence, use today if no due date was given
+        first_date = parse_date(due_date)
+        if first_date is None:
+            first_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            new_task['due_date'] = first_date.strftime("%d-%m-%Y")
+        new_task['recurrence'] = make_recurrence_rule(repeat, first_date)
+    elif repeat:
+        print("Unknown repeat option. The task will not repeat.")
+    
     # Category selection
     categories = load_categories()
     print("\nAvailable categories:")
@@ -312,7 +3858,18 @@ def add_task():
         print("Invalid input. Using 'General' category.")
         category = "General"
     
-    to_do_list.append({"task": task, "status": status_of_task, "due_date": due_date, "category": category})
+    new_task['category'] = category
+    tags = normalize_tags(input("Enter tags separated by commas (e.g. work, school) or press Enter for none: "))
+    if tags:
+        new_task['tags'] = tags
+    if parent is not None:
+        new_task['parent'] = parent['id']
+    try:
+        commit_change({"type": "add", "index": len(to_do_list), "task": new_task})
+    except ValueError as error:
+        print(f"Task not added: {error}")
+        print(" ")
+        return
     save_tasks()
     print("")
     print("Task added successfully\n")
@@ -322,7 +3879,7 @@ def add_task():
     
     next_task = input("Do you want to add another task? (yes/no): ")
     if next_task.lower() == "yes":
-        add_task()
+        add_task(parent)
 
 # Function to create a new category
 def create_new_category():
@@ -347,6 +3904,7 @@ def create_new_category():
     categories = load_categories()
     categories[category_name] = selected_color
     save_categories(categories)
+    emit_change('category', action='add', name=category_name, color=selected_color)
     
     print(f"Category '{category_name}' created successfully!")
     return category_name
@@ -418,16 +3976,13 @@ def edit_category(categories):
             else:
                 new_color = categories[old_name]
             
-            # Update category
-            del categories[old_name]
-            categories[new_name] = new_color
-            
-            # Update tasks with old category name
-            for task in to_do_list:
-                if task.get('category') == old_name:
-                    task['category'] = new_name
-            
-            save_categories(categories)
+            # Update category and the tasks that use it
+            changes = [{"type": "edit", "index": index, "before": {"category": old_name}, "after": {"category": new_name}}
+                       for index, task in enumerate(to_do_list)
+                       if task.get('category') == old_name and new_name != old_name]
+            changes.append({"type": "edit_category", "old_name": old_name, "new_name": new_name,
+                            "old_color": categories[old_name], "new_color": new_color})
+            commit_change({"type": "group", "label": f"edit category '{old_name}'", "changes": changes})
             save_tasks()
             print(f"Category updated successfully!")
         else:
@@ -452,21 +4007,21 @@ def delete_category(categories):
             category_to_delete = category_list[choice]
             
             # Check if any tasks use this category
-            tasks_with_category = [task for task in to_do_list if task.get('category') == category_to_delete]
+            tasks_with_category = [index for index, task in enumerate(to_do_list) if task.get('category') == category_to_delete]
             
             if tasks_with_category:
                 print(f"Warning: {len(tasks_with_category)} tasks use this category.")
                 move_choice = input("Move these tasks to 'General' category? (yes/no): ")
-                if move_choice.lower() == 'yes':
-                    for task in tasks_with_category:
-                        task['category'] = 'General'
-                    save_tasks()
-                else:
+                if move_choice.lower() != 'yes':
                     print("Category deletion cancelled.")
                     return
             
-            del categories[category_to_delete]
-            save_categories(categories)
+            changes = [{"type": "edit", "index": index, "before": {"category": category_to_delete}, "after": {"category": "General"}}
+                       for index in tasks_with_category]
+            changes.append({"type": "delete_category", "name": category_to_delete,
+                            "color": categories[category_to_delete], "position": choice})
+            commit_change({"type": "group", "label": f"delete category '{category_to_delete}'", "changes": changes})
+            save_tasks()
             print(f"Category '{category_to_delete}' deleted successfully!")
         else:
             print("Invalid category number.")
@@ -485,28 +4040,150 @@ def filter_by_category():
         for i, (name, color) in enumerate(categories.items(), 2):
             print(f"{i}. {color}{name}{Colors.RESET}")
             category_list.append(name)
+    print(f"{len(category_list) + 1}. Combine tags, status and due date (e.g. work AND urgent AND NOT school)")
     
     try:
         choice = int(input("Enter category number: ")) - 1
         if 0 <= choice < len(category_list):
             selected_category = category_list[choice]
-            filtered_tasks = [task for task in to_do_list if task.get('category') == selected_category]
+            index = get_task_index()
+            filtered_tasks = [index.tasks[position] for position in bitmap_positions(index.term('category', selected_category))]
             
             if not filtered_tasks:
                 print(f"No tasks found in category '{selected_category}'.")
                 return
             
             print(f"\nTasks in category '{selected_category}':")
-            sorted_filtered = sort_tasks(filtered_tasks)
-            for index, task in enumerate(sorted_filtered, 1):
-                color = get_color_for_status(task['status'], task['due_date'])
-                overdue_text = " [OVERDUE]" if is_overdue(task['due_date']) and task['status'].lower() != "done" else ""
-                print(f"{index}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}){overdue_text}{Colors.RESET}")
-            print(" ")
+            print_filtered_tasks(filtered_tasks)
+        elif choice == len(category_list):
+            filter_by_expression()
+        else:
+            print("Invalid category number.")
+    except ValueError:
+        print("Please enter a valid number.")
+
+# Print filtered tasks sorted by due date and urgency
+def print_filtered_tasks(tasks):
+    print_task_rows(sort_tasks(tasks))
+
+# Print tasks numbered, in the given order
+def print_task_rows(tasks):
+    for index, task in enumerate(tasks, 1):
+        color = get_color_for_status(task['status'], task['due_date'])
+        overdue_text = " [OVERDUE]" if is_overdue(task['due_date']) and task['status'].lower() != "done" else ""
+        print(f"{index}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}){recurrence_text(task)}{tags_text(task)}{overdue_text}{Colors.RESET}")
+    print(" ")
+
+# Filter with AND/OR/NOT over tags, statuses, categories and due dates
+def filter_by_expression():
+    print("\nTerms: a tag, status, category or due bucket (overdue, today, week, later, nodate).")
+    print("Use tag:, status:, category: or due: to pick one, e.g. 'tag:work AND NOT status:done OR due:overdue'.")
+    expression = input("Enter filter: ")
+    try:
+        filtered_tasks = get_task_index().select(expression)
+    except ValueError as error:
+        print(f"Invalid filter: {error}")
+        print(" ")
+        return
+    if not filtered_tasks:
+        print("No tasks match this filter.")
+        print(" ")
+        return
+    print(f"\nTasks matching '{expression}':")
+    print_filtered_tasks(filtered_tasks)
+
+# List, open, save and delete saved views
+def saved_views_menu():
+    while True:
+        views = saved_views()
+        print(f"\n{Colors.BOLD}=== Saved Views ==={Colors.RESET}")
+        names = list(views)
+        for number, name in enumerate(names, 1):
+            print(f"{number}. {name} ({len(open_saved_view(name))} tasks) - {views[name].text}")
+        if not names:
+            print("No saved views yet.")
+        print(f"{len(names) + 1}. Save a new view")
+        if names:
+            print(f"{len(names) + 2}. Delete a view")
+        print("0. Back to main menu")
+        try:
+            choice = int(input("Enter your choice: "))
+        except ValueError:
+            print("Please enter a valid number.")
+            continue
+        if choice == 0:
+            break
+        elif 1 <= choice <= len(names):
+            tasks = open_saved_view(names[choice - 1])
+            if not tasks:
+                print("No tasks in this view.")
+            else:
+                print(f"\nView '{names[choice - 1]}':")
+                print_task_rows(tasks)
+        elif choice == len(names) + 1:
+            name = input("Enter a name for the view: ")
+            text = input("Enter the query (e.g. category:Work status:urgent due:week): ")
+            try:
+                save_view(name, text)
+                print(f"View '{name.strip()}' saved.")
+            except ValueError as error:
+                print(f"Could not save view: {error}")
+        elif names and choice == len(names) + 2:
+            try:
+                number = int(input("Enter the number of the view to delete: "))
+            except ValueError:
+                print("Please enter a valid number.")
+                continue
+            if 1 <= number <= len(names):
+                delete_view(names[number - 1])
+                print(f"View '{names[number - 1]}' deleted.")
+            else:
+                print("Invalid view number.")
         else:
-            print("Invalid category number.")
+            print("Invalid choice. Please try again.")
+
+# Show the next few tasks by due date and urgency
+def view_next_tasks():
+    count = input("How many tasks? (press Enter for 5): ").strip()
+    category = input("Only this category (press Enter for all): ").strip()
+    status = input("Only this status (press Enter for all): ").strip()
+    try:
+        count = int(count) if count else 5
     except ValueError:
         print("Please enter a valid number.")
+        print(" ")
+        return
+    tasks = next_tasks(to_do_list, count, category or None, status or None)
+    if not tasks:
+        print("Nothing to do next :)")
+        print(" ")
+        return
+    print(f"\nNext {len(tasks)} task(s):")
+    print_task_rows(tasks)
+
+# Run a query such as "category:Work status:urgent due<01-11-2025 text:report sort:due limit:50"
+def query_tasks():
+    print("\nClauses: category:NAME status:STATUS tag:TAG due:BUCKET due<DATE due>=DATE text:WORD or just words")
+    print("Options: sort:due|status|name|category limit:N. Put '-' before a clause to exclude it,")
+    print("and start with 'explain' to see how the query is run.")
+    text = input("Enter query: ")
+    try:
+        query = parse_query(text)
+        tasks, plan = run_query(query, get_task_index())
+    except ValueError as error:
+        print(f"Invalid query: {error}")
+        print(" ")
+        return
+    if query['explain']:
+        print(f"\n{Colors.BOLD}Plan:{Colors.RESET}")
+        for line in plan:
+            print(f"  {line}")
+    if not tasks:
+        print("No tasks match this query.")
+        print(" ")
+        return
+    print(f"\nTasks matching '{text}':")
+    print_task_rows(tasks)
 
 # function to edit task
 def edit_task():
@@ -529,6 +4206,12 @@ def edit_task():
         search_index = int(input("Enter the number of the task you want to edit: ")) - 1
         if 0 <= search_index < len(to_do_list):
             new_task_name = input("Enter the new task name: ")
+            current_task = to_do_list[search_index]
+            if normalize_task_name(new_task_name) != normalize_task_name(current_task['task']) \
+                    and not confirm_not_duplicate(new_task_name, exclude_id=current_task.get('id')):
+                print("Task not changed.")
+                print(" ")
+                return
             new_status = input("Enter the new status of the task (urgent, non-urgent, semi-urgent, Done): ")
             new_due_date = input("Enter the new due date (DD-MM-YYYY) or press Enter to keep current: ")
             if not new_due_date.strip():
@@ -560,11 +4243,24 @@ def edit_task():
                 print("Invalid input. Keeping current category.")
                 new_category = to_do_list[search_index].get('category', 'General')
             
-            to_do_list[search_index]['task'] = new_task_name
-            to_do_list[search_index]['status'] = new_status
-            to_do_list[search_index]['due_date'] = new_due_date
-            to_do_list[search_index]['category'] = new_category
-            save_tasks() 
+            new_values = {"task": new_task_name, "status": new_status, "due_date": new_due_date, "category": new_category}
+            current = to_do_list[search_index]
+            current_tags = current.get('tags', '')
+            new_tags = input(f"Enter new tags separated by commas, '-' to remove all, or press Enter to keep current ({current_tags or 'none'}): ")
+            if new_tags.strip() == '-':
+                new_values['tags'] = ''
+            elif new_tags.strip():
+                new_values['tags'] = normalize_tags(new_tags)
+            after = {key: value for key, value in new_values.items() if current.get(key, TASK_FIELD_DEFAULTS.get(key)) != value}
+            if after:
+                before = {key: current.get(key, TASK_FIELD_DEFAULTS.get(key)) for key in after}
+                try:
+                    commit_change({"type": "edit", "index": search_index, "before": before, "after": after})
+                except ValueError as error:
+                    print(f"Task not changed: {error}")
+                    print(" ")
+                    return
+            save_tasks()
             print("Task updated successfully.")
             print(" ")
         else:
@@ -593,7 +4289,8 @@ def delete_task():
     try:
         search_index = int(input("enter the number of the task you want to delete: ")) - 1
         if 0 <= search_index < len(to_do_list):
-            deleted_task = to_do_list.pop(search_index)
+            deleted_task = to_do_list[search_index]
+            commit_change({"type": "delete", "index": search_index, "task": dict(deleted_task)})
             print(f"Task Removed: {deleted_task['task']}")
             save_tasks()
             print(" ")
@@ -610,9 +4307,9 @@ def delete_task():
 
 # function to show task statistics
 def show_statistics():
-    archived_tasks = load_archived_tasks()
+    archived_summary = summarize_archived_tasks()
     active_tasks = len(to_do_list)
-    completed_count = len(archived_tasks)
+    completed_count = sum(archived_summary.values())
     total_all_time = active_tasks + completed_count
     
     if total_all_time == 0:
@@ -645,29 +4342,401 @@ def show_statistics():
         for category, count in category_stats.items():
             color = categories.get(category, Colors.RESET)
             print(f"{color}{category}: {count} tasks{Colors.RESET}")
+    
+    today = datetime.now()
+    try:
+        tracked = time_totals(today - timedelta(days=6), today)
+    except ValueError as error:
+        print(f"\nTime tracked: unavailable ({error})")
+        tracked = None
+    if tracked:
+        print("\n=== Time Tracked (last 7 days) ===")
+        for category, seconds in tracked.most_common():
+            color = categories.get(category, Colors.RESET)
+            print(f"{color}{category}: {format_duration(seconds)}{Colors.RESET}")
+        print(f"Total: {format_duration(sum(tracked.values()))}")
+    print(" ")
+
+def format_duration(seconds):
+    hours, minutes = seconds // 3600, seconds % 3600 // 60
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m" if minutes else f"{seconds}s"
+
+# Time tracked per category, task and week over a date range
+def time_report():
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_text = input("From date (DD-MM-YYYY) or press Enter for 7 days ago: ").strip()
+    end_text = input("To date (DD-MM-YYYY) or press Enter for today: ").strip()
+    start = parse_date(start_text) if start_text else today - timedelta(days=6)
+    end = parse_date(end_text) if end_text else today
+    if start is None or end is None:
+        print("Invalid date. Please use DD-MM-YYYY.")
+        print(" ")
+        return
+    names = time_tracking()['names']
+    by_category = time_totals(start, end)
+    if not by_category:
+        print(f"No time tracked from {start.strftime('%d-%m-%Y')} to {end.strftime('%d-%m-%Y')}.")
+        print(" ")
+        return
+    categories = load_categories()
+    print(f"\n=== Time Tracked {start.strftime('%d-%m-%Y')} to {end.strftime('%d-%m-%Y')} ===")
+    print(f"Total: {format_duration(sum(by_category.values()))}")
+    print("\nBy category:")
+    for category, seconds in by_category.most_common():
+        print(f"  {categories.get(category, Colors.RESET)}{category}: {format_duration(seconds)}{Colors.RESET}")
+    print("\nBy task:")
+    for task_id, seconds in time_totals(start, end, by='task').most_common():
+        print(f"  {names[task_id][1]}: {format_duration(seconds)}")
+    print("\nBy week:")
+    for week, seconds in sorted(time_totals(start, end, by='week').items()):
+        print(f"  {week}: {format_duration(seconds)}")
+    print(" ")
+
+# Reducer: pull the due date, completion date and category columns out of archived tasks
+def archive_columns(tasks):
+    due_dates, completion_dates, categories = [], [], []
+    for task in tasks:
+        due_dates.append(task['due_date'])
+        completion_dates.append(task['completion_date'])
+        categories.append(task['category'])
+    return due_dates, completion_dates, categories
+
+def dates_to_days(date_strings):
+    """Convert DD-MM-YYYY strings to days since 1970-01-01 (-1 for invalid dates), agreeing with parse_date()"""
+    strings = np.asarray(date_strings, dtype=str)
+    if strings.size == 0:
+        return np.empty(0, dtype=np.int64)
+    # Strings in the fixed DD-MM-YYYY layout are parsed with array operations
+    chars = strings.astype('U10').view(np.uint32).reshape(-1, 10).astype(np.int64)
+    digits = chars - ord('0')
+    digit_columns = [0, 1, 3, 4, 6, 7, 8, 9]
+    valid = ((np.char.str_len(strings) == 10) & (chars[:, 2] == ord('-')) & (chars[:, 5] == ord('-')) &
+             ((digits[:, digit_columns] >= 0) & (digits[:, digit_columns] <= 9)).all(axis=1))
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 3] * 10 + digits[:, 4]
+    year = digits[:, 6] * 1000 + digits[:, 7] * 100 + digits[:, 8] * 10 + digits[:, 9]
+    valid &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+    # Build dates from their parts: year, then months, then days
+    months_since_epoch = np.where(valid, (year - 1970) * 12 + month - 1, 0)
+    first_days = months_since_epoch.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    next_first_days = (months_since_epoch + 1).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    valid &= day <= next_first_days - first_days
+    days = np.where(valid, first_days + day - 1, -1)
+    # Anything else (e.g. "1-1-2025") goes through parse_date so both paths agree
+    for index in np.flatnonzero(~valid & (strings != "No due date")):
+        date = parse_date(str(strings[index]))
+        if date is not None:
+            days[index] = (date - datetime(1970, 1, 1)).days
+    return days
+
+# Cache of archive columns, keyed by the archive's version
+_archive_columns_cache = {'key': None, 'columns': None}
+
+def load_archive_columns():
+    """Return the archive as NumPy columns: due_days, completion_days, category_codes, category_names"""
+    key = storage.archive_version()
+    if key is None:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), []
+    if _archive_columns_cache['key'] != (storage, key):
+        due_dates, completion_dates, categories = [], [], []
+        for chunk_due, chunk_completion, chunk_categories in storage.map_archive(archive_columns):
+            due_dates.extend(chunk_due)
+            completion_dates.extend(chunk_completion)
+            categories.extend(chunk_categories)
+        category_names, category_codes = np.unique(np.asarray(categories, dtype=str), return_inverse=True)
+        _archive_columns_cache['columns'] = (dates_to_days(due_dates), dates_to_days(completion_dates),
+                                             category_codes.astype(np.int64), list(category_names))
+        _archive_columns_cache['key'] = (storage, key)
+    return _archive_columns_cache['columns']
+
+# function to show archive analytics (needs NumPy)
+def show_analytics(weeks_shown=8):
+    if np is None:
+        print("Analytics need NumPy. Install it with: pip install -r requirements-analytics.txt")
+        print(" ")
+        return
+
+    due_days, completion_days, category_codes, category_names = load_archive_columns()
+    today = (datetime.now() - datetime(1970, 1, 1)).days
+    categories = load_categories()
+
+    # Completions per week per category (weeks start on Monday; 1970-01-01 was a Thursday)
+    print("\n=== Completions per Week ===")
+    completed = completion_days >= 0
+    weeks = (completion_days + 3) // 7
+    current_week = (today + 3) // 7
+    recent = completed & (weeks > current_week - weeks_shown) & (weeks <= current_week)
+    if not recent.any():
+        print(f"No tasks completed in the last {weeks_shown} weeks.")
+    else:
+        category_count = len(category_names)
+        week_offsets = weeks[recent] - (current_week - weeks_shown + 1)
+        counts = np.bincount(week_offsets * category_count + category_codes[recent],
+                             minlength=weeks_shown * category_count).reshape(weeks_shown, category_count)
+        used = counts.sum(axis=0) > 0
+        header = "".join(f"{name[:10]:>12}" for name, is_used in zip(category_names, used) if is_used)
+        print(f"{'Week of':<12}{header}{'Total':>8}")
+        for offset in range(weeks_shown):
+            monday = np.datetime64(int((current_week - weeks_shown + 1 + offset) * 7 - 3), 'D').item()
+            row = "".join(f"{count:>12}" for count in counts[offset][used])
+            print(f"{monday.strftime('%d-%m-%Y'):<12}{row}{counts[offset].sum():>8}")
+
+    # Lateness distribution: completion date minus due date
+    print("\n=== Lateness (completion date - due date) ===")
+    both = completed & (due_days >= 0)
+    if not both.any():
+        print("No archived tasks with both a due date and a completion date.")
+    else:
+        lateness = completion_days[both] - due_days[both]
+        edges = [np.iinfo(np.int64).min, 0, 1, 4, 8, 31, np.iinfo(np.int64).max]
+        labels = ["Early", "On time", "1-3 days late", "4-7 days late", "8-30 days late", "30+ days late"]
+        counts = np.histogram(lateness, bins=edges)[0]
+        for label, count in zip(labels, counts):
+            percent = count / lateness.size * 100
+            print(f"{label:<16}{count:>8}  {percent:5.1f}%")
+        print(f"Average: {lateness.mean():.1f} days, median: {np.median(lateness):.0f} days, "
+              f"90th percentile: {np.percentile(lateness, 90):.0f} days")
+
+    # Overdue aging for active tasks
+    print("\n=== Overdue Aging (active tasks) ===")
+    active_due = dates_to_days([task['due_date'] for task in to_do_list])
+    not_done = np.array([task['status'].lower() != "done" for task in to_do_list], dtype=bool)
+    overdue = (active_due >= 0) & (active_due < today) & not_done if len(to_do_list) else np.zeros(0, dtype=bool)
+    if not overdue.any():
+        print("No overdue tasks.")
+    else:
+        age = today - active_due[overdue]
+        edges = [1, 8, 31, 91, np.iinfo(np.int64).max]
+        labels = ["1-7 days", "8-30 days", "31-90 days", "90+ days"]
+        for label, count in zip(labels, np.histogram(age, bins=edges)[0]):
+            print(f"{Colors.MAGENTA}{label:<16}{count:>8}{Colors.RESET}")
+        print(f"Oldest overdue task: {age.max()} days")
+
+    # Tasks folded into the rollups only count towards the totals
+    rollups = load_archive_rollups()
+    if rollups:
+        dated = sum(values[1] for values in rollups.values())
+        late = sum(values[2] for values in rollups.values())
+        lateness_days = sum(values[3] for values in rollups.values())
+        print(f"\nOlder rolled-up tasks: {sum(values[0] for values in rollups.values())}, "
+              f"{late} of {dated} with a due date completed late"
+              + (f", average lateness {lateness_days / dated:.1f} days" if dated else ""))
+
+    category_totals = dict(zip(category_names, np.bincount(category_codes, minlength=len(category_names)).tolist()))
+    for (_, name), values in rollups.items():
+        category_totals[name] = category_totals.get(name, 0) + values[0]
+    if category_totals:
+        print("\n=== Archived Tasks by Category ===")
+        for name, count in category_totals.items():
+            color = categories.get(name, Colors.RESET)
+            print(f"{color}{name}: {count} tasks{Colors.RESET}")
+    print(" ")
+
+# function to show completion activity and trends for a date range
+def view_activity():
+    print("")
+    start_input = input("Enter the start date (DD-MM-YYYY) or press Enter for the last 30 days: ")
+    end_input = input("Enter the end date (DD-MM-YYYY) or press Enter for today: ")
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    end_date = parse_date(end_input.strip()) if end_input.strip() else today
+    if start_input.strip():
+        start_date = parse_date(start_input.strip())
+    elif end_date is not None:
+        start_date = datetime.fromordinal(end_date.toordinal() - 29)
+    else:
+        start_date = None
+    if start_date is None or end_date is None or start_date > end_date:
+        print("Invalid date range.")
+        print(" ")
+        return
+
+    daily_counts = daily_completion_counts(start_date, end_date)
+    total = sum(daily_counts.values())
+    day_count = end_date.toordinal() - start_date.toordinal() + 1
+    print(f"\n=== Activity {start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')} ===")
+    print(f"Tasks completed: {total} ({total / day_count:.1f} per day)")
+    first_month, last_month = start_date.strftime('%Y-%m'), end_date.strftime('%Y-%m')
+    rolled_up = sum(values[0] for (month, _), values in load_archive_rollups().items() if first_month <= month <= last_month)
+    if rolled_up:
+        print(f"Plus {rolled_up} older completions in these months, kept only as monthly totals")
+    if total == 0:
+        print(" ")
+        return
+
+    print("\n=== Daily Throughput ===")
+    for date, count in daily_counts.items():
+        print(f"{date.strftime('%d-%m-%Y')} {Colors.BLUE}{'#' * min(count, 50)}{Colors.RESET} {count}")
+
+    print("\n=== Weekly Throughput ===")
+    weekly_counts = {}
+    for date, count in daily_counts.items():
+        monday = datetime.fromordinal(date.toordinal() - date.weekday())
+        weekly_counts[monday] = weekly_counts.get(monday, 0) + count
+    for monday, count in weekly_counts.items():
+        print(f"Week of {monday.strftime('%d-%m-%Y')}: {count} tasks")
+
+    show_tasks = input("\nShow the completed tasks in this range? (yes/no): ")
+    if show_tasks.lower() == "yes":
+        categories = load_categories()
+        for index, task in enumerate(load_completed_between(start_date, end_date), 1):
+            color = categories.get(task['category'], Colors.RESET)
+            print(f"{index}. {task['task']} - {color}{task['category']}{Colors.RESET} [Completed: {task['completion_date']}]")
+    print(" ")
+
+# function to fold old archived tasks into monthly rollups
+def archive_retention():
+    days = input(f"Keep completed tasks in detail for how many days? (press Enter for {ARCHIVE_RETENTION_DAYS}): ").strip()
+    try:
+        days = int(days) if days else ARCHIVE_RETENTION_DAYS
+    except ValueError:
+        print("Please enter a valid number.")
+        print(" ")
+        return
+    print("Older tasks will only be kept as monthly totals per category, and undo history will be cleared.")
+    if input("Continue? (yes/no): ").lower() != "yes":
+        print(" ")
+        return
+    folded = compact_archive(days)
+    if folded:
+        print(f"Rolled up {folded} archived task(s) completed more than {days} days ago.")
+    else:
+        print(f"No archived tasks were completed more than {days} days ago.")
+    print(" ")
+
+# function to choose a statistics mode
+def statistics_menu():
+    print("\n=== Statistics ===")
+    print("1. Summary")
+    print("2. Analytics (weekly completions, lateness, overdue aging)")
+    print("3. Activity and trends for a date range")
+    print("4. All task lists")
+    print("5. Archive retention (roll up old completed tasks)")
+    print("6. Time tracked for a date range")
+    print("0. Back to main menu")
+    try:
+        choice = int(input("Enter your choice: "))
+        if choice == 1:
+            show_statistics()
+        elif choice == 2:
+            show_analytics()
+        elif choice == 3:
+            view_activity()
+        elif choice == 4:
+            show_all_lists_statistics()
+        elif choice == 5:
+            archive_retention()
+        elif choice == 6:
+            time_report()
+        elif choice != 0:
+            print("Invalid choice.")
+    except ValueError:
+        print("Please enter a valid number.")
+
+# function to view upcoming occurrences, expanding recurring tasks only over the window shown
+def view_upcoming_schedule():
+    print("")
+    try:
+        days = input("How many days ahead do you want to see? (press Enter for 14): ").strip()
+        days = int(days) if days else 14
+    except ValueError:
+        print("Please enter a valid number.")
+        print(" ")
+        return
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(days=days)
+
+    # Each task yields its occurrences in date order, so a lazy merge gives the whole schedule in order
+    def occurrences(position, task):
+        priority = get_urgency_priority(task['status'])
+        for date in iter_occurrences(task, start, end):
+            yield date, priority, position
+
+    streams = [occurrences(position, task) for position, task in enumerate(to_do_list)
+               if task['status'].lower() != "done"]
+
+    print(f"Schedule for the next {days} days:")
+    current_day = None
+    for date, _, position in heapq.merge(*streams):
+        task = to_do_list[position]
+        if date != current_day:
+            current_day = date
+            print(f"\n{Colors.BOLD}{date.strftime('%A %d-%m-%Y')}{Colors.RESET}")
+        color = get_color_for_status(task['status'])
+        print(f"  {color}{task['task']} - {task['status']}{recurrence_text(task)}{tags_text(task)}{Colors.RESET} [Category: {task.get('category', 'General')}]")
+    if current_day is None:
+        print("Nothing scheduled.")
     print(" ")
 
 # function to search tasks
 def search_tasks():
-    if len(to_do_list) == 0:
+    all_lists = False
+    if len(storage.list_names()) > 1:
+        all_lists = input("Search all task lists? (yes/no): ").lower() == "yes"
+    if len(to_do_list) == 0 and not all_lists:
         print("Your to-do list is empty.")
         print(" ")
         return
     
-    search_term = input("Enter search term: ").lower()
-    matching_tasks = [task for task in to_do_list if search_term in task['task'].lower()]
+    search_term = input("Enter search term (start with ~ for a fuzzy search): ").lower()
+    if search_term.startswith("~"):
+        print_fuzzy_matches(search_term[1:], f"\nClosest matches for '{search_term[1:].strip()}':")
+        return
+    if all_lists:
+        # The selected list is searched in memory, the other shards are read from disk
+        flush_saves()
+        results = storage.map_task_lists(partial(search_task_list, search_term))
+        results[current_list] = [task for task in to_do_list if search_term in task['task'].lower()]
+    else:
+        results = {current_list: [task for task in to_do_list if search_term in task['task'].lower()]}
     
-    if not matching_tasks:
+    if not any(results.values()):
         print("No tasks found matching your search.")
-        print(" ")
+        if len(normalize_task_name(search_term)) >= 3:
+            print_fuzzy_matches(search_term, "Did you mean:", limit=5, quiet=True)
+        else:
+            print(" ")
         return
     
     print(f"\nTasks matching '{search_term}':")
-    sorted_matches = sort_tasks(matching_tasks)
-    for index, task in enumerate(sorted_matches, 1):
-        color = get_color_for_status(task['status'])
-        category = task.get('category', 'General')
-        print(f"{index}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}) [Category: {category}]{Colors.RESET}")
+    for list_name, matching_tasks in results.items():
+        if not matching_tasks:
+            continue
+        if all_lists:
+            print(f"\n{Colors.BOLD}--- List: {list_name} ---{Colors.RESET}")
+        sorted_matches = sort_tasks(matching_tasks)
+        for index, task in enumerate(sorted_matches, 1):
+            color = get_color_for_status(task['status'])
+            category = task.get('category', 'General')
+            print(f"{index}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}) [Category: {category}]{Colors.RESET}")
+    print(" ")
+
+# Print the fuzzy matches for a query: active tasks of the current list, and completed names
+# with how often and when they were last completed
+def print_fuzzy_matches(query, heading, limit=10, quiet=False):
+    if len(normalize_task_name(query)) < 3:
+        print("Fuzzy search needs at least 3 letters.")
+        print(" ")
+        return
+    matches = fuzzy_search(query, limit)
+    if not matches:
+        if not quiet:
+            print("No close matches found.")
+        print(" ")
+        return
+    print(heading)
+    for distance, source, tasks in matches:
+        note = "exact" if distance == 0 else f"{distance} edit{'s' if distance > 1 else ''}"
+        if source == 'active':
+            for task in sort_tasks(tasks):
+                color = get_color_for_status(task['status'])
+                category = task.get('category', 'General')
+                print(f"  {color}{task['task']} - {task['status']} (Due: {task['due_date']}) [Category: {category}]{Colors.RESET} ({note})")
+        else:
+            last = max(tasks, key=lambda task: parse_date(task['completion_date']) or datetime.min)
+            times = f"{len(tasks)} times" if len(tasks) > 1 else "once"
+            print(f"  {Colors.GREEN}{last['task']}{Colors.RESET} - completed {times}, last on {last['completion_date']} ({note})")
     print(" ")
 
 # function to mark task as complete
@@ -689,12 +4758,39 @@ def mark_task_as_complete():
     try:
         search_index = int(input("enter the number of the task you want to mark as complete: ")) - 1
         if 0 <= search_index < len(to_do_list):
-            to_do_list[search_index]['status'] = "Done"
-            task_name = to_do_list[search_index]['task']
+            task = to_do_list[search_index]
+            task_name = task['task']
+            due_date = parse_date(task['due_date'])
+            open_subtasks = subtask_tree().open.get(task.get('id'), 0)
+            if open_subtasks and not task.get('recurrence'):
+                print(f"'{task_name}' still has {open_subtasks} open subtask(s). Complete them first.")
+                print(" ")
+                return
+            if task.get('recurrence') and due_date is not None:
+                # Archive this occurrence and move the rule on to the next one
+                current_due = task['due_date']
+                next_due = next_occurrence(task['recurrence'], due_date).strftime("%d-%m-%Y")
+                occurrence = dict(task, status="Done")
+                commit_change({"type": "group", "label": f"complete '{task_name}' due {current_due}", "changes": [
+                    {"type": "archive_occurrence", "task": occurrence},
+                    {"type": "edit", "index": search_index, "before": {"due_date": current_due}, "after": {"due_date": next_due}},
+                ]})
+                save_tasks()
+                print(f"Task '{task_name}' due {current_due} archived. Next occurrence: {next_due}")
+                print(" ")
+                mark_another_task = input("do you want to mark another task as complete? (yes/no): ")
+                if mark_another_task == "yes":
+                    mark_task_as_complete()
+                return
             print(f"Task '{task_name}' marked as Done and will be archived.")
+            archived = [index for index, candidate in enumerate(to_do_list)
+                        if index == search_index or candidate['status'].lower() == 'done']
             
             # Archive completed tasks and save remaining active tasks
-            archive_completed_tasks()
+            commit_change({"type": "group", "label": f"complete task '{task_name}'", "changes": [
+                {"type": "edit", "index": search_index,
+                 "before": {"status": to_do_list[search_index]['status']}, "after": {"status": "Done"}},
+            ] + subtask_completion_edits(archived) + [{"type": "archive"}]})
             save_tasks()
             print(" ")
             
@@ -712,13 +4808,692 @@ def mark_task_as_complete():
 def save_and_quit():
     archive_completed_tasks()
     save_tasks()
+    try:
+        save_completed_bloom()
+        save_time_summary()
+        flush_saves()
+    except OSError as error:
+        print(f"Could not save tasks: {error}")
+        print(" ")
+        return
     print("Tasks saved successfully. Goodbye!")
     exit()
 
+# Cache warming. The menu spends most of its time waiting in input(), so while it waits a
+# background thread builds what the next action is likely to need: the text of the view
+# chosen most often so far, the archive summary, and the indexes used by filters, queries,
+# duplicate checks, dependencies and fuzzy search. Each of these is already cached until the
+# data changes, so the warmer only redoes what the last change made stale. Once a choice is
+# made the remaining jobs are skipped and the menu waits for the running one (which is work
+# the action would otherwise do itself), so actions never run alongside a job. Jobs never
+# touch the write-behind saver or the queued log lines, which belong to the menu's thread.
+# TODO_WARM_CACHES=0 turns it off.
+WARM_CACHES = os.environ.get('TODO_WARM_CACHES', '1') != '0'
+
+_prerendered = {}
+_menu_choices = Counter()
+
+def _view_key(view):
+    """What a rendered view depends on: the list, every change since, the date and the archive"""
+    key = (storage, current_list, id(to_do_list), latest_sequence(), datetime.now().date())
+    return key + (storage.archive_version(),) if view == 3 else key
+
+def prerender_view(view, in_background=False):
+    if in_background and _feed_state['sequence'] is None:
+        # Finding the sequence reads changes.log, which first hands the queued log lines to the
+        # saver and waits for it. The menu's thread does that when it opens the view.
+        return
+    key = _view_key(view)
+    if _prerendered.get(view, (None,))[0] != key:
+        _prerendered[view] = (key, PRERENDERED_VIEWS[view]())
+
+def cached_view(view):
+    """The text of a view, rendered now unless the warmer already rendered the current data"""
+    prerender_view(view)
+    return _prerendered[view][1]
+
+def warm_jobs():
+    likely = max(PRERENDERED_VIEWS, key=lambda view: (_menu_choices[view], view == 1))
+    return [partial(prerender_view, likely, True), get_task_index, active_name_index, dependency_graph,
+            subtask_tree, summarize_archived_tasks, completed_bloom, active_fuzzy_index]
+
+class CacheWarmer:
+    """Runs warm_jobs() in a background thread while the menu is idle"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.running = threading.Lock()
+        self.idle = False
+        self.generation = 0
+        self.finished = 0
+        self.jobs_run = 0
+        self.thread = None
+
+    def start(self):
+        """The menu is about to wait for input"""
+        with self.condition:
+            self.idle = True
+            self.generation += 1
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='cache-warmer', daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def stop(self):
+        """A choice was made: skip the remaining jobs and wait for the running one"""
+        with self.condition:
+            self.idle = False
+        with self.running:
+            pass
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.idle and self.finished != self.generation)
+                generation = self.generation
+            for job in warm_jobs():
+                with self.running:
+                    if not self.idle or generation != self.generation:
+                        break
+                    try:
+                        job()
+                        self.jobs_run += 1
+                    except Exception:
+                        # The action that needs it will build it (and report the error) itself
+                        pass
+            else:
+                self.finished = generation
+
+_warmer = CacheWarmer()
+
+# Live dashboard. It follows changes.log and applies the events of its list to its own copy
+# of the tasks, kept in display order with bisect, so an event costs a binary search plus the
+# rows it moves. Only the rows from the first changed one down to the bottom of the screen are
+# formatted, and only lines whose text differs from what is on screen are rewritten.
+DASHBOARD_POLL_INTERVAL = 1.0
+
+class Dashboard:
+    """Live view of one task list that redraws only what changed"""
+
+    def __init__(self, backend, list_name, out=None):
+        self.storage = backend
+        self.list_name = list_name
+        self.out = out or sys.stdout
+        self.screen = []
+        self.rows_written = 0
+        self.today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.reload()
+
+    def reload(self):
+        """Load the list and categories again and follow the log from its end"""
+        self.categories = self.storage.load_categories()
+        lines, self.offset = self.storage.read_lines_from('changes.log', 0)
+        tasks = self.storage.load_tasks(self.list_name)
+        self.tasks = {task.get('id') or '': task for task in tasks}
+        self.tree = SubtaskTree(tasks)
+        self.keys = {task_id: self._key(task) for task_id, task in self.tasks.items()}
+        self.order = sorted(self.keys.values())
+        self.due = sorted(due_date for due_date in map(self._due, self.tasks.values()) if due_date is not None)
+        self.counts = Counter(task['status'].lower() for task in self.tasks.values())
+        self.dirty_from = 0
+        self.sequence = None
+        # Events are logged after the list file is written, so the file already has every logged
+        # event (events logged while it was read are applied again by poll(), which is idempotent)
+        for line in reversed(lines):
+            try:
+                self.sequence = json.loads(line)['seq']
+                break
+            except ValueError:
+                continue
+        self.updated = datetime.now()
+
+    def _key(self, task):
+        """Same order as sort_tasks(): parents move up to their earliest open subtask"""
+        return rolled_up_sort_key(self.tree.due, task) + (task.get('id') or '',)
+
+    @staticmethod
+    def _due(task):
+        """The task's own due date if it still counts towards overdue, else None"""
+        return parse_date(task['due_date']) if task['status'].lower() != 'done' else None
+
+    def _insert(self, task):
+        if task.get('id') in self.tasks:
+            self._remove(task['id'])
+        key = self._key(task)
+        position = bisect.bisect_left(self.order, key)
+        self.order.insert(position, key)
+        self.tasks[key[-1]], self.keys[key[-1]] = task, key
+        self.counts[task['status'].lower()] += 1
+        if self._due(task) is not None:
+            bisect.insort(self.due, self._due(task))
+        self.dirty_from = min(self.dirty_from, position)
+
+    def _remove(self, task_id):
+        key = self.keys.pop(task_id, None)
+        if key is None:
+            return
+        task = self.tasks.pop(task_id)
+        position = bisect.bisect_left(self.order, key)
+        del self.order[position]
+        self.counts[task['status'].lower()] -= 1
+        if self._due(task) is not None:
+            del self.due[bisect.bisect_left(self.due, self._due(task))]
+        self.dirty_from = min(self.dirty_from, position)
+
+    def _ancestors(self, task_id):
+        ancestors = set()
+        while task_id in self.tree.parent:
+            task_id = self.tree.parent[task_id]
+            ancestors.add(task_id)
+        return ancestors
+
+    def _rekey(self, task_ids):
+        """Move tasks whose rolled-up due date changed"""
+        for task_id in task_ids:
+            if task_id in self.tasks and self._key(self.tasks[task_id]) != self.keys[task_id]:
+                self._insert(self.tasks[task_id])
+
+    def apply(self, entry):
+        """Apply one change event. Returns True if it concerns this dashboard."""
+        kind = entry['event']
+        if kind == 'category':
+            self.categories = self.storage.load_categories()
+            self.dirty_from = 0
+            return True
+        if entry.get('list') != self.list_name:
+            return False
+        task_id = entry['task'].get('id') if kind == 'add' else entry.get('task_id')
+        above = self._ancestors(task_id)
+        if kind == 'add':
+            task = dict(entry['task'])
+            self.tree.discard(task_id)
+            if task_id:
+                self.tree.add(task)
+            self._insert(task)
+        elif kind in ('delete', 'complete'):
+            self.tree.discard(task_id)
+            self._remove(task_id)
+        elif kind == 'edit' and task_id in self.tasks:
+            task = dict(self.tasks[task_id], **entry['fields'])
+            if task_id in self.tree.tasks:
+                self.tree.tasks[task_id] = task
+                self.tree.update(task_id, entry['fields'])
+            self._insert(task)
+        else:
+            return False
+        self._rekey(above | self._ancestors(task_id))
+        return True
+
+    def poll(self):
+        """Apply the events logged since the last poll. Returns True if anything changed."""
+        result = self.storage.read_lines_from('changes.log', self.offset)
+        if result is None:
+            self.reload()
+            return True
+        lines, self.offset = result
+        changed = False
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if self.sequence is not None and entry['seq'] != self.sequence + 1:
+                # The log was rewritten or another writer interleaved: start over
+                self.reload()
+                return True
+            self.sequence = entry['seq']
+            changed = self.apply(entry) or changed
+        if changed:
+            self.updated = datetime.now()
+        return changed
+
+    def tick(self, now=None):
+        """Poll for changes and notice the clock crossing into a new day (due dates turn overdue)"""
+        changed = self.poll()
+        today = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        if today != self.today:
+            self.today, self.dirty_from = today, 0
+            changed = True
+        return changed
+
+    def row(self, number, task):
+        due_date = self._due(task)
+        overdue = due_date is not None and due_date < self.today
+        color = Colors.MAGENTA + Colors.BOLD if overdue else get_color_for_status(task['status'])
+        category = task.get('category', 'General')
+        category_color = self.categories.get(category, Colors.RESET)
+        return (f"{number}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}){recurrence_text(task)}"
+                f"{tags_text(task)}{' [OVERDUE]' if overdue else ''}{Colors.RESET} {category_color}[{category}]{Colors.RESET}")
+
+    def render(self, height):
+        """Bring the screen up to date, rewriting only changed lines. Returns how many were written."""
+        overdue = bisect.bisect_left(self.due, self.today)
+        lines = [f"{Colors.BOLD}=== {self.list_name} === {len(self.order)} tasks, {self.counts['urgent']} urgent, "
+                 f"{overdue} overdue{Colors.RESET}",
+                 f"Updated {self.updated.strftime('%H:%M:%S')} - press Ctrl+C to stop", ""]
+        visible = max(0, min(len(self.order), height - len(lines) - 1))
+        first = len(lines)
+        start = max(0, min(self.dirty_from, visible, len(self.screen) - first))
+        lines.extend(self.screen[first:first + start])
+        for position in range(start, visible):
+            lines.append(self.row(position + 1, self.tasks[self.order[position][-1]]))
+        if len(self.order) > visible:
+            lines.append(f"... and {len(self.order) - visible} more")
+        written = 0
+        for number, line in enumerate(lines):
+            if number >= len(self.screen) or self.screen[number] != line:
+                self.out.write(f"\033[{number + 1};1H{line}\033[K")
+                written += 1
+        for number in range(len(lines), len(self.screen)):
+            self.out.write(f"\033[{number + 1};1H\033[K")
+            written += 1
+        self.out.flush()
+        self.screen = lines
+        self.dirty_from = len(self.order)
+        self.rows_written += written
+        return written
+
+    def run(self, interval=DASHBOARD_POLL_INTERVAL):
+        # Hide the cursor and turn off line wrapping while drawing
+        self.out.write("\033[?25l\033[?7l\033[2J")
+        size = None
+        try:
+            while True:
+                self.tick()
+                if shutil.get_terminal_size() != size:
+                    size = shutil.get_terminal_size()
+                    self.out.write("\033[2J")
+                    self.screen, self.dirty_from = [], 0
+                self.render(size.lines)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.out.write(f"\033[{len(self.screen) + 1};1H\033[?7h\033[?25h\n")
+            self.out.flush()
+
+# Show the live dashboard for the current list until Ctrl+C
+def live_dashboard():
+    flush_saves()
+    Dashboard(storage, current_list).run()
+    print(" ")
+
+# Set which tasks a task is blocked by (one undoable edit)
+def set_task_blockers(tasks):
+    try:
+        number = int(input("Enter the number of the task: "))
+    except ValueError:
+        print("Please enter a valid number.")
+        return
+    if not 1 <= number <= len(tasks):
+        print("Invalid task number.")
+        return
+    task = tasks[number - 1]
+    text = input("Enter the numbers of the tasks it is blocked by, separated by commas (press Enter for none): ")
+    try:
+        numbers = [int(part) for part in text.split(',') if part.strip()]
+    except ValueError:
+        print("Please enter numbers separated by commas.")
+        return
+    if any(not 1 <= blocker <= len(tasks) for blocker in numbers):
+        print("Invalid task number.")
+        return
+    blocker_ids = list(dict.fromkeys(tasks[blocker - 1]['id'] for blocker in numbers))
+    cycle = dependency_graph().would_cycle(task['id'], blocker_ids)
+    if cycle is not None:
+        name = dependency_graph().tasks[cycle]['task']
+        print(f"'{name}' already waits on '{task['task']}', so it cannot block it.")
+        return
+    before, after = task.get('blocked_by', ''), ",".join(blocker_ids)
+    if before == after:
+        print("Nothing changed.")
+        return
+    index = next(index for index, candidate in enumerate(to_do_list) if candidate is task)
+    commit_change({"type": "edit", "index": index, "before": {"blocked_by": before}, "after": {"blocked_by": after}})
+    save_tasks()
+    print(f"'{task['task']}' is now blocked by {len(blocker_ids)} task(s).")
+
+# Print a dependency chain with the date each task must be done by
+def print_critical_path(path):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    deadlines = dependency_graph().deadline
+    for number, task in enumerate(path, 1):
+        color = get_color_for_status(task['status'], task['due_date'])
+        deadline = deadlines[task['id']]
+        must = ""
+        if deadline != datetime.max and deadline != parse_date(task['due_date']):
+            must = f" - needed by {deadline.strftime('%d-%m-%Y')}"
+        late = " [LATE]" if deadline < today else ""
+        print(f"{number}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}){must}{late}{Colors.RESET}")
+    print(" ")
+
+# Blocked-by relationships: set them, and see what can be done now
+def dependencies_menu():
+    while True:
+        print(f"\n{Colors.BOLD}=== Task Dependencies ==={Colors.RESET}")
+        print("1. Set what a task is blocked by")
+        print("2. Actionable tasks (not blocked)")
+        print("3. Blocked tasks")
+        print("4. Work order (every task after its blockers)")
+        print("5. Critical path")
+        print("0. Back to main menu")
+        try:
+            choice = int(input("Enter your choice: "))
+        except ValueError:
+            print("Please enter a valid number.")
+            continue
+        graph = dependency_graph()
+        if choice == 0:
+            break
+        elif choice == 1:
+            tasks = sort_tasks(list(graph.tasks.values()))
+            if not tasks:
+                print("Your to-do list is empty.")
+                continue
+            print("")
+            for number, task in enumerate(tasks, 1):
+                waiting = [graph.tasks[blocker]['task'] for blocker in graph.blockers[task['id']]]
+                blocked = f" - blocked by {', '.join(waiting)}" if waiting else ""
+                print(f"{number}. {task['task']} (Due: {task['due_date']}){blocked}")
+            set_task_blockers(tasks)
+        elif choice == 2:
+            print("\nActionable tasks:")
+            print_task_rows(sort_tasks(graph.actionable()))
+        elif choice == 3:
+            blocked = sort_tasks([graph.tasks[task_id] for task_id in graph.blocked])
+            if not blocked:
+                print("No task is blocked.")
+                continue
+            print("\nBlocked tasks:")
+            for number, task in enumerate(blocked, 1):
+                waiting = sort_tasks([graph.tasks[blocker] for blocker in graph.blockers[task['id']]])
+                print(f"{number}. {task['task']} (Due: {task['due_date']}) - waiting on {', '.join(blocker['task'] for blocker in waiting)}")
+            print(" ")
+        elif choice == 4:
+            print("\nWork order:")
+            print_task_rows(graph.ordered())
+        elif choice == 5:
+            path = graph.critical_path()
+            if len(path) < 2:
+                print("No task is blocked, so there is no critical path.")
+                continue
+            print(f"\nCritical path ({len(path)} tasks that have to be done one after another):")
+            print_critical_path(path)
+        else:
+            print("Invalid choice. Please try again.")
+
+# Print tasks numbered, with subtasks indented and their parents' progress
+def print_nested_rows(rows):
+    print("")
+    for number, (task, depth) in enumerate(rows, 1):
+        color = get_color_for_status(task['status'], task['due_date'])
+        print(f"{'    ' * depth}{number}. {color}{task['task']} - {task['status']} (Due: {task['due_date']}){subtask_progress_text(task)}{Colors.RESET}")
+    print(" ")
+
+def pick_nested_task(rows, prompt):
+    try:
+        number = int(input(prompt))
+    except ValueError:
+        print("Please enter a valid number.")
+        return None
+    if not 1 <= number <= len(rows):
+        print("Invalid task number.")
+        return None
+    return rows[number - 1][0]
+
+def set_task_parent(task, parent_id):
+    index = next(index for index, candidate in enumerate(to_do_list) if candidate is task)
+    commit_change({"type": "edit", "index": index, "before": {"parent": task.get('parent', '')}, "after": {"parent": parent_id}})
+    save_tasks()
+
+# Subtasks: add one under a task, move a task under another one or back to the top level
+def subtasks_menu():
+    while True:
+        print(f"\n{Colors.BOLD}=== Subtasks ==={Colors.RESET}")
+        print("1. Add a subtask")
+        print("2. Move a task under another task")
+        print("3. Move a subtask to the top level")
+        print("0. Back to main menu")
+        try:
+            choice = int(input("Enter your choice: "))
+        except ValueError:
+            print("Please enter a valid number.")
+            continue
+        if choice == 0:
+            break
+        if choice not in (1, 2, 3):
+            print("Invalid choice. Please try again.")
+            continue
+        tree = subtask_tree()
+        rows = nested_tasks(tree.roots())
+        if not rows:
+            print("Your to-do list is empty.")
+            continue
+        print_nested_rows(rows)
+        if choice == 1:
+            parent = pick_nested_task(rows, "Enter the number of the parent task: ")
+            if parent is not None:
+                add_task(parent)
+        elif choice == 2:
+            task = pick_nested_task(rows, "Enter the number of the task to move: ")
+            if task is None:
+                continue
+            parent = pick_nested_task(rows, "Enter the number of its new parent task: ")
+            if parent is None:
+                continue
+            if tree.is_below(parent['id'], task['id']):
+                print(f"'{parent['task']}' is '{task['task']}' or one of its subtasks, so it cannot be its parent.")
+                continue
+            set_task_parent(task, parent['id'])
+            print(f"'{task['task']}' is now a subtask of '{parent['task']}'.")
+        else:
+            task = pick_nested_task(rows, "Enter the number of the subtask: ")
+            if task is None:
+                continue
+            if task['id'] not in tree.parent:
+                print(f"'{task['task']}' is already at the top level.")
+                continue
+            set_task_parent(task, '')
+            print(f"'{task['task']}' is now at the top level.")
+
+# Start and stop timers on tasks, and see the time spent
+def time_tracking_menu():
+    while True:
+        try:
+            state = time_tracking()
+        except ValueError as error:
+            print(f"Time tracking is unavailable: {error}")
+            print(" ")
+            return
+        print(f"\n{Colors.BOLD}=== Time Tracking ==={Colors.RESET}")
+        for task_id in state['running']:
+            print(f"Running: '{state['names'][task_id][1]}' for {format_duration(int(time.time()) - state['running'][task_id])}")
+        print("1. Start a timer")
+        print("2. Stop the timer")
+        print("3. Time spent per task")
+        print("4. Report for a date range")
+        print("0. Back to main menu")
+        try:
+            choice = int(input("Enter your choice: "))
+        except ValueError:
+            print("Please enter a valid number.")
+            continue
+        if choice == 0:
+            break
+        elif choice == 1:
+            tasks = sort_tasks(to_do_list)
+            if not tasks:
+                print("Your to-do list is empty.")
+                continue
+            print("")
+            for number, task in enumerate(tasks, 1):
+                spent = time_spent(task['id'])
+                print(f"{number}. {task['task']} (Due: {task['due_date']}){' - ' + format_duration(spent) if spent else ''}")
+            try:
+                number = int(input("Enter the number of the task to time: "))
+            except ValueError:
+                print("Please enter a valid number.")
+                continue
+            if not 1 <= number <= len(tasks):
+                print("Invalid task number.")
+                continue
+            try:
+                stopped = start_timer(tasks[number - 1])
+            except ValueError as error:
+                print(f"Cannot start the timer: {error}")
+                continue
+            if stopped is not None:
+                print(f"Stopped the timer of '{state['names'][stopped][1]}'.")
+            print(f"Timing '{tasks[number - 1]['task']}'.")
+        elif choice == 2:
+            if not state['running']:
+                print("No timer is running.")
+                continue
+            task_id = next(iter(state['running']))
+            seconds = stop_timer(task_id)
+            print(f"Stopped '{state['names'][task_id][1]}' after {format_duration(seconds)} "
+                  f"(total {format_duration(time_spent(task_id))}).")
+        elif choice == 3:
+            timed = [task for task in sort_tasks(to_do_list) if time_spent(task['id'])]
+            if not timed:
+                print("No time tracked on the tasks of this list.")
+                continue
+            print("")
+            for task in timed:
+                print(f"{task['task']}: {format_duration(time_spent(task['id']))}")
+            print(" ")
+        elif choice == 4:
+            time_report()
+        else:
+            print("Invalid choice. Please try again.")
+
+def format_size(size):
+    for unit in ("bytes", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+
+# Back up the data directory now
+def backup_now():
+    flush_saves()
+    name, files, total, new_chunks, written = create_backup(storage.root)
+    print(f"Backup {name}: {files} files ({format_size(total)}), {new_chunks} new chunk(s), {format_size(written)} written.")
+
+# Restore a backup into the data directory (after backing up the current data) or another directory
+def restore_from_backup(name, target=None):
+    if target and os.path.abspath(target) != os.path.abspath(storage.root):
+        count = restore_backup(name, target, backup_dir_for(storage.root))
+        print(f"Restored {count} files of backup {name} into {target}.")
+        return
+    if name not in dict(list_backups(backup_dir_for(storage.root))):
+        raise ValueError(f"there is no backup '{name}'")
+    if os.path.isdir(storage.root):
+        backup_now()
+    restore_backup(name, storage.root)
+    set_storage(type(storage)(storage.root))
+    print(f"Restored backup {name}. Any data from before the restore was backed up first.")
+
+# Back up the data directory, list the backups and restore one
+def backups_menu():
+    if not hasattr(storage, 'root'):
+        print("Backups need a data directory; the current storage keeps everything in memory.")
+        print(" ")
+        return
+    while True:
+        backups = list_backups(backup_dir_for(storage.root))
+        print(f"\n{Colors.BOLD}=== Backups ({backup_dir_for(storage.root)}) ==={Colors.RESET}")
+        print("1. Back up now")
+        print("2. List backups")
+        print("3. Restore a backup")
+        print("0. Back to main menu")
+        try:
+            choice = int(input("Enter your choice: "))
+        except ValueError:
+            print("Please enter a valid number.")
+            continue
+        try:
+            if choice == 0:
+                break
+            elif choice == 1:
+                backup_now()
+            elif choice in (2, 3):
+                if not backups:
+                    print("No backups yet.")
+                    continue
+                for number, (name, manifest) in enumerate(backups, 1):
+                    size = sum(entry['size'] for entry in manifest['files'].values())
+                    print(f"{number}. {name} - {len(manifest['files'])} files, {format_size(size)}")
+                if choice == 3:
+                    number = int(input("Enter the number of the backup to restore: "))
+                    if not 1 <= number <= len(backups):
+                        print("Invalid backup number.")
+                        continue
+                    target = input("Restore into which directory? (press Enter for the data directory): ").strip()
+                    if not target and input("This replaces your current tasks. Continue? (yes/no): ").lower() != "yes":
+                        continue
+                    restore_from_backup(backups[number - 1][0], target or None)
+            else:
+                print("Invalid choice. Please try again.")
+        except ValueError as error:
+            print(f"Backup failed: {error}")
+        except OSError as error:
+            print(f"Backup failed: {error}")
+
+# Print the outcome of a sync
+def print_sync_result(sent, applied, skipped):
+    print(f"Sent {sent} change(s), applied {applied} received change(s) ({skipped} already applied or overruled).")
+    print(" ")
+
+# Sync with another data directory, a sync file or a store on the network
+def sync_menu():
+    while True:
+        print(f"\n{Colors.BOLD}=== Sync ==={Colors.RESET}")
+        print("1. Sync with another data directory")
+        print("2. Write my changes to a sync file")
+        print("3. Read changes from a sync file")
+        print("4. Wait for another store to connect")
+        print("5. Connect to a waiting store")
+        print("0. Back to main menu")
+        try:
+            choice = int(input("Enter your choice: "))
+        except ValueError:
+            print("Please enter a valid number.")
+            continue
+        try:
+            if choice == 0:
+                break
+            elif choice == 1:
+                print_sync_result(*sync_stores(input("Enter the other data directory: ").strip()))
+            elif choice == 2:
+                path = input("Enter the file to write: ").strip()
+                print(f"Wrote {write_sync_file(path)} change(s) to {path}.")
+                print(" ")
+            elif choice == 3:
+                applied, skipped = read_sync_file(input("Enter the sync file to read: ").strip())
+                print_sync_result(0, applied, skipped)
+            elif choice == 4:
+                port = input(f"Port (press Enter for {SYNC_PORT}): ").strip()
+                print("Waiting for the other store to connect...")
+                print_sync_result(*serve_sync(int(port) if port else SYNC_PORT))
+            elif choice == 5:
+                address = input(f"Address of the waiting store (host:port, press Enter for 127.0.0.1:{SYNC_PORT}): ").strip()
+                host, _, port = address.rpartition(':') if ':' in address else (address, '', '')
+                print_sync_result(*connect_sync(host or '127.0.0.1', int(port) if port else SYNC_PORT))
+            else:
+                print("Invalid choice. Please try again.")
+        except ValueError as error:
+            print(f"Sync failed: {error}")
+        except OSError as error:
+            print(f"Sync failed: {error}")
+
 # function to display main menu
 def display_menu():
     print("")
     while True:
+        if _saver.failure() is not None:
+            print(f"Warning: your latest changes could not be saved ({_saver.failure()}).")
+            print("They will be saved again with your next change.")
+            print(" ")
         print("1 - View To-Do List")
         print("2 - View incompleted Tasks")
         print("3 - View completed Tasks")
@@ -730,12 +5505,32 @@ def display_menu():
         print("9 - Show Statistics")
         print("10 - Manage Categories")
         print("11 - Filter by Category")
-        print("12 - Save and quit")
+        print("12 - Undo last change")
+        print("13 - Redo")
+        print("14 - View Upcoming Schedule")
+        print(f"15 - Switch Task List (current: {current_list})")
+        print("16 - Query Tasks")
+        print("17 - Saved Views")
+        print("18 - What's Next")
+        print("19 - Live Dashboard")
+        print("20 - Task Dependencies")
+        print("21 - Backups")
+        print("22 - Sync")
+        print("23 - Subtasks")
+        print("24 - Time Tracking")
+        print("25 - Save and quit")
         print("      ")
         print("please enter the number corresponding to your choice")
 
         try:
-            choice = int(input("Enter your choice: "))
+            if WARM_CACHES:
+                _warmer.start()
+            try:
+                answer = input("Enter your choice: ")
+            finally:
+                _warmer.stop()
+            choice = int(answer)
+            _menu_choices[choice] += 1
             if choice == 1:
                 view_to_do_list()
             elif choice == 2:
@@ -753,12 +5548,38 @@ def display_menu():
             elif choice == 8:
                 search_tasks()
             elif choice == 9:
-                show_statistics()
+                statistics_menu()
             elif choice == 10:
                 manage_categories()
             elif choice == 11:
                 filter_by_category()
             elif choice == 12:
+                undo_last_change()
+            elif choice == 13:
+                redo_last_change()
+            elif choice == 14:
+                view_upcoming_schedule()
+            elif choice == 15:
+                switch_task_list()
+            elif choice == 16:
+                query_tasks()
+            elif choice == 17:
+                saved_views_menu()
+            elif choice == 18:
+                view_next_tasks()
+            elif choice == 19:
+                live_dashboard()
+            elif choice == 20:
+                dependencies_menu()
+            elif choice == 21:
+                backups_menu()
+            elif choice == 22:
+                sync_menu()
+            elif choice == 23:
+                subtasks_menu()
+            elif choice == 24:
+                time_tracking_menu()
+            elif choice == 25:
                 print("exiting and saving......")
                 save_and_quit()
             else:
@@ -766,4 +5587,48 @@ def display_menu():
         except ValueError:
             print("Please enter a valid number.")
 
-display_menu()
+if __name__ == "__main__":
+    # Give tasks saved before ids existed one, and save them, before any command uses the list
+    if ensure_task_ids(to_do_list):
+        save_tasks()
+    if len(sys.argv) > 2 and sys.argv[1] == "--convert" and sys.argv[2] in ("binary", "text"):
+        convert_storage(storage.root, to_binary=sys.argv[2] == "binary")
+    elif len(sys.argv) > 2 and sys.argv[1] == "--import":
+        mode = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] in ("skip", "merge", "add") else "skip"
+        added, merged, skipped, completed_before = import_tasks(sys.argv[2], mode)
+        print(f"Imported {added} task(s), merged {merged}, skipped {skipped} duplicate(s). "
+              f"{completed_before} imported name(s) were probably completed before.")
+    elif len(sys.argv) > 1 and sys.argv[1] in ("--backup", "--restore", "--backups"):
+        try:
+            if sys.argv[1] == "--backup":
+                backup_now()
+            elif sys.argv[1] == "--restore" and len(sys.argv) > 2:
+                restore_from_backup(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+            else:
+                for name, manifest in list_backups(backup_dir_for(storage.root)):
+                    size = sum(entry['size'] for entry in manifest['files'].values())
+                    print(f"{name}  {len(manifest['files'])} files, {format_size(size)}")
+        except (ValueError, OSError) as error:
+            print(f"Backup failed: {error}")
+    elif len(sys.argv) > 2 and sys.argv[1] in ("--sync", "--sync-export", "--sync-import", "--sync-serve", "--sync-connect"):
+        try:
+            if sys.argv[1] == "--sync":
+                print_sync_result(*sync_stores(sys.argv[2]))
+            elif sys.argv[1] == "--sync-export":
+                print(f"Wrote {write_sync_file(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)} change(s) to {sys.argv[2]}.")
+            elif sys.argv[1] == "--sync-import":
+                print_sync_result(0, *read_sync_file(sys.argv[2]))
+            elif sys.argv[1] == "--sync-serve":
+                print_sync_result(*serve_sync(int(sys.argv[2])))
+            else:
+                host, _, port = sys.argv[2].rpartition(':')
+                print_sync_result(*connect_sync(host or '127.0.0.1', int(port)))
+        except (ValueError, OSError) as error:
+            print(f"Sync failed: {error}")
+    elif len(sys.argv) > 1 and sys.argv[1] == "--dashboard":
+        Dashboard(storage, sys.argv[2] if len(sys.argv) > 2 else DEFAULT_LIST).run()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--next":
+        print_task_rows(next_tasks(to_do_list, int(sys.argv[2]) if len(sys.argv) > 2 else 5))
+    else:
+        print("======= To-DO List =======")
+        display_menu()